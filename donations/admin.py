@@ -1,22 +1,29 @@
 from django.contrib import admin
-from django.contrib.auth.admin import UserAdmin
-from django.contrib.auth.models import User
 from django.utils import timezone
 from django.utils.html import format_html
 from django.urls import path, reverse
 from django.shortcuts import render, redirect
 from django.http import HttpResponseRedirect
 from django.contrib import messages
-from .models import DonorProfile, DonationCategory, Donation, DonationRequest, Notification, Feedback, HelpSeekerType, HelpSeeker, DonationMatch, HelpRequest, Rating, VerificationRequest
+from django.db import transaction
+from .bulk import PROFILE_TYPES, update_with_audit, verification_values
+from .admin_mixins import AutocompleteSearchMixin, UploadLimitsAdminMixin
+from .signals import invalidate_cached_for
+from .forms import DonationAdminForm, DonorProfileAdminForm, HelpSeekerAdminForm, VerificationRequestAdminForm
+from .paginators import EstimatedCountPaginator
+from .models import DonorProfile, DonationCategory, Donation, DonationRequest, Notification, Feedback, HelpSeekerType, HelpSeeker, DonationMatch, HelpRequest, Rating, VerificationRequest, AuditLog, BackgroundJob, DonationAllocation, OutboxEmail, DigestEntry, StoredBlob, Tombstone
 
 # Inline for DonorProfile in User Admin
 class DonorProfileInline(admin.StackedInline):
     model = DonorProfile
+    fk_name = 'user'
+    form = DonorProfileAdminForm
     can_delete = False
     verbose_name_plural = 'Donor Profile'
     fields = ('organization_name', 'user_type', 'phone', 'address', 'city', 'state', 
               'pincode', 'verification_status', 'verification_document', 'verified_at', 'verified_by')
     readonly_fields = ('verified_at',)
+    autocomplete_fields = ('verified_by',)
     extra = 0
 
     def has_add_permission(self, request, obj=None):
@@ -25,80 +32,30 @@ class DonorProfileInline(admin.StackedInline):
 # Inline for HelpSeeker in User Admin
 class HelpSeekerInline(admin.StackedInline):
     model = HelpSeeker
+    fk_name = 'user'
+    form = HelpSeekerAdminForm
     can_delete = False
     verbose_name_plural = 'Help Seeker Profile'
     fields = ('organization_name', 'seeker_type', 'description', 'phone', 'address',
               'city', 'state', 'pincode', 'verification_status', 'verification_document',
               'verified_at', 'verified_by', 'is_urgent', 'urgent_needs')
     readonly_fields = ('verified_at',)
+    autocomplete_fields = ('seeker_type', 'verified_by')
     extra = 0
 
     def has_add_permission(self, request, obj=None):
         return False
 
-# Custom User Admin
-class CustomUserAdmin(UserAdmin):
-    list_display = ('username', 'email', 'first_name', 'last_name', 'get_donor_status', 'get_seeker_status', 'is_staff', 'is_active')
-    list_filter = ('donorprofile__verification_status', 'helpseeker__verification_status', 'is_staff', 'is_active', 'date_joined')
-    search_fields = ('username', 'email', 'first_name', 'last_name')
-    actions = ['activate_users', 'deactivate_users']
-    
-    def get_donor_status(self, obj):
-        if hasattr(obj, 'donorprofile'):
-            status = obj.donorprofile.get_verification_status_display()
-            color = {
-                'verified': 'green',
-                'pending': 'orange',
-                'rejected': 'red',
-                'not_submitted': 'gray'
-            }.get(obj.donorprofile.verification_status, 'black')
-            return format_html('<span style="color: {}; font-weight: bold;">{}</span>', color, status)
-        return format_html('<span style="color: gray;">No Profile</span>')
-    get_donor_status.short_description = 'Donor Status'
-    
-    def get_seeker_status(self, obj):
-        if hasattr(obj, 'helpseeker'):
-            status = obj.helpseeker.get_verification_status_display()
-            color = {
-                'verified': 'green',
-                'pending': 'orange',
-                'rejected': 'red'
-            }.get(obj.helpseeker.verification_status, 'black')
-            return format_html('<span style="color: {}; font-weight: bold;">{}</span>', color, status)
-        return format_html('<span style="color: gray;">No Profile</span>')
-    get_seeker_status.short_description = 'Seeker Status'
-
-    def activate_users(self, request, queryset):
-        updated = queryset.update(is_active=True)
-        self.message_user(request, f'{updated} users activated successfully.')
-    activate_users.short_description = "Activate selected users"
-
-    def deactivate_users(self, request, queryset):
-        updated = queryset.update(is_active=False)
-        self.message_user(request, f'{updated} users deactivated.')
-    deactivate_users.short_description = "Deactivate selected users"
-
-    def get_inlines(self, request, obj=None):
-        if obj:
-            inlines = []
-            if hasattr(obj, 'donorprofile'):
-                inlines.append(DonorProfileInline)
-            if hasattr(obj, 'helpseeker'):
-                inlines.append(HelpSeekerInline)
-            return inlines
-        return []
-
-# Unregister default User admin and register custom
-admin.site.unregister(User)
-admin.site.register(User, CustomUserAdmin)
-
 @admin.register(VerificationRequest)
-class VerificationRequestAdmin(admin.ModelAdmin):
+class VerificationRequestAdmin(UploadLimitsAdminMixin, admin.ModelAdmin):
+    form = VerificationRequestAdminForm
     list_display = ['user', 'verification_type', 'get_status_badge', 'submitted_at', 'reviewed_at', 'reviewed_by', 'quick_actions']
     list_filter = ['verification_type', 'status', 'submitted_at']
     search_fields = ['user__username', 'user__email', 'notes']
     readonly_fields = ['submitted_at', 'reviewed_at']
     list_per_page = 20
+    list_select_related = ('user', 'reviewed_by')
+    autocomplete_fields = ['user', 'reviewed_by']
     actions = ['approve_requests', 'reject_requests', 'mark_under_review', 'mark_needs_info']
     
     fieldsets = (
@@ -193,33 +150,37 @@ class VerificationRequestAdmin(admin.ModelAdmin):
         return HttpResponseRedirect(reverse('admin:donations_verificationrequest_changelist'))
 
     def approve_requests(self, request, queryset):
-        for vr in queryset:
-            vr.status = 'approved'
-            vr.reviewed_at = timezone.now()
-            vr.reviewed_by = request.user
-            vr.save()
-            
-            if vr.verification_type == 'donor' and hasattr(vr.user, 'donorprofile'):
-                vr.user.donorprofile.verification_status = 'verified'
-                vr.user.donorprofile.verified_at = timezone.now()
-                vr.user.donorprofile.verified_by = request.user
-                vr.user.donorprofile.save()
-            elif vr.verification_type == 'help_seeker' and hasattr(vr.user, 'helpseeker'):
-                vr.user.helpseeker.verification_status = 'verified'
-                vr.user.helpseeker.verified_at = timezone.now()
-                vr.user.helpseeker.verified_by = request.user
-                vr.user.helpseeker.save()
-                
-        self.message_user(request, f'{queryset.count()} verification requests approved successfully.')
+        now = timezone.now()
+        pending = queryset.exclude(status='approved')
+        with transaction.atomic():
+            # Verify the linked profiles through the selected requests' users, before the
+            # requests themselves change status and drop out of a filtered queryset. Profiles
+            # verified earlier keep their original verifier.
+            for verification_type, profile_type in [('donor', 'donor'), ('help_seeker', 'seeker')]:
+                model, repr_field, _ = PROFILE_TYPES[profile_type]
+                update_with_audit(
+                    model.objects.filter(
+                        user__in=pending.filter(verification_type=verification_type).values('user')
+                    ).exclude(verification_status='verified'),
+                    verification_values(model, request.user, now),
+                    request.user, 'verify', repr_field,
+                )
+
+            approved = update_with_audit(
+                pending,
+                {'status': 'approved', 'reviewed_at': now, 'reviewed_by': request.user},
+                request.user, 'approve', 'user__username',
+            )
+        self.message_user(request, f'{approved} verification requests approved successfully.')
     approve_requests.short_description = "✅ Approve selected requests"
 
     def reject_requests(self, request, queryset):
-        for vr in queryset:
-            vr.status = 'rejected'
-            vr.reviewed_at = timezone.now()
-            vr.reviewed_by = request.user
-            vr.save()
-        self.message_user(request, f'{queryset.count()} verification requests rejected.')
+        rejected = update_with_audit(
+            queryset.exclude(status='rejected'),
+            {'status': 'rejected', 'reviewed_at': timezone.now(), 'reviewed_by': request.user},
+            request.user, 'reject', 'user__username',
+        )
+        self.message_user(request, f'{rejected} verification requests rejected.')
     reject_requests.short_description = "❌ Reject selected requests"
 
     def mark_under_review(self, request, queryset):
@@ -233,12 +194,16 @@ class VerificationRequestAdmin(admin.ModelAdmin):
     mark_needs_info.short_description = "📋 Mark as needs more info"
 
 @admin.register(DonorProfile)
-class DonorProfileAdmin(admin.ModelAdmin):
+class DonorProfileAdmin(UploadLimitsAdminMixin, AutocompleteSearchMixin, admin.ModelAdmin):
+    form = DonorProfileAdminForm
     list_display = ['user', 'organization_name', 'user_type', 'get_verification_badge', 'city', 'state', 'verified_at', 'quick_actions']
     list_filter = ['user_type', 'verification_status', 'city', 'state']
     search_fields = ['user__username', 'organization_name', 'city', 'state', 'phone']
+    autocomplete_search_fields = ['^organization_name', '^user__username']
     readonly_fields = ['created_at', 'verified_at']
     list_per_page = 20
+    list_select_related = ('user',)
+    autocomplete_fields = ['user', 'verified_by']
     actions = ['verify_donors', 'reject_donors', 'mark_pending']
     
     fieldsets = (
@@ -303,31 +268,37 @@ class DonorProfileAdmin(admin.ModelAdmin):
         return HttpResponseRedirect(reverse('admin:donations_donorprofile_changelist'))
 
     def verify_donors(self, request, queryset):
-        for donor in queryset:
-            donor.verification_status = 'verified'
-            donor.verified_at = timezone.now()
-            donor.verified_by = request.user
-            donor.save()
-        self.message_user(request, f'{queryset.count()} donors verified successfully.')
+        verified = update_with_audit(
+            queryset.exclude(verification_status='verified'),
+            verification_values(DonorProfile, request.user, timezone.now()),
+            request.user, 'verify', 'user__username',
+        )
+        self.message_user(request, f'{verified} donors verified successfully.')
     verify_donors.short_description = "✅ Verify selected donors"
 
     def reject_donors(self, request, queryset):
         queryset.update(verification_status='rejected', verified_at=None, verified_by=None)
+        invalidate_cached_for(DonorProfile)
         self.message_user(request, f'{queryset.count()} donors rejected.')
     reject_donors.short_description = "❌ Reject selected donors"
 
     def mark_pending(self, request, queryset):
         queryset.update(verification_status='pending', verified_at=None, verified_by=None)
+        invalidate_cached_for(DonorProfile)
         self.message_user(request, f'{queryset.count()} donors marked as pending.')
     mark_pending.short_description = "⏳ Mark as pending"
 
 @admin.register(HelpSeeker)
-class HelpSeekerAdmin(admin.ModelAdmin):
+class HelpSeekerAdmin(UploadLimitsAdminMixin, AutocompleteSearchMixin, admin.ModelAdmin):
+    form = HelpSeekerAdminForm
     list_display = ['organization_name', 'seeker_type', 'get_verification_badge', 'city', 'state', 'is_urgent', 'verified_at', 'quick_actions']
     list_filter = ['seeker_type', 'verification_status', 'city', 'state', 'is_urgent']
     search_fields = ['organization_name', 'city', 'description', 'phone', 'user__username']
+    autocomplete_search_fields = ['^organization_name', '^user__username']
     readonly_fields = ['created_at', 'updated_at', 'verified_at']
     list_per_page = 20
+    list_select_related = ('seeker_type',)
+    autocomplete_fields = ['user', 'seeker_type', 'verified_by']
     actions = ['verify_seekers', 'reject_seekers', 'mark_pending', 'mark_urgent', 'mark_not_urgent']
     
     fieldsets = (
@@ -394,52 +365,65 @@ class HelpSeekerAdmin(admin.ModelAdmin):
         return HttpResponseRedirect(reverse('admin:donations_helpseeker_changelist'))
 
     def verify_seekers(self, request, queryset):
-        for seeker in queryset:
-            seeker.verification_status = 'verified'
-            seeker.verified_at = timezone.now()
-            seeker.verified_by = request.user
-            seeker.save()
-        self.message_user(request, f'{queryset.count()} help seekers verified successfully.')
+        verified = update_with_audit(
+            queryset.exclude(verification_status='verified'),
+            verification_values(HelpSeeker, request.user, timezone.now()),
+            request.user, 'verify', 'organization_name',
+        )
+        self.message_user(request, f'{verified} help seekers verified successfully.')
     verify_seekers.short_description = "✅ Verify selected help seekers"
 
     def reject_seekers(self, request, queryset):
         queryset.update(verification_status='rejected', verified_at=None, verified_by=None)
+        invalidate_cached_for(HelpSeeker)
         self.message_user(request, f'{queryset.count()} help seekers rejected.')
     reject_seekers.short_description = "❌ Reject selected help seekers"
 
     def mark_pending(self, request, queryset):
         queryset.update(verification_status='pending', verified_at=None, verified_by=None)
+        invalidate_cached_for(HelpSeeker)
         self.message_user(request, f'{queryset.count()} help seekers marked as pending.')
     mark_pending.short_description = "⏳ Mark as pending"
 
     def mark_urgent(self, request, queryset):
         queryset.update(is_urgent=True)
+        invalidate_cached_for(HelpSeeker)
         self.message_user(request, f'{queryset.count()} help seekers marked as urgent.')
     mark_urgent.short_description = "🚨 Mark as urgent"
 
     def mark_not_urgent(self, request, queryset):
         queryset.update(is_urgent=False)
+        invalidate_cached_for(HelpSeeker)
         self.message_user(request, f'{queryset.count()} help seekers marked as not urgent.')
     mark_not_urgent.short_description = "✅ Mark as not urgent"
 
 @admin.register(Donation)
-class DonationAdmin(admin.ModelAdmin):
-    list_display = ['title', 'donor', 'category', 'status', 'quantity', 'pickup_city', 'pickup_deadline', 'created_at']
+class DonationAdmin(UploadLimitsAdminMixin, AutocompleteSearchMixin, admin.ModelAdmin):
+    form = DonationAdminForm
+    list_display = ['title', 'donor', 'category', 'status', 'quantity', 'remaining_quantity', 'pickup_city', 'pickup_deadline', 'created_at']
     list_filter = ['category', 'status', 'food_type', 'created_at']
     search_fields = ['title', 'description', 'donor__user__username', 'pickup_city']
-    readonly_fields = ['created_at', 'updated_at']
+    autocomplete_search_fields = ['^title']
+    # Derived from quantity and the allocations (Donation.save)
+    readonly_fields = ['remaining_quantity', 'created_at', 'updated_at']
     list_per_page = 20
+    list_select_related = ('donor__user', 'category')
+    autocomplete_fields = ['donor', 'category', 'preferred_help_seekers']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(DonationCategory)
-class DonationCategoryAdmin(admin.ModelAdmin):
+class DonationCategoryAdmin(AutocompleteSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'icon', 'created_at']
     search_fields = ['name', 'description']
+    autocomplete_search_fields = ['^name']
     readonly_fields = ['created_at']
 
 @admin.register(HelpSeekerType)
-class HelpSeekerTypeAdmin(admin.ModelAdmin):
+class HelpSeekerTypeAdmin(AutocompleteSearchMixin, admin.ModelAdmin):
     list_display = ['name', 'icon', 'created_at']
     search_fields = ['name', 'description']
+    autocomplete_search_fields = ['^name']
     readonly_fields = ['created_at']
 
 # Register other models with basic admin
@@ -448,33 +432,114 @@ class DonationRequestAdmin(admin.ModelAdmin):
     list_display = ['donation', 'requester', 'status', 'requested_quantity', 'created_at']
     list_filter = ['status', 'created_at']
     readonly_fields = ['created_at']
+    list_select_related = ('donation', 'requester')
+    autocomplete_fields = ['donation', 'requester']
+
+@admin.register(DonationAllocation)
+class DonationAllocationAdmin(admin.ModelAdmin):
+    list_display = ['donation', 'request', 'quantity', 'created_at']
+    readonly_fields = ['created_at']
+    list_select_related = ('donation', 'request__donation', 'request__requester')
+    autocomplete_fields = ['donation']
+    raw_id_fields = ['request']
 
 @admin.register(DonationMatch)
 class DonationMatchAdmin(admin.ModelAdmin):
     list_display = ['donation', 'help_seeker', 'status', 'distance_km', 'match_score', 'created_at']
     list_filter = ['status', 'created_at']
     readonly_fields = ['created_at']
+    list_select_related = ('donation', 'help_seeker__seeker_type')
+    autocomplete_fields = ['donation', 'help_seeker']
 
 @admin.register(HelpRequest)
 class HelpRequestAdmin(admin.ModelAdmin):
     list_display = ['title', 'help_seeker', 'category', 'urgency', 'is_active', 'created_at']
     list_filter = ['urgency', 'is_active', 'category']
     readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ('help_seeker__seeker_type', 'category')
+    autocomplete_fields = ['help_seeker', 'category']
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
     list_display = ['user', 'message', 'is_read', 'created_at']
     list_filter = ['is_read', 'created_at']
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ('user',)
+    autocomplete_fields = ['user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 @admin.register(Feedback)
 class FeedbackAdmin(admin.ModelAdmin):
     list_display = ['user', 'donation', 'rating', 'created_at']
     list_filter = ['rating', 'created_at']
     readonly_fields = ['created_at']
+    list_select_related = ('user', 'donation')
+    autocomplete_fields = ['user', 'donation']
 
 @admin.register(Rating)
 class RatingAdmin(admin.ModelAdmin):
     list_display = ['donor', 'help_seeker', 'rating', 'created_at']
     list_filter = ['rating', 'created_at']
-    readonly_fields = ['created_at']
\ No newline at end of file
+    readonly_fields = ['created_at']
+    list_select_related = ('donor__user', 'help_seeker__seeker_type')
+    autocomplete_fields = ['donor', 'help_seeker']
+
+@admin.register(AuditLog)
+class AuditLogAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'actor', 'action', 'object_type', 'object_id', 'object_repr']
+    list_filter = ['action', 'object_type', 'created_at']
+    search_fields = ['object_repr', 'actor__username']
+    readonly_fields = ['actor', 'action', 'object_type', 'object_id', 'object_repr', 'created_at']
+    list_select_related = ('actor',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'status', 'processed', 'total', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status', 'created_at']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+    list_select_related = ('created_by',)
+    autocomplete_fields = ['created_by']
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'created_at']
+    list_filter = ['status', 'domain', 'created_at']
+    search_fields = ['=to', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ['requeue']
+
+    def requeue(self, request, queryset):
+        requeued = queryset.exclude(status='sent').update(status='queued', attempts=0, next_attempt_at=timezone.now())
+        self.message_user(request, f'{requeued} emails requeued.')
+    requeue.short_description = "🔁 Requeue selected emails"
+
+@admin.register(DigestEntry)
+class DigestEntryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'donation_request', 'created_at']
+    list_select_related = ('user', 'donation_request__donation', 'donation_request__requester')
+    search_fields = ['user__username']
+    autocomplete_fields = ['user']
+    raw_id_fields = ['donation_request']
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'size', 'refcount', 'created_at']
+    search_fields = ['name']
+    readonly_fields = ['name', 'size', 'refcount', 'created_at']
+
+@admin.register(Tombstone)
+class TombstoneAdmin(admin.ModelAdmin):
+    list_display = ['model_name', 'object_id', 'reason', 'user', 'created_at']
+    list_filter = ['model_name', 'reason']
+    readonly_fields = ['model_name', 'object_id', 'reason', 'user', 'created_at']
+    list_select_related = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
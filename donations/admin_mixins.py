@@ -0,0 +1,28 @@
+from django.urls import reverse
+
+
+class AutocompleteSearchMixin:
+    """
+    Autocomplete widgets query the related admin's search_fields on every
+    keystroke. For those lookups use prefix matches on indexed columns
+    (autocomplete_search_fields) instead of the broad icontains search used
+    on the changelist.
+    """
+    autocomplete_search_fields = ()
+
+    def get_search_fields(self, request):
+        if self.autocomplete_search_fields and request.path == reverse(f'{self.admin_site.name}:autocomplete'):
+            return self.autocomplete_search_fields
+        return super().get_search_fields(request)
+
+
+class UploadLimitsAdminMixin:
+    """
+    Enforce the upload limits of the admin's form (an UploadLimitsMixin
+    form) while files arrive, as donations.uploads.limit_uploads() does for
+    views. Inline forms are still checked when they are cleaned.
+    """
+
+    def changeform_view(self, request, *args, **kwargs):
+        request.upload_limits = self.form.field_limits()
+        return super().changeform_view(request, *args, **kwargs)
@@ -0,0 +1,129 @@
+from django.db.models import Q
+from django.utils.cache import get_conditional_response, quote_etag
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.routers import DefaultRouter
+from rest_framework.views import APIView
+
+from . import sync
+from .models import Donation, DonationMatch, HelpRequest, HelpSeeker
+from .serializers import (
+    DonationMatchSerializer, DonationSerializer, HelpRequestSerializer, HelpSeekerSerializer,
+)
+
+
+class NewestFirstCursorPagination(CursorPagination):
+    """Stable cursor paging over large, growing tables (no COUNT(*), no OFFSET)"""
+    ordering = ('-created_at', '-id')
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ReadOnlyApiViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Read-only endpoint with sparse fieldsets, eager loading driven by the
+    requested fields, and a per-object ETag built from updated_at.
+    """
+    pagination_class = NewestFirstCursorPagination
+    filter_backends = [DjangoFilterBackend]
+
+    def get_queryset(self):
+        return self.get_serializer_class().eager_load(super().get_queryset(), self.request)
+
+    def object_etag(self, instance):
+        fields = self.request.query_params.get('fields', '')
+        return quote_etag(f"{instance.pk}-{instance.updated_at.timestamp():.6f}-{fields}")
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.object_etag(instance)
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=int(instance.updated_at.timestamp()),
+        )
+        if not_modified is not None:
+            return not_modified
+        response = super().retrieve(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+    def get_object(self):
+        # retrieve() and the base implementation share one lookup per request
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()
+        return self._object
+
+
+class DonationViewSet(ReadOnlyApiViewSet):
+    queryset = Donation.objects.all()
+    serializer_class = DonationSerializer
+    filterset_fields = ['status', 'category', 'food_type', 'pickup_city']
+
+
+class HelpSeekerViewSet(ReadOnlyApiViewSet):
+    queryset = HelpSeeker.objects.all()
+    serializer_class = HelpSeekerSerializer
+    filterset_fields = ['seeker_type', 'city', 'verification_status', 'is_urgent']
+
+    def get_queryset(self):
+        # Like the public map, only verified seekers are listed; a seeker
+        # still sees their own profile while it is being reviewed
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_staff:
+            return queryset
+        return queryset.filter(Q(verification_status='verified') | Q(user=user))
+
+
+class HelpRequestViewSet(ReadOnlyApiViewSet):
+    queryset = HelpRequest.objects.all()
+    serializer_class = HelpRequestSerializer
+    filterset_fields = ['category', 'urgency', 'is_active', 'help_seeker']
+
+
+class DonationMatchViewSet(ReadOnlyApiViewSet):
+    queryset = DonationMatch.objects.all()
+    serializer_class = DonationMatchSerializer
+    filterset_fields = ['status', 'donation', 'help_seeker']
+
+    def get_queryset(self):
+        # Matches are private to the donor and the help seeker involved
+        queryset = super().get_queryset()
+        user = self.request.user
+        if user.is_staff:
+            return queryset
+        return queryset.filter(Q(donation__donor__user=user) | Q(help_seeker__user=user))
+
+
+class ChangesView(APIView):
+    """
+    Delta sync: GET /api/changes/?since=<token>&limit=<n>.
+
+    Without `since` the first batch of a full sync is returned. Clients
+    store `next` and keep calling while `has_more` is true. A `since` older
+    than sync.TOMBSTONE_RETENTION (30 days) starts a full sync again and
+    comes back with `reset` set: the client must drop its local copy.
+    """
+
+    def get(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', sync.DEFAULT_LIMIT)), sync.MAX_LIMIT)
+        except ValueError:
+            raise ValidationError({'limit': 'Must be an integer.'})
+        if limit < 1:
+            raise ValidationError({'limit': 'Must be at least 1.'})
+        try:
+            changes = sync.changes_since(request.user, request.query_params.get('since'), limit)
+        except sync.InvalidToken as e:
+            raise ValidationError({'since': str(e)})
+        return Response(changes)
+
+
+router = DefaultRouter()
+router.register('donations', DonationViewSet)
+router.register('help-seekers', HelpSeekerViewSet)
+router.register('help-requests', HelpRequestViewSet)
+router.register('donation-matches', DonationMatchViewSet)
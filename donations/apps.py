@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class DonationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'donations'
+
+    def ready(self):
+        from . import signals  # connect receivers
+        from .email_rendering import renderer
+        renderer.preload()
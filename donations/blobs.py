@@ -0,0 +1,84 @@
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+
+from .models import StoredBlob
+from .storage import ContentAddressedStorage
+
+
+def is_content_addressed(storage):
+    return isinstance(storage, ContentAddressedStorage)
+
+
+def retain(storage, names):
+    """Add a reference to each stored file name (no-op for other storages)"""
+    if not is_content_addressed(storage):
+        return
+    for name in filter(None, names):
+        if StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1):
+            continue
+        try:
+            with transaction.atomic():
+                StoredBlob.objects.create(name=name, size=storage.size(name), refcount=1)
+        except IntegrityError:
+            StoredBlob.objects.filter(name=name).update(refcount=F('refcount') + 1)
+
+
+def release(storage, names):
+    """
+    Drop a reference to each name. A content-addressed file whose count
+    reaches zero is deleted once the surrounding transaction commits; on
+    other storages the file is deleted straight away.
+    """
+    names = [name for name in names if name]
+    if not is_content_addressed(storage):
+        for name in names:
+            storage.delete(name)
+        return
+
+    StoredBlob.objects.filter(name__in=names, refcount__gt=0).update(refcount=F('refcount') - 1)
+
+    def delete_unreferenced():
+        for name in names:
+            deleted, _ = StoredBlob.objects.filter(name=name, refcount=0).delete()
+            if deleted:
+                storage.delete(name)
+
+    transaction.on_commit(delete_unreferenced)
+
+
+def file_fields(model):
+    return [f for f in model._meta.concrete_fields if isinstance(f, models.FileField)]
+
+
+def counted_fields(model):
+    """FileFields of `model` whose storage keeps reference counts"""
+    return [f for f in file_fields(model) if is_content_addressed(f.storage)]
+
+
+def remember_files(sender, instance, **kwargs):
+    """pre_save: note which files the row pointed at before this save"""
+    fields = counted_fields(sender)
+    if instance._state.adding or not fields:
+        instance._stored_files = {}
+        return
+    instance._stored_files = sender._default_manager.filter(pk=instance.pk).values(
+        *[f.attname for f in fields]
+    ).first() or {}
+
+
+def update_references(sender, instance, **kwargs):
+    """post_save: retain newly referenced files, release replaced ones"""
+    previous = getattr(instance, '_stored_files', {})
+    for field in counted_fields(sender):
+        old = previous.get(field.attname) or ''
+        new = getattr(instance, field.attname).name or ''
+        if old != new:
+            retain(field.storage, [new])
+            release(field.storage, [old])
+    instance._stored_files = {}
+
+
+def drop_references(sender, instance, **kwargs):
+    """post_delete: release every file the deleted row referenced"""
+    for field in counted_fields(sender):
+        release(field.storage, [getattr(instance, field.attname).name])
@@ -0,0 +1,240 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import advance, enqueue_job
+from .models import AuditLog, DonorProfile, HelpSeeker, Notification
+from .signals import invalidate_cached_for
+
+# Profile type (as used by the superuser panel) -> (model, field used for audit repr, label)
+PROFILE_TYPES = {
+    'donor': (DonorProfile, 'user__username', 'Donor profile'),
+    'seeker': (HelpSeeker, 'organization_name', 'Help seeker profile'),
+}
+
+# Keeps every IN (...) list well below SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+
+def async_threshold():
+    """Batches larger than this are handed to the background worker"""
+    return getattr(settings, 'BULK_ACTION_ASYNC_THRESHOLD', 200)
+
+
+def parse_ids(values):
+    """
+    Parse posted IDs into a sorted list of unique integers.
+
+    The panel posts comma separated values in a single hidden input, plain
+    multi-value fields are accepted too. Anything non-numeric is ignored.
+    """
+    ids = set()
+    for value in values:
+        for part in str(value).split(','):
+            part = part.strip()
+            if part.isdigit():
+                ids.add(int(part))
+    return sorted(ids)
+
+
+def chunked(ids, size=CHUNK_SIZE):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def write_audit_entries(actor, action, object_type, rows):
+    """bulk_create one AuditLog entry per (pk, repr) row"""
+    AuditLog.objects.bulk_create([
+        AuditLog(
+            actor=actor,
+            action=action,
+            object_type=object_type,
+            object_id=pk,
+            object_repr=(repr_value or '')[:255],
+        )
+        for pk, repr_value in rows
+    ])
+
+
+def update_with_audit(queryset, values, actor, action, repr_field):
+    """
+    Apply `values` to every row of `queryset` with chunked UPDATEs and write
+    one audit entry per row, all in a single transaction.
+
+    Returns the number of rows updated.
+    """
+    model = queryset.model
+    with transaction.atomic():
+        rows = list(queryset.select_for_update().values_list('pk', repr_field))
+        updated = 0
+        for chunk in chunked([pk for pk, _ in rows]):
+            updated += model.objects.filter(pk__in=chunk).update(**values)
+        write_audit_entries(actor, action, model._meta.model_name, rows)
+        invalidate_cached_for(model)
+    return updated
+
+
+def verification_values(model, actor, now):
+    values = {
+        'verification_status': 'verified',
+        'verified_at': now,
+        'verified_by': actor,
+    }
+    # QuerySet.update() skips auto_now, keep updated_at honest by hand
+    if any(f.name == 'updated_at' for f in model._meta.concrete_fields):
+        values['updated_at'] = now
+    return values
+
+
+def verify_profiles(profile_type, ids, actor):
+    """
+    Verify the given profiles with set-based UPDATEs in one transaction.
+
+    Profiles that are already verified or do not exist are skipped, so the
+    returned count is the number of profiles that actually changed.
+    """
+    model, repr_field, label = PROFILE_TYPES[profile_type]
+    object_type = model._meta.model_name
+    now = timezone.now()
+    verified = 0
+
+    with transaction.atomic():
+        for chunk in chunked(ids):
+            rows = list(
+                model.objects.select_for_update()
+                .filter(pk__in=chunk)
+                .exclude(verification_status='verified')
+                .values_list('pk', 'user_id', repr_field)
+            )
+            if not rows:
+                continue
+
+            pks = [pk for pk, _, _ in rows]
+            verified += model.objects.filter(pk__in=pks).update(
+                **verification_values(model, actor, now)
+            )
+
+            Notification.objects.bulk_create([
+                Notification(
+                    user_id=user_id,
+                    message=f"Your {label.lower()} has been verified.",
+                    link="/verification/status/",
+                )
+                for _, user_id, _ in rows
+            ])
+            write_audit_entries(actor, 'verify', object_type,
+                                [(pk, repr_value) for pk, _, repr_value in rows])
+        # update() sends no post_save
+        invalidate_cached_for(model)
+
+    return verified
+
+
+def delete_profiles(profile_type, ids, actor, delete_users=False):
+    """
+    Delete the given profiles (and optionally their users) in one transaction.
+
+    Returns the number of profiles deleted. Users that keep their account are
+    notified, every deleted profile gets an audit entry.
+    """
+    model, repr_field, label = PROFILE_TYPES[profile_type]
+    object_type = model._meta.model_name
+    deleted = 0
+
+    with transaction.atomic():
+        for chunk in chunked(ids):
+            rows = list(
+                model.objects.select_for_update()
+                .filter(pk__in=chunk)
+                .values_list('pk', 'user_id', repr_field)
+            )
+            if not rows:
+                continue
+
+            pks = [pk for pk, _, _ in rows]
+            user_ids = [user_id for _, user_id, _ in rows]
+
+            _, per_model = model.objects.filter(pk__in=pks).delete()
+            deleted += per_model.get(model._meta.label, 0)
+
+            # Written before the users go so a self-deleting actor is nulled, not dangling
+            write_audit_entries(actor, 'delete', object_type,
+                                [(pk, repr_value) for pk, _, repr_value in rows])
+
+            if delete_users:
+                User.objects.filter(pk__in=user_ids).delete()
+            else:
+                Notification.objects.bulk_create([
+                    Notification(
+                        user_id=user_id,
+                        message=f"Your {label.lower()} has been removed by an administrator.",
+                        link="/profile/",
+                    )
+                    for user_id in user_ids
+                ])
+
+    return deleted
+
+
+def verify_donors_and_seekers(donor_ids, seeker_ids, actor, on_chunk=None):
+    """
+    verify_profiles() for both profile types in one transaction, so a
+    failure in either half leaves nothing verified. Returns the count.
+    """
+    verified = 0
+    with transaction.atomic():
+        for profile_type, ids in [('donor', donor_ids), ('seeker', seeker_ids)]:
+            for chunk in chunked(ids):
+                verified += verify_profiles(profile_type, chunk, actor)
+                if on_chunk:
+                    on_chunk(len(chunk))
+    return verified
+
+
+def delete_donors_and_seekers(donor_ids, seeker_ids, actor, delete_users=False, on_chunk=None):
+    """delete_profiles() for both profile types in one transaction; returns the count"""
+    deleted = 0
+    with transaction.atomic():
+        for profile_type, ids in [('donor', donor_ids), ('seeker', seeker_ids)]:
+            for chunk in chunked(ids):
+                deleted += delete_profiles(profile_type, chunk, actor, delete_users=delete_users)
+                if on_chunk:
+                    on_chunk(len(chunk))
+    return deleted
+
+
+def queue_bulk_job(kind, donor_ids, seeker_ids, actor, **options):
+    payload = {
+        'donor_ids': donor_ids,
+        'seeker_ids': seeker_ids,
+        'actor_id': actor.pk,
+        **options,
+    }
+    return enqueue_job(kind, payload, total=len(donor_ids) + len(seeker_ids), user=actor)
+
+
+def _job_actor(job):
+    return User.objects.filter(pk=job.payload.get('actor_id')).first()
+
+
+# The handlers run in one transaction like the synchronous views, so the
+# panel sees the job's progress only once it has finished
+
+def run_bulk_verify_job(job):
+    """Background handler for bulk_verify_profiles jobs"""
+    verified = verify_donors_and_seekers(
+        job.payload.get('donor_ids', []), job.payload.get('seeker_ids', []), _job_actor(job),
+        on_chunk=lambda count: advance(job, count),
+    )
+    return f"{verified} profiles verified"
+
+
+def run_bulk_delete_job(job):
+    """Background handler for bulk_delete_profiles jobs"""
+    deleted = delete_donors_and_seekers(
+        job.payload.get('donor_ids', []), job.payload.get('seeker_ids', []), _job_actor(job),
+        delete_users=job.payload.get('delete_users', False),
+        on_chunk=lambda count: advance(job, count),
+    )
+    return f"{deleted} profiles deleted"
@@ -0,0 +1,202 @@
+import math
+import pickle
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .routers import use_primary
+
+# Keys of the values built by memoize() below (see signals.py for invalidation)
+HOME_STATS_KEY = 'home:stats'
+HELP_SEEKER_MAP_KEY = 'help-seekers:map'
+
+# Per-process L1 stores, shared by the per-thread backend instances
+_local_caches = {}
+_local_locks = {}
+
+
+class TieredCache(BaseCache):
+    """
+    Two-level cache: a small per-process LRU (L1) in front of the shared
+    cache named by OPTIONS['SHARED'] (L2: Redis, files, database, ...).
+
+    Reads are answered from L1 when possible, otherwise from L2, and the L2
+    value is then kept in L1 for at most OPTIONS['LOCAL_TIMEOUT'] seconds.
+    Writes and deletes go to both. Other processes are not told about a
+    delete, so they may serve their L1 copy until it times out; keep
+    LOCAL_TIMEOUT short. MAX_ENTRIES bounds the L1 size.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._local = _local_caches.setdefault(location, OrderedDict())
+        self._lock = _local_locks.setdefault(location, threading.Lock())
+
+    @property
+    def shared(self):
+        # caches[] hands out one instance per thread
+        return caches[self.shared_alias]
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires, pickled = entry
+            if expires <= time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+        return pickled
+
+    def _local_set(self, key, value, timeout):
+        seconds = self.local_timeout if timeout is None else min(timeout, self.local_timeout)
+        if seconds <= 0:
+            self._local_delete(key)
+            return
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        with self._lock:
+            self._local[key] = (time.monotonic() + seconds, pickled)
+            self._local.move_to_end(key)
+            while len(self._local) > self._max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._lock:
+            return self._local.pop(key, None) is not None
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        pickled = self._local_get(local_key)
+        if pickled is not None:
+            return pickle.loads(pickled)
+        missing = object()
+        value = self.shared.get(key, missing, version=version)
+        if value is missing:
+            return default
+        self._local_set(local_key, value, self.local_timeout)
+        return value
+
+    def _timeout(self, timeout):
+        # Relative seconds (None = forever), converted by the shared cache itself
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._local_set(self.make_and_validate_key(key, version=version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._local_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self._timeout(timeout), version=version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.delete(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self.make_and_validate_key(key, version=version))
+        return self.shared.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+
+# Process-wide recomputations in progress: key -> Event set when done
+_flights = {}
+_flights_lock = threading.Lock()
+
+# How long a recomputation may hold the cross-process lock, and how long
+# callers without any value wait for it before computing themselves
+LOCK_TIMEOUT = 10
+
+
+def memoize(key, compute, timeout, beta=1.0, cache_alias='default'):
+    """
+    Return compute() cached under `key` for `timeout` seconds, without a
+    stampede when it runs out.
+
+    * Probabilistic early expiry: each read may decide to recompute a bit
+      before the value expires, more likely the closer it is and the longer
+      compute() took last time (beta > 1 favours earlier refreshes).
+    * Single flight: one caller per key recomputes, guarded by a lock within
+      the process and a cache.add() lock across processes. The others keep
+      serving the previous value, which the cache keeps for another
+      `timeout` seconds past its expiry, or wait for the new one when there
+      is none.
+    """
+    cache = caches[cache_alias]
+    entry = cache.get(key)
+    if entry is not None and not _should_refresh(entry, beta):
+        return entry[0]
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = threading.Event()
+    if leader:
+        try:
+            lock_key = f'{key}:refreshing'
+            if cache.add(lock_key, True, LOCK_TIMEOUT):
+                try:
+                    return _refresh(cache, key, compute, timeout)
+                finally:
+                    cache.delete(lock_key)
+        finally:
+            with _flights_lock:
+                del _flights[key]
+            flight.set()
+        # Another process holds the lock; there is nothing to wait on locally
+        flight = threading.Event()
+
+    # Somebody else is refreshing it
+    if entry is not None:
+        return entry[0]
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        done = flight.wait(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+        if done:
+            # The refresh in this process failed
+            break
+    return _refresh(cache, key, compute, timeout)
+
+
+def _should_refresh(entry, beta):
+    # XFetch: expires - delta * beta * ln(rand) crosses now earlier for slow values
+    value, delta, expires = entry
+    return time.time() - delta * beta * math.log(1.0 - random.random()) >= expires
+
+
+def _refresh(cache, key, compute, timeout):
+    started = time.time()
+    # A lagging replica would keep a stale value cached for `timeout` seconds
+    with use_primary():
+        value = compute()
+    finished = time.time()
+    cache.set(key, (value, finished - started, finished + timeout), timeout * 2)
+    return value
+
+
+def invalidate(*keys, cache_alias='default'):
+    caches[cache_alias].delete_many(keys)
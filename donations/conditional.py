@@ -0,0 +1,68 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.middleware.csrf import get_token
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+
+from .models import Notification
+
+
+def notification_version(user):
+    """Changes whenever one of the user's notifications is added, changed or removed"""
+    if not user.is_authenticated:
+        return ()
+    return tuple(Notification.objects.filter(user=user).aggregate(Max('updated_at'), Count('id')).values())
+
+
+def conditional_page(page_state):
+    """
+    Answer GET/HEAD with 304 Not Modified, without running the view, while
+    nothing the page shows has changed.
+
+    page_state(request, *args, **kwargs) returns the values the page
+    depends on (updated_at timestamps, counts, statuses), or None when the
+    view should just run, e.g. for a missing object or a user who is about
+    to be redirected. The ETag hashes those values together with the user,
+    their notification version (the navbar) and the CSRF secret (forms on
+    the page); Last-Modified is the newest timestamp among them.
+
+    The view always runs when flash messages are waiting to be shown.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+                return view(request, *args, **kwargs)
+            state = page_state(request, *args, **kwargs)
+            if state is None:
+                return view(request, *args, **kwargs)
+
+            # Make sure the CSRF secret exists now, so the page rendered below uses the one hashed here
+            get_token(request)
+            state = [
+                *state,
+                request.user.pk,
+                *notification_version(request.user),
+                request.META.get('CSRF_COOKIE'),
+            ]
+            etag = quote_etag(hashlib.md5(repr(state).encode(), usedforsecurity=False).hexdigest())
+            moments = [value for value in state if isinstance(value, datetime)]
+            last_modified = int(max(moments).timestamp()) if moments else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                response['ETag'] = etag
+                if last_modified is not None:
+                    response['Last-Modified'] = http_date(last_modified)
+            # Per-user HTML: browsers may keep it but must check back every time
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
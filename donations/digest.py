@@ -0,0 +1,76 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .email_rendering import renderer
+from .models import DigestEntry
+from .outbox import enqueue
+
+
+def digest_window():
+    return timedelta(minutes=getattr(settings, 'EMAIL_DIGEST_WINDOW_MINUTES', 24 * 60))
+
+
+def wants_digest(user):
+    profile = getattr(user, 'userprofile', None)
+    return profile is not None and profile.email_delivery == 'digest'
+
+
+def hold_for_digest(donation_request, donor):
+    """
+    Record a new request for the donor's next digest instead of emailing
+    them right away. Returns False for donors on immediate delivery.
+    """
+    if not wants_digest(donor):
+        return False
+    DigestEntry.objects.create(user=donor, donation_request=donation_request)
+    return True
+
+
+def build_digest(user, donation_requests):
+    count = len(donation_requests)
+    return renderer.build(
+        'emails/donation_request_digest',
+        {'donor': user, 'donation_requests': donation_requests},
+        subject=f"🎁 {count} new donation request{'s' if count != 1 else ''}",
+        to=[user.email],
+    )
+
+
+def send_due_digests(now=None, force=False):
+    """
+    Queue one digest email per donor whose oldest held request is at least
+    one window old (or every donor with held requests when force=True).
+
+    Entries are locked with skip_locked and deleted in the same transaction
+    as the outbox insert, so overlapping runs never send a request twice.
+    Returns the number of digests queued.
+    """
+    now = now or timezone.now()
+    due = DigestEntry.objects.values('user').annotate(oldest=Min('created_at'))
+    if not force:
+        due = due.filter(oldest__lte=now - digest_window())
+    user_ids = [row['user'] for row in due]
+
+    sent = 0
+    for user_id in user_ids:
+        with transaction.atomic():
+            entries = list(
+                DigestEntry.objects.select_for_update(skip_locked=True, of=('self',))
+                .filter(user_id=user_id)
+                .select_related(
+                    'user',
+                    'donation_request__donation__category',
+                    'donation_request__requester',
+                )
+                .order_by('created_at')
+            )
+            if not entries:
+                continue
+            enqueue(build_digest(entries[0].user, [e.donation_request for e in entries]))
+            DigestEntry.objects.filter(pk__in=[e.pk for e in entries]).delete()
+            sent += 1
+    return sent
@@ -0,0 +1,118 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template import Context, TemplateDoesNotExist, engines
+from django.utils.html import strip_tags
+
+
+class EmailRenderer:
+    """
+    Renders email bodies from compiled templates kept in memory.
+
+    An email is named by its template path without extension
+    ('emails/welcome_email'): the HTML part comes from '<name>.html' and the
+    plain-text part from '<name>.txt' when that template exists, falling
+    back to strip_tags() on the HTML otherwise. site_url and site_name are
+    added to every context.
+    """
+
+    def __init__(self, directory='emails'):
+        self.directory = directory
+        self.clear()
+
+    def clear(self):
+        self._templates = {}
+        self._base_context = None
+
+    @property
+    def engine(self):
+        return engines['django'].engine
+
+    def preload(self):
+        """Compile every template under <template dir>/emails/ ahead of the first send"""
+        for template_dir in self.engine.dirs:
+            folder = Path(template_dir) / self.directory
+            if not folder.is_dir():
+                continue
+            for path in folder.iterdir():
+                if path.suffix in ('.html', '.txt'):
+                    self.get(f'{self.directory}/{path.name}')
+        return len(self._templates)
+
+    def get(self, name):
+        """The compiled template for `name`, or None if there is no such template"""
+        if name not in self._templates:
+            try:
+                self._templates[name] = self.engine.get_template(name)
+            except TemplateDoesNotExist:
+                self._templates[name] = None
+        return self._templates[name]
+
+    @property
+    def base_context(self):
+        if self._base_context is None:
+            self._base_context = {
+                'site_url': getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000'),
+                'site_name': getattr(settings, 'SITE_NAME', 'UHV ShareHub'),
+            }
+        return self._base_context
+
+    def _render_parts(self, name, context):
+        html_template = self.get(f'{name}.html')
+        if html_template is None:
+            raise TemplateDoesNotExist(f'{name}.html')
+        context.autoescape = True
+        html = html_template.render(context)
+
+        text_template = self.get(f'{name}.txt')
+        if text_template is None:
+            return html, strip_tags(html)
+        # The text part is not HTML, so nothing in it should be entity-escaped
+        context.autoescape = False
+        try:
+            return html, text_template.render(context)
+        finally:
+            context.autoescape = True
+
+    def render(self, name, context):
+        """Return (html, text) for one email"""
+        return self._render_parts(name, Context({**self.base_context, **context}))
+
+    def render_batch(self, name, shared_context, recipient_contexts):
+        """
+        Return (html, text) for each dict in recipient_contexts. The shared
+        context is built once and each recipient's values are pushed on top
+        of it for the duration of their render.
+        """
+        context = Context({**self.base_context, **shared_context})
+        results = []
+        for extra in recipient_contexts:
+            with context.push(extra):
+                results.append(self._render_parts(name, context))
+        return results
+
+    def build(self, name, context, subject, to, from_email=None, reply_to=None):
+        """Render `name` into an EmailMultiAlternatives ready to send or enqueue"""
+        html, text = self.render(name, context)
+        sender = from_email or settings.EMAIL_CONFIG['NOTIFICATIONS']
+        email = EmailMultiAlternatives(
+            subject=subject,
+            body=text,
+            from_email=sender,
+            to=to,
+            reply_to=reply_to or [sender],
+        )
+        email.attach_alternative(html, 'text/html')
+        return email
+
+
+renderer = EmailRenderer()
+
+
+@receiver(setting_changed)
+def reset_renderer(setting, **kwargs):
+    if setting in ('SITE_URL', 'SITE_NAME', 'TEMPLATES'):
+        renderer.clear()
@@ -1,9 +1,15 @@
+import logging
+
 from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
 from django.conf import settings
 from django.urls import reverse
 
+from .digest import hold_for_digest
+from .email_rendering import renderer
+from .outbox import enqueue
+
+logger = logging.getLogger(__name__)
+
 def send_donation_request_email(donation_request):
     """
     Send email to donor when someone requests their donation
@@ -13,6 +19,11 @@ def send_donation_request_email(donation_request):
         donor = donation.donor.user
         requester = donation_request.requester
         
+        # Donors on digest delivery hear about it in their next digest
+        if hold_for_digest(donation_request, donor):
+            logger.info("Donation request held for %s's digest", donor.email)
+            return True
+        
         # Get requester profile information
         requester_profile = None
         requester_type = "Individual"
@@ -32,18 +43,14 @@ def send_donation_request_email(donation_request):
             'requester_profile': requester_profile,
             'requester_type': requester_type,
             'donor': donor,
-            'site_url': getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000'),
-            'site_name': getattr(settings, 'SITE_NAME', 'UHV ShareHub'),
+            'admin_url': f"{renderer.base_context['site_url']}{reverse('donation_requests', args=[donation.id])}",
         }
         
         # Subject line
         subject = f"🎁 New Donation Request: {donation.title}"
         
-        # Render HTML content
-        html_content = render_to_string('emails/donation_request_notification.html', context)
-        
-        # Render plain text content
-        text_content = strip_tags(html_content)
+        # Render HTML and text parts
+        html_content, text_content = renderer.render('emails/donation_request_notification', context)
         
         # Create email
         email = EmailMultiAlternatives(
@@ -57,14 +64,14 @@ def send_donation_request_email(donation_request):
         # Attach HTML version
         email.attach_alternative(html_content, "text/html")
         
-        # Send email
-        email.send(fail_silently=False)
+        # Queue for the send_queued_mail worker
+        enqueue(email)
         
-        print(f"✅ Donation request email sent to {donor.email}")
+        logger.info("Donation request email queued for %s", donor.email)
         return True
         
-    except Exception as e:
-        print(f"❌ Error sending donation request email: {str(e)}")
+    except Exception:
+        logger.exception("Error sending donation request email")
         return False
 
 def send_request_status_email(donation_request, old_status, new_status):
@@ -84,8 +91,6 @@ def send_request_status_email(donation_request, old_status, new_status):
             'donor': donor,
             'old_status': old_status,
             'new_status': new_status,
-            'site_url': getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000'),
-            'site_name': getattr(settings, 'SITE_NAME', 'UHV ShareHub'),
         }
         
         # Subject based on status
@@ -98,11 +103,8 @@ def send_request_status_email(donation_request, old_status, new_status):
         else:
             subject = f"📝 Donation Request Updated: {donation.title}"
         
-        # Render HTML content
-        html_content = render_to_string('emails/request_status_update.html', context)
-        
-        # Render plain text content
-        text_content = strip_tags(html_content)
+        # Render HTML and text parts
+        html_content, text_content = renderer.render('emails/request_status_update', context)
         
         # Create email
         email = EmailMultiAlternatives(
@@ -116,14 +118,14 @@ def send_request_status_email(donation_request, old_status, new_status):
         # Attach HTML version
         email.attach_alternative(html_content, "text/html")
         
-        # Send email
-        email.send(fail_silently=False)
+        # Queue for the send_queued_mail worker
+        enqueue(email)
         
-        print(f"✅ Request status email sent to {requester.email}")
+        logger.info("Request status email queued for %s", requester.email)
         return True
         
-    except Exception as e:
-        print(f"❌ Error sending request status email: {str(e)}")
+    except Exception:
+        logger.exception("Error sending request status email")
         return False
 
 def send_donation_match_email(donation_match, email_type):
@@ -140,12 +142,10 @@ def send_donation_match_email(donation_match, email_type):
                 'donation_match': donation_match,
                 'help_seeker': help_seeker,
                 'donation': donation,
-                'site_url': getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000'),
-                'site_name': getattr(settings, 'SITE_NAME', 'UHV ShareHub'),
             }
             
             subject = f"🎁 New Donation Offer: {donation.title}"
-            html_content = render_to_string('emails/donation_match_proposal.html', context)
+            html_content, text_content = renderer.render('emails/donation_match_proposal', context)
             
         elif email_type == 'accepted':
             # Email to donor about accepted offer
@@ -156,12 +156,10 @@ def send_donation_match_email(donation_match, email_type):
                 'donation_match': donation_match,
                 'donor': donor,
                 'help_seeker': help_seeker,
-                'site_url': getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000'),
-                'site_name': getattr(settings, 'SITE_NAME', 'UHV ShareHub'),
             }
             
             subject = f"✅ Donation Accepted: {donation_match.donation.title}"
-            html_content = render_to_string('emails/donation_match_accepted.html', context)
+            html_content, text_content = renderer.render('emails/donation_match_accepted', context)
             
         elif email_type == 'rejected':
             # Email to donor about rejected offer
@@ -172,14 +170,10 @@ def send_donation_match_email(donation_match, email_type):
                 'donation_match': donation_match,
                 'donor': donor,
                 'help_seeker': help_seeker,
-                'site_url': getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000'),
-                'site_name': getattr(settings, 'SITE_NAME', 'UHV ShareHub'),
             }
             
             subject = f"❌ Donation Declined: {donation_match.donation.title}"
-            html_content = render_to_string('emails/donation_match_rejected.html', context)
-        
-        text_content = strip_tags(html_content)
+            html_content, text_content = renderer.render('emails/donation_match_rejected', context)
         
         # Determine recipient
         if email_type == 'proposal':
@@ -187,7 +181,7 @@ def send_donation_match_email(donation_match, email_type):
         else:
             recipient = donor.email
         
-        # Create and send email
+        # Create and queue email
         email = EmailMultiAlternatives(
             subject=subject,
             body=text_content,
@@ -197,13 +191,13 @@ def send_donation_match_email(donation_match, email_type):
         )
         
         email.attach_alternative(html_content, "text/html")
-        email.send(fail_silently=False)
+        enqueue(email)
         
-        print(f"✅ Donation match email sent to {recipient}")
+        logger.info("Donation match email queued for %s", recipient)
         return True
         
-    except Exception as e:
-        print(f"❌ Error sending donation match email: {str(e)}")
+    except Exception:
+        logger.exception("Error sending donation match email")
         return False
 
 def send_welcome_email(user):
@@ -213,13 +207,10 @@ def send_welcome_email(user):
     try:
         context = {
             'user': user,
-            'site_url': getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000'),
-            'site_name': getattr(settings, 'SITE_NAME', 'UHV ShareHub'),
         }
         
         subject = f"🎉 Welcome to {getattr(settings, 'SITE_NAME', 'UHV ShareHub')}!"
-        html_content = render_to_string('emails/welcome_email.html', context)
-        text_content = strip_tags(html_content)
+        html_content, text_content = renderer.render('emails/welcome_email', context)
         
         email = EmailMultiAlternatives(
             subject=subject,
@@ -230,11 +221,11 @@ def send_welcome_email(user):
         )
         
         email.attach_alternative(html_content, "text/html")
-        email.send(fail_silently=True)
+        enqueue(email)
         
-        print(f"✅ Welcome email sent to {user.email}")
+        logger.info("Welcome email queued for %s", user.email)
         return True
         
-    except Exception as e:
-        print(f"❌ Error sending welcome email: {str(e)}")
+    except Exception:
+        logger.exception("Error sending welcome email")
         return False
\ No newline at end of file
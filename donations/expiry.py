@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Donation
+from .routers import use_primary
+from .signals import donations_expired
+
+# Shortest sleep between sweeps: a due donation that stays due (locked by
+# another sweeper, or not yet expired on a lagging replica) must not make
+# --loop spin
+MIN_SLEEP_SECONDS = 1
+
+
+def due_donations(now):
+    """Available donations whose pickup deadline has passed (served by the (status, pickup_deadline) index)"""
+    return Donation.objects.filter(status='available', pickup_deadline__lte=now)
+
+
+def expire_due_donations(now=None, chunk_size=500):
+    """
+    Flip every due donation to 'expired' in chunks of `chunk_size`.
+
+    Each chunk is claimed and updated in its own short transaction, then
+    donations_expired is sent for it once committed. Returns the number of
+    donations expired.
+    """
+    now = now or timezone.now()
+    expired = 0
+
+    while True:
+        with transaction.atomic():
+            ids = list(
+                due_donations(now)
+                .select_for_update(skip_locked=True)
+                .order_by('pickup_deadline')
+                .values_list('pk', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            # bulk update() bypasses auto_now, set updated_at so delta consumers see the change
+            Donation.objects.filter(pk__in=ids).update(status='expired', updated_at=now)
+            transaction.on_commit(
+                lambda ids=ids: donations_expired.send(sender=Donation, donation_ids=ids)
+            )
+
+        expired += len(ids)
+        if len(ids) < chunk_size:
+            break
+
+    return expired
+
+
+def next_expiry_at():
+    """Pickup deadline of the next available donation to expire, or None"""
+    # From the primary: a replica may still list donations that were just expired
+    with use_primary():
+        return (
+            Donation.objects.filter(status='available')
+            .order_by('pickup_deadline')
+            .values_list('pickup_deadline', flat=True)
+            .first()
+        )
+
+
+def seconds_until_next_expiry(max_interval, now=None):
+    """
+    How long the sweeper may sleep: until the next deadline, capped at
+    max_interval and at least MIN_SLEEP_SECONDS
+    """
+    now = now or timezone.now()
+    next_at = next_expiry_at()
+    if next_at is None:
+        return max(MIN_SLEEP_SECONDS, max_interval)
+    return max(MIN_SLEEP_SECONDS, min(max_interval, (next_at - now).total_seconds()))
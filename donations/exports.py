@@ -0,0 +1,185 @@
+import csv
+import zlib
+from datetime import date, datetime
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Donation, DonationMatch, DonationRequest, VerificationRequest
+
+# Export name -> (model, [(column header, values_list lookup), ...])
+EXPORTS = {
+    'donations': (Donation, [
+        ('id', 'id'),
+        ('title', 'title'),
+        ('category', 'category__name'),
+        ('donor', 'donor__user__username'),
+        ('donor_type', 'donor__user_type'),
+        ('quantity', 'quantity'),
+        ('remaining_quantity', 'remaining_quantity'),
+        ('food_type', 'food_type'),
+        ('status', 'status'),
+        ('pickup_city', 'pickup_city'),
+        ('pickup_state', 'pickup_state'),
+        ('pickup_deadline', 'pickup_deadline'),
+        ('latitude', 'latitude'),
+        ('longitude', 'longitude'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+    'donation-requests': (DonationRequest, [
+        ('id', 'id'),
+        ('donation_id', 'donation_id'),
+        ('donation', 'donation__title'),
+        ('requester', 'requester__username'),
+        ('requested_quantity', 'requested_quantity'),
+        ('status', 'status'),
+        ('message', 'message'),
+        ('created_at', 'created_at'),
+    ]),
+    'donation-matches': (DonationMatch, [
+        ('id', 'id'),
+        ('donation_id', 'donation_id'),
+        ('donation', 'donation__title'),
+        ('help_seeker_id', 'help_seeker_id'),
+        ('organization', 'help_seeker__organization_name'),
+        ('status', 'status'),
+        ('distance_km', 'distance_km'),
+        ('match_score', 'match_score'),
+        ('scheduled_pickup', 'scheduled_pickup'),
+        ('actual_delivery', 'actual_delivery'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    ]),
+    'verification-requests': (VerificationRequest, [
+        ('id', 'id'),
+        ('user', 'user__username'),
+        ('verification_type', 'verification_type'),
+        ('status', 'status'),
+        ('document', 'document'),
+        ('submitted_at', 'submitted_at'),
+        ('reviewed_at', 'reviewed_at'),
+        ('reviewed_by', 'reviewed_by__username'),
+        ('notes', 'notes'),
+    ]),
+}
+
+FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'jsonl': ('application/x-ndjson', '.jsonl'),
+}
+
+# Rows fetched per database round trip
+CHUNK_SIZE = 2000
+
+# Encoded output is handed on in pieces of about this size
+BUFFER_SIZE = 64 * 1024
+
+
+class Echo:
+    """File-like object whose write() just returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(name, chunk_size=CHUNK_SIZE):
+    """
+    Header tuple, then one tuple per row, fetched `chunk_size` at a time.
+
+    Rows are read in primary key order straight off the index; on
+    PostgreSQL iterator() uses a server-side cursor, so memory stays flat
+    however large the table.
+    """
+    model, columns = EXPORTS[name]
+    yield tuple(header for header, _ in columns)
+    queryset = model._default_manager.order_by('pk').values_list(*(lookup for _, lookup in columns))
+    yield from queryset.iterator(chunk_size=chunk_size)
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+# Spreadsheets evaluate cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    value = _text(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        # A leading quote makes the spreadsheet show the text as typed
+        return "'" + value
+    return value
+
+
+def encode_csv(rows):
+    writer = csv.writer(Echo())
+    for row in rows:
+        yield writer.writerow([_csv_cell(value) for value in row])
+
+
+def encode_jsonl(rows):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    rows = iter(rows)
+    header = next(rows)
+    for row in rows:
+        yield encoder.encode(dict(zip(header, row))) + '\n'
+
+
+ENCODERS = {'csv': encode_csv, 'jsonl': encode_jsonl}
+
+
+def stream_export(name, fmt='csv', compress=False, chunk_size=CHUNK_SIZE):
+    """
+    Yield the export as bytes in ~BUFFER_SIZE pieces, gzip-compressed on
+    the fly when `compress` is set.
+    """
+    gzip = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer, size = [], 0
+    for text in ENCODERS[fmt](export_rows(name, chunk_size)):
+        buffer.append(text)
+        size += len(text)
+        if size >= BUFFER_SIZE:
+            data = ''.join(buffer).encode()
+            buffer, size = [], 0
+            data = gzip.compress(data) if gzip else data
+            if data:
+                yield data
+    data = ''.join(buffer).encode()
+    if gzip:
+        data = gzip.compress(data) + gzip.flush()
+    if data:
+        yield data
+
+
+def export_filename(name, fmt, compress=False):
+    extension = FORMATS[fmt][1] + ('.gz' if compress else '')
+    return f"{name}-{timezone.localdate():%Y%m%d}{extension}"
+
+
+@staff_member_required
+def export_data(request, name):
+    """
+    Download a whole table as CSV (default) or JSON Lines:
+    /exports/<name>/?format=jsonl&gzip=1
+    """
+    fmt = request.GET.get('format', 'csv')
+    if name not in EXPORTS or fmt not in FORMATS:
+        raise Http404
+    compress = request.GET.get('gzip') in ('1', 'true', 'yes')
+
+    response = StreamingHttpResponse(
+        stream_export(name, fmt, compress),
+        content_type='application/gzip' if compress else f'{FORMATS[fmt][0]}; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export_filename(name, fmt, compress)}"'
+    # Keep reverse proxies from buffering the whole download before sending it on
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -3,9 +3,12 @@ from .models import (
     Donation, DonorProfile, DonationRequest, HelpSeeker, 
     HelpRequest, DonationMatch, VerificationRequest, DonationCategory
 )
+from .uploads import UploadLimitsMixin
 
 
-class DonorProfileForm(forms.ModelForm):
+class DonorProfileForm(UploadLimitsMixin, forms.ModelForm):
+    upload_limits = {'verification_document': 'document'}
+
     class Meta:
         model = DonorProfile
         fields = [
@@ -21,7 +24,9 @@ class DonorProfileForm(forms.ModelForm):
         }
 
 
-class DonationForm(forms.ModelForm):
+class DonationForm(UploadLimitsMixin, forms.ModelForm):
+    upload_limits = {'image': 'image'}
+
     class Meta:
         model = Donation
         fields = [
@@ -67,6 +72,46 @@ class DonationForm(forms.ModelForm):
             })
 
 
+class DonationImportForm(forms.ModelForm):
+    """
+    One row of a bulk import (see donations.importer), validated like
+    DonationForm. Category and preferred organization types are given by
+    name and looked up in maps built once per import, not queried per row.
+    """
+    category = forms.CharField()
+    preferred_help_seekers = forms.CharField(required=False)
+
+    class Meta(DonationForm.Meta):
+        fields = [
+            'title', 'description', 'quantity', 'food_type', 'cooked_time',
+            'best_before', 'pickup_address', 'pickup_deadline',
+        ]
+
+    def __init__(self, *args, categories, seeker_types, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.categories = categories
+        self.seeker_types = seeker_types
+
+    def clean_category(self):
+        name = self.cleaned_data['category'].strip()
+        category = self.categories.get(name.lower())
+        if category is None:
+            raise forms.ValidationError(f'Unknown category "{name}".')
+        return category
+
+    def clean_preferred_help_seekers(self):
+        names = [n.strip() for n in self.cleaned_data['preferred_help_seekers'].replace(';', ',').split(',')]
+        unknown = [n for n in names if n and n.lower() not in self.seeker_types]
+        if unknown:
+            raise forms.ValidationError(f'Unknown organization type: {", ".join(unknown)}.')
+        return [self.seeker_types[n.lower()] for n in names if n]
+
+
+class DonationImportUploadForm(forms.Form):
+    file = forms.FileField(help_text='CSV with a header row, a JSON array of objects, or JSON Lines')
+    dry_run = forms.BooleanField(required=False, label='Only check the file, do not create donations')
+
+
 class DonationRequestForm(forms.ModelForm):
     class Meta:
         model = DonationRequest
@@ -82,7 +127,9 @@ class DonationRequestForm(forms.ModelForm):
         }
 
 
-class HelpSeekerRegistrationForm(forms.ModelForm):
+class HelpSeekerRegistrationForm(UploadLimitsMixin, forms.ModelForm):
+    upload_limits = {'verification_document': 'document'}
+
     class Meta:
         model = HelpSeeker
         fields = [
@@ -147,7 +194,9 @@ class DonationMatchForm(forms.ModelForm):
         }
 
 
-class DonorVerificationForm(forms.ModelForm):
+class DonorVerificationForm(UploadLimitsMixin, forms.ModelForm):
+    upload_limits = {'verification_document': 'document'}
+
     class Meta:
         model = DonorProfile
         fields = ['verification_document']
@@ -164,7 +213,9 @@ class DonorVerificationForm(forms.ModelForm):
         }
 
 
-class HelpSeekerVerificationForm(forms.ModelForm):
+class HelpSeekerVerificationForm(UploadLimitsMixin, forms.ModelForm):
+    upload_limits = {'verification_document': 'document'}
+
     class Meta:
         model = HelpSeeker
         fields = ['verification_document']
@@ -195,4 +246,37 @@ class AdminVerificationForm(forms.ModelForm):
         labels = {
             'status': 'Verification Status',
             'notes': 'Admin Notes',
-        }
\ No newline at end of file
+        }
+
+
+# Admin change forms (see UploadLimitsAdminMixin) with the same upload limits
+class VerificationRequestAdminForm(UploadLimitsMixin, forms.ModelForm):
+    upload_limits = {'document': 'document'}
+
+    class Meta:
+        model = VerificationRequest
+        fields = '__all__'
+
+
+class DonorProfileAdminForm(UploadLimitsMixin, forms.ModelForm):
+    upload_limits = {'verification_document': 'document'}
+
+    class Meta:
+        model = DonorProfile
+        fields = '__all__'
+
+
+class HelpSeekerAdminForm(UploadLimitsMixin, forms.ModelForm):
+    upload_limits = {'verification_document': 'document'}
+
+    class Meta:
+        model = HelpSeeker
+        fields = '__all__'
+
+
+class DonationAdminForm(UploadLimitsMixin, forms.ModelForm):
+    upload_limits = {'image': 'image'}
+
+    class Meta:
+        model = Donation
+        fields = '__all__'
\ No newline at end of file
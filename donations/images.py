@@ -0,0 +1,127 @@
+import logging
+import os
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .blobs import release, retain
+from .bulk import chunked
+from .jobs import advance, enqueue_job
+from .models import Donation
+from .storage import ContentAddressedStorage
+
+logger = logging.getLogger(__name__)
+
+# Widths of the resized copies. Donation cards are ~220px tall and at most
+# ~400px wide, so 480 covers 2x screens; 960 is for the detail page.
+DEFAULT_WIDTHS = (240, 480, 960)
+
+# format -> (extension, Pillow save options)
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 75, 'method': 4}),
+}
+
+
+def derivative_widths():
+    return tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def derivative_name(name, width, extension):
+    """donation_images/meal.jpg -> donation_images/meal_480w.webp"""
+    directory, filename = posixpath.split(name)
+    if ContentAddressedStorage.is_immutable(name):
+        # Leave the xx/ shard to the storage; it is picked from the copy's own digest
+        directory = posixpath.dirname(directory)
+    root, _ = os.path.splitext(filename)
+    return posixpath.join(directory, f'{root}_{width}w.{extension}')
+
+
+def variant_names(variants):
+    """Every stored file name in an image_variants dict"""
+    return [name for image_format in FORMATS for name in variants.get(image_format, {}).values()]
+
+
+def needs_derivatives(donation):
+    return bool(donation.image) and (donation.image_variants or {}).get('source') != donation.image.name
+
+
+def _encode(image, image_format, options):
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, format=image_format.upper(), **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_derivatives(donation):
+    """
+    Write resized JPEG and WebP copies of donation.image next to the
+    original and record them in donation.image_variants. Widths larger than
+    the original are skipped (the original itself is used there); copies of
+    a previous image are deleted.
+    """
+    storage = donation.image.storage
+    with donation.image.open('rb') as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+
+    widths = [w for w in derivative_widths() if w < original.width] or [original.width]
+    variants = {'source': donation.image.name}
+    for image_format, (extension, options) in FORMATS.items():
+        variants[image_format] = {}
+        for width in widths:
+            resized = original.copy()
+            resized.thumbnail((width, original.height), Image.LANCZOS)
+            name = derivative_name(donation.image.name, width, extension)
+            if storage.exists(name):
+                storage.delete(name)
+            variants[image_format][str(width)] = storage.save(name, _encode(resized, image_format, options))
+
+    old_names = set(variant_names(donation.image_variants or {}))
+    new_names = set(variant_names(variants))
+    retain(storage, new_names - old_names)
+    release(storage, old_names - new_names)
+
+    Donation.objects.filter(pk=donation.pk).update(image_variants=variants, updated_at=timezone.now())
+    donation.image_variants = variants
+    return variants
+
+
+def process_donations(queryset, on_chunk=None, chunk_size=50, force=False):
+    """
+    Generate derivatives for every donation in queryset that needs them (all
+    donations with an image when force=True); returns (done, failed).
+    """
+    done = failed = 0
+    ids = queryset.exclude(image='').exclude(image__isnull=True).values_list('pk', flat=True)
+    for chunk in chunked(list(ids), chunk_size):
+        for donation in Donation.objects.filter(pk__in=chunk).only('pk', 'image', 'image_variants'):
+            if not (force or needs_derivatives(donation)):
+                continue
+            try:
+                generate_derivatives(donation)
+            except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+                logger.exception("Could not generate image derivatives for donation %s", donation.pk)
+                failed += 1
+            else:
+                done += 1
+        if on_chunk:
+            on_chunk(len(chunk))
+    return done, failed
+
+
+def queue_image_derivatives(donation_ids, user=None):
+    """Hand derivative generation for these donations to the background worker"""
+    donation_ids = list(donation_ids)
+    return enqueue_job('image_derivatives', {'donation_ids': donation_ids}, total=len(donation_ids), user=user)
+
+
+def run_derivatives_job(job):
+    queryset = Donation.objects.filter(pk__in=job.payload['donation_ids'])
+    done, failed = process_donations(queryset, on_chunk=lambda count: advance(job, count))
+    return f"Resized {done} images, {failed} failed"
@@ -0,0 +1,277 @@
+import csv
+import io
+import json
+import logging
+import os
+import re
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import HOME_STATS_KEY, invalidate
+from .forms import DonationImportForm
+from .jobs import advance, enqueue_job
+from .models import Donation, DonationCategory, HelpSeekerType
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {'.csv': 'csv', '.json': 'json', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+
+# Rows written per bulk_create/transaction
+CHUNK_SIZE = 500
+
+# Only this many row errors are kept for the report; the rest are just counted
+MAX_REPORTED_ERRORS = 100
+
+WHITESPACE = re.compile(r'\s*')
+
+# Nominatim's usage policy allows one request per second
+GEOCODE_DELAY = 1.0
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def detect_format(name):
+    fmt = FORMATS.get(os.path.splitext(name or '')[1].lower())
+    if fmt is None:
+        raise ImportFormatError('Use a .csv, .json or .jsonl file.')
+    return fmt
+
+
+def iter_json_array(text, chunk_size=64 * 1024):
+    """Yield the elements of a top-level JSON array without reading the whole file"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = '', 0, False
+    started = False
+
+    while True:
+        pos = WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer) and eof:
+            raise ImportFormatError('Unterminated JSON array.' if started else 'The file is empty.')
+        if pos == len(buffer):
+            buffer, pos = text.read(chunk_size), 0
+            eof = not buffer
+            continue
+        char = buffer[pos]
+        if not started:
+            if char != '[':
+                raise ImportFormatError('Expected a JSON array of objects.')
+            started, pos = True, pos + 1
+        elif char == ']':
+            return
+        elif char == ',':
+            pos += 1
+        else:
+            try:
+                value, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ImportFormatError(f'Invalid JSON: {e}')
+                # The value continues in the next read
+                more = text.read(chunk_size)
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            yield value
+
+
+def iter_json_lines(text):
+    for number, line in enumerate(text, start=1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ImportFormatError(f'Invalid JSON on line {number}: {e}')
+
+
+def read_rows(file, fmt):
+    """Yield one dict per row of a binary CSV/JSON/JSON Lines file, reading it incrementally"""
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    try:
+        if fmt == 'csv':
+            rows = csv.DictReader(text)
+        elif fmt == 'jsonl':
+            rows = iter_json_lines(text)
+        else:
+            rows = iter_json_array(text)
+        for row in rows:
+            if not isinstance(row, dict):
+                raise ImportFormatError('Every row must be an object.')
+            yield row
+    except UnicodeDecodeError:
+        raise ImportFormatError('The file is not UTF-8 encoded. Save it as UTF-8 and upload it again.')
+    except csv.Error as e:
+        raise ImportFormatError(f'Invalid CSV: {e}')
+    finally:
+        # Leave the underlying file open for its owner
+        text.detach()
+
+
+def form_data(row):
+    """A parsed row as form data: keys stripped, lists joined, None blank"""
+    data = {}
+    for key, value in row.items():
+        if key is None:
+            continue  # surplus CSV cells
+        if value is None:
+            value = ''
+        elif isinstance(value, list):
+            value = ', '.join(str(v) for v in value)
+        data[key.strip()] = str(value)
+    return data
+
+
+def lookup_maps():
+    """Lower-cased name (and pk) -> object for categories and organization types"""
+    categories, seeker_types = {}, {}
+    for category in DonationCategory.objects.all():
+        categories[category.name.lower()] = categories[str(category.pk)] = category
+    for seeker_type in HelpSeekerType.objects.all():
+        seeker_types[seeker_type.name.lower()] = seeker_types[str(seeker_type.pk)] = seeker_type
+    return categories, seeker_types
+
+
+def build_donation(form, donor):
+    donation = form.save(commit=False)
+    donation.donor = donor
+    donation.category = form.cleaned_data['category']
+    donation.prepare_for_bulk_create()
+    return donation
+
+
+def _write_chunk(pending, result):
+    Through = Donation.preferred_help_seekers.through
+    with transaction.atomic():
+        donations = Donation.objects.bulk_create([donation for donation, _ in pending])
+        Through.objects.bulk_create([
+            Through(donation_id=donation.pk, helpseekertype_id=seeker_type.pk)
+            for donation, seeker_types in zip(donations, (types for _, types in pending))
+            for seeker_type in seeker_types
+        ])
+    result['created'] += len(donations)
+    result['donation_ids'].extend(d.pk for d in donations if d.latitude is None or d.longitude is None)
+
+
+def import_donations(donor, rows, chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Validate `rows` (dicts, e.g. from read_rows()) with DonationImportForm
+    and create the valid ones for `donor` in chunks of `chunk_size`.
+
+    Invalid rows are skipped and reported. A file that cannot be parsed
+    stops the import, keeping the chunks already written, with the reason
+    under 'aborted'. Nothing is geocoded here: the ids of created donations
+    without coordinates are returned under 'donation_ids' for
+    geocode_donations()/queue_geocoding(). Returns a dict with 'rows',
+    'created', 'invalid', 'errors' [(row number, message)], 'aborted' and
+    'donation_ids'.
+    """
+    categories, seeker_types = lookup_maps()
+    result = {'rows': 0, 'created': 0, 'invalid': 0, 'errors': [], 'aborted': None, 'donation_ids': []}
+    pending = []
+
+    try:
+        for number, row in enumerate(rows, start=1):
+            form = DonationImportForm(form_data(row), categories=categories, seeker_types=seeker_types)
+            _add_row(number, form, donor, pending, result, dry_run)
+            if len(pending) >= chunk_size:
+                _write_chunk(pending, result)
+                pending = []
+    except ImportFormatError as e:
+        result['aborted'] = str(e)
+
+    if pending:
+        _write_chunk(pending, result)
+    if result['created']:
+        # bulk_create() sends no post_save signals
+        invalidate(HOME_STATS_KEY)
+    return result
+
+
+def _add_row(number, form, donor, pending, result, dry_run):
+    result['rows'] += 1
+    if not form.is_valid():
+        result['invalid'] += 1
+        if len(result['errors']) < MAX_REPORTED_ERRORS:
+            message = '; '.join(
+                f"{field}: {' '.join(errors)}" if field != '__all__' else ' '.join(errors)
+                for field, errors in form.errors.items()
+            )
+            result['errors'].append((number, message))
+    elif not dry_run:
+        pending.append((build_donation(form, donor), form.cleaned_data['preferred_help_seekers']))
+
+
+def nominatim_geocoder():
+    from geopy.geocoders import Nominatim
+    geolocator = Nominatim(user_agent="uhv_donation")
+
+    def geocode(address):
+        location = geolocator.geocode(address)
+        return (location.latitude, location.longitude) if location else None
+    return geocode
+
+
+def geocode_donations(donation_ids, geocode=None, delay=GEOCODE_DELAY, on_chunk=None):
+    """
+    Fill in coordinates for these donations, geocoding each distinct pickup
+    address once. Addresses another donation already has coordinates for
+    are copied instead. Returns the number of donations updated.
+    """
+    donation_ids = list(donation_ids)
+    chunks = [donation_ids[i:i + CHUNK_SIZE] for i in range(0, len(donation_ids), CHUNK_SIZE)]
+    pending = lambda ids: Donation.objects.filter(pk__in=ids, latitude__isnull=True)
+
+    addresses = set()
+    for ids in chunks:
+        addresses.update(pending(ids).values_list('pickup_address', flat=True).distinct())
+    if not addresses:
+        return 0
+
+    coordinates = {}
+    for address, latitude, longitude in (
+        Donation.objects.filter(pickup_address__in=addresses, latitude__isnull=False, longitude__isnull=False)
+        .values_list('pickup_address', 'latitude', 'longitude')
+    ):
+        coordinates.setdefault(address, (latitude, longitude))
+
+    last_call = None
+    for address in sorted(addresses - set(coordinates)):
+        if geocode is None:
+            geocode = nominatim_geocoder()
+        if last_call is not None:
+            time.sleep(max(0, delay - (time.monotonic() - last_call)))
+        last_call = time.monotonic()
+        try:
+            location = geocode(address)
+        except Exception:
+            logger.exception("Could not geocode %r for imported donations", address)
+            continue
+        if location:
+            coordinates[address] = location
+
+    updated = 0
+    for ids in chunks:
+        count = 0
+        for address, (latitude, longitude) in coordinates.items():
+            # update() bypasses auto_now, set updated_at so delta consumers see the change
+            count += pending(ids).filter(pickup_address=address).update(
+                latitude=latitude, longitude=longitude, updated_at=timezone.now(),
+            )
+        updated += count
+        if on_chunk:
+            on_chunk(len(ids))
+    return updated
+
+
+def queue_geocoding(donation_ids, user=None):
+    """Hand geocoding of imported donations to the background worker"""
+    donation_ids = list(donation_ids)
+    return enqueue_job('geocode_donations', {'donation_ids': donation_ids}, total=len(donation_ids), user=user)
+
+
+def run_geocode_job(job):
+    updated = geocode_donations(job.payload['donation_ids'], on_chunk=lambda count: advance(job, count))
+    return f"Geocoded {updated} donations"
@@ -0,0 +1,105 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# A job is claimed at most this many times before release_stuck() gives up on it
+MAX_ATTEMPTS = 3
+
+# Job kind -> dotted path of the function that runs it.
+# Handlers are called as handler(job) and report progress through advance().
+JOB_HANDLERS = {
+    'bulk_verify_profiles': 'donations.bulk.run_bulk_verify_job',
+    'bulk_delete_profiles': 'donations.bulk.run_bulk_delete_job',
+    'image_derivatives': 'donations.images.run_derivatives_job',
+    'geocode_donations': 'donations.importer.run_geocode_job',
+}
+
+
+def enqueue_job(kind, payload, total=0, user=None):
+    """Queue a job for the process_background_jobs worker"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown background job kind: {kind}")
+    return BackgroundJob.objects.create(
+        kind=kind,
+        payload=payload,
+        total=total,
+        created_by=user,
+    )
+
+
+def advance(job, count):
+    """Record that another `count` items of the job have been processed"""
+    BackgroundJob.objects.filter(pk=job.pk).update(processed=F('processed') + count, heartbeat_at=timezone.now())
+    job.processed += count
+
+
+def claim_job(job):
+    """Atomically move a queued job to running; False if another worker got it"""
+    now = timezone.now()
+    claimed = BackgroundJob.objects.filter(pk=job.pk, status='queued').update(
+        status='running',
+        started_at=now,
+        heartbeat_at=now,
+        attempts=F('attempts') + 1,
+    )
+    return claimed == 1
+
+
+def release_stuck(older_than=timedelta(minutes=15)):
+    """
+    Requeue running jobs whose heartbeat stopped `older_than` ago (their
+    worker died), or fail them once they have been claimed MAX_ATTEMPTS
+    times, so the panel's progress polling ends. Returns (requeued, failed).
+    """
+    now = timezone.now()
+    stuck = BackgroundJob.objects.filter(status='running', heartbeat_at__lt=now - older_than)
+    failed = stuck.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status='failed',
+        result='The worker stopped while running this job.',
+        finished_at=now,
+    )
+    requeued = stuck.update(status='queued', processed=0, started_at=None, heartbeat_at=None)
+    return requeued, failed
+
+
+def run_job(job):
+    """Run a single claimed job and record its outcome"""
+    handler = import_string(JOB_HANDLERS[job.kind])
+    try:
+        result = handler(job)
+    except Exception as e:
+        logger.exception("Background job #%s (%s) failed", job.pk, job.kind)
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status='failed',
+            result=str(e),
+            finished_at=timezone.now(),
+        )
+        return False
+
+    BackgroundJob.objects.filter(pk=job.pk).update(
+        status='completed',
+        result=result or '',
+        finished_at=timezone.now(),
+    )
+    return True
+
+
+def run_pending_jobs(limit=None):
+    """Claim and run queued jobs oldest first; returns the number of jobs run"""
+    limit = limit or getattr(settings, 'BACKGROUND_JOBS_BATCH', 10)
+    # Every poll, so a long-running worker also recovers what a crashed sibling left behind
+    release_stuck()
+    ran = 0
+    for job in BackgroundJob.objects.filter(status='queued').order_by('created_at')[:limit]:
+        if claim_job(job):
+            run_job(job)
+            ran += 1
+    return ran
@@ -0,0 +1,279 @@
+"""
+Email capacity benchmark used by `manage.py test_email_setup --benchmark`.
+
+Messages are delivered to SMTPSink, a tiny SMTP server running on a local
+thread that accepts and discards everything, so no real mail is sent.
+"""
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.template.loader import render_to_string
+from django.test.utils import override_settings
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .email_rendering import EmailRenderer
+from .models import (
+    Donation, DonationCategory, DonationMatch, DonationRequest, DonorProfile, HelpSeeker,
+    HelpSeekerType, OutboxEmail,
+)
+from .outbox import drain_outbox, enqueue
+from .sqlite_benchmark import scratch_database
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.sink.count('connections')
+        self.reply('220 localhost SMTP sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == b'EHLO':
+                self.reply('250-localhost')
+                self.reply('250 8BITMIME')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                for data in iter(self.rfile.readline, b''):
+                    if data == b'.\r\n':
+                        break
+                self.server.sink.count('messages')
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            elif command in (b'HELO', b'MAIL', b'RCPT', b'RSET', b'NOOP'):
+                self.reply('250 OK')
+            else:
+                self.reply('502 Command not implemented')
+
+
+class SMTPSink:
+    """In-process SMTP server that counts connections and messages, then drops them"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.server = socketserver.ThreadingTCPServer((host, port), _SinkHandler)
+        self.server.daemon_threads = True
+        self.server.sink = self
+        self.host, self.port = self.server.server_address
+        self.connections = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def reset(self):
+        with self._lock:
+            self.connections = self.messages = 0
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def settings(self):
+        """Settings that point Django's SMTP backend at this sink"""
+        return override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST=self.host,
+            EMAIL_PORT=self.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_USE_SSL=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            ENABLE_EMAIL_NOTIFICATIONS=True,
+        )
+
+
+def email_templates():
+    """Every template under templates/emails/, as loader names ('emails/...')"""
+    directory = Path(settings.BASE_DIR) / 'templates' / 'emails'
+    return sorted(f'emails/{path.name}' for path in directory.iterdir() if path.suffix in ('.html', '.txt'))
+
+
+def sample_context():
+    """
+    A context that satisfies every email template, built from unsaved model
+    instances so rendering never touches the database.
+    """
+    now = timezone.now()
+    donor_user = User(id=1, username='donor', email='donor@example.com')
+    requester = User(id=2, username='requester', email='requester@example.com')
+    seeker_user = User(id=3, username='shelter', email='shelter@example.com')
+
+    donor = DonorProfile(id=1, user=donor_user, user_type='hotel', organization_name='Grand Hotel',
+                         phone='9800000000', city='Pune', state='Maharashtra')
+    requester_profile = HelpSeeker(id=1, user=requester, organization_name='Hope Shelter',
+                                   seeker_type=HelpSeekerType(id=1, name='NGO'),
+                                   phone='9811111111', city='Pune', state='Maharashtra')
+    help_seeker = HelpSeeker(id=2, user=seeker_user, organization_name='City Orphanage',
+                             seeker_type=HelpSeekerType(id=2, name='Orphanage'))
+    donation = Donation(id=1, donor=donor, category=DonationCategory(id=1, name='Food'),
+                        title='Fresh meals for 40', quantity=40, food_type='veg',
+                        pickup_city='Pune', pickup_state='Maharashtra',
+                        pickup_deadline=now + timedelta(hours=4))
+    donation_request = DonationRequest(id=1, donation=donation, requester=requester, requested_quantity=20,
+                                       message='We can pick this up within the hour.', created_at=now)
+
+    return {
+        'donation': donation,
+        'donation_request': donation_request,
+        'donation_requests': [donation_request] * 5,
+        'donation_match': DonationMatch(id=1, donation=donation, help_seeker=help_seeker),
+        'requester': requester,
+        'requester_profile': requester_profile,
+        'requester_type': f'Organization ({requester_profile.seeker_type.name})',
+        'donor': donor_user,
+        'help_seeker': help_seeker,
+        'old_status': 'pending',
+        'new_status': 'accepted',
+        'admin_url': f"{getattr(settings, 'SITE_URL', '')}/admin/",
+        'site_url': getattr(settings, 'SITE_URL', 'http://127.0.0.1:8000'),
+        'site_name': getattr(settings, 'SITE_NAME', 'UHV ShareHub'),
+    }
+
+
+def _timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def benchmark_rendering(templates, count, context):
+    """Seconds spent rendering each template `count` times"""
+    results = {}
+    for name in templates:
+        _, elapsed = _timed(lambda: [render_to_string(name, context) for _ in range(count)])
+        results[name] = elapsed
+    return results
+
+
+def benchmark_renderer(templates, count, context):
+    """
+    Compare, per email, `count` renders through render_to_string + strip_tags
+    (the old email_utils code), through EmailRenderer.render(), and through
+    one EmailRenderer.render_batch() call with a per-recipient 'donor'.
+    """
+    renderer = EmailRenderer()
+    renderer.preload()
+    recipients = [{'donor': User(id=i, username=f'donor{i}')} for i in range(count)]
+
+    def legacy(name):
+        for _ in range(count):
+            strip_tags(render_to_string(f'{name}.html', context))
+
+    def cached(name):
+        for _ in range(count):
+            renderer.render(name, context)
+
+    rows = []
+    for name in sorted({t.rsplit('.', 1)[0] for t in templates if t.endswith('.html')}):
+        rows.append({
+            'email': name,
+            'legacy_seconds': _timed(legacy, name)[1],
+            'renderer_seconds': _timed(cached, name)[1],
+            'batch_seconds': _timed(renderer.render_batch, name, context, recipients)[1],
+        })
+    return rows
+
+
+def render_messages(templates, count, context):
+    """Build `count` messages per template file with render_to_string (HTML + strip_tags text)"""
+    messages = []
+    for name in templates:
+        for i in range(count):
+            content = render_to_string(name, context)
+            if name.endswith('.html'):
+                message = EmailMultiAlternatives(f'Benchmark {name}', strip_tags(content),
+                                                 settings.EMAIL_CONFIG['NOTIFICATIONS'], [f'user{i}@example.com'])
+                message.attach_alternative(content, 'text/html')
+            else:
+                message = EmailMultiAlternatives(f'Benchmark {name}', content,
+                                                 settings.EMAIL_CONFIG['NOTIFICATIONS'], [f'user{i}@example.com'])
+            messages.append(message)
+    return messages
+
+
+def send_individually(messages):
+    """The old synchronous path: every message.send() opens its own SMTP connection"""
+    for message in messages:
+        message.send()
+
+
+def send_batched(messages):
+    """All messages over one shared connection"""
+    with get_connection() as connection:
+        connection.send_messages(messages)
+
+
+@contextmanager
+def _scratch_outbox():
+    """
+    Yield the alias of a throwaway SQLite database holding only an empty
+    outbox table, so the benchmark neither sees nor locks the real queue.
+    """
+    with scratch_database(prefix='mail-bench-') as alias:
+        with connections[alias].schema_editor() as editor:
+            editor.create_model(OutboxEmail)
+        yield alias
+
+
+def send_through_outbox(messages, using=DEFAULT_DB_ALIAS):
+    """Queue every message, then drain the outbox batch by batch"""
+    for message in messages:
+        enqueue(message, using=using)
+    while drain_outbox(using=using)['sent']:
+        pass
+
+
+PATHS = [
+    ('sync', send_individually),
+    ('batched', send_batched),
+    ('outbox', send_through_outbox),
+]
+
+
+def benchmark_delivery(sink, templates, count, context):
+    """
+    Render and deliver `count` messages per template through every path.
+    Returns one row per path with render/send seconds, throughput and the
+    number of SMTP connections the sink saw.
+    """
+    rows = []
+    with sink.settings():
+        for name, send in PATHS:
+            sink.reset()
+            messages, render_seconds = _timed(render_messages, templates, count, context)
+            if name == 'outbox':
+                with _scratch_outbox() as alias:
+                    _, send_seconds = _timed(send, messages, alias)
+            else:
+                _, send_seconds = _timed(send, messages)
+            total = render_seconds + send_seconds
+            rows.append({
+                'path': name,
+                'messages': len(messages),
+                'delivered': sink.messages,
+                'render_seconds': render_seconds,
+                'send_seconds': send_seconds,
+                'per_second': len(messages) / total if total else 0,
+                'connections': sink.connections,
+            })
+    return rows
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from donations.sqlite_benchmark import benchmark
+
+class Command(BaseCommand):
+    help = 'Compare concurrent SQLite write throughput with default and tuned settings (on scratch files)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8,
+                            help='Concurrent writer threads')
+        parser.add_argument('--transactions', type=int, default=200,
+                            help='Write transactions attempted per writer thread')
+        parser.add_argument('--readers', type=int, default=2,
+                            help='Threads reading while the writers run')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['threads']} writers x {options['transactions']} read-modify-write transactions, "
+            f"{options['readers']} concurrent readers"
+        )
+        results = benchmark(options['threads'], options['transactions'], options['readers'])
+
+        self.stdout.write(
+            f"{'':10} {'journal':>8} {'commits':>8} {'locked':>7} {'writes/s':>9} "
+            f"{'p50 ms':>7} {'p95 ms':>7} {'reads/s':>8}"
+        )
+        for label, r in results.items():
+            self.stdout.write(
+                f"{label:10} {r['journal_mode']:>8} {r['committed']:>8} {r['failed']:>7} "
+                f"{r['writes_per_second']:>9.0f} {r['p50_ms']:>7.1f} {r['p95_ms']:>7.1f} "
+                f"{r['reads_per_second']:>8.0f}"
+            )
+            if r['lost_updates']:
+                self.stdout.write(self.style.ERROR(f"  {r['lost_updates']} committed updates were lost"))
+
+        defaults, tuned = results.get('defaults'), results.get('tuned')
+        if defaults and tuned and defaults['writes_per_second']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Tuned settings: {tuned['writes_per_second'] / defaults['writes_per_second']:.1f}x the write "
+                f"throughput, {defaults['failed']} -> {tuned['failed']} 'database is locked' failures"
+            ))
@@ -0,0 +1,62 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from donations.blobs import counted_fields, is_content_addressed, retain
+from donations.models import Donation, DonorProfile, HelpSeeker, VerificationRequest
+
+class Command(BaseCommand):
+    help = 'Move uploads saved before content-addressed storage into it, merging duplicate files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many files would be moved')
+        parser.add_argument('--keep-originals', action='store_true',
+                            help='Leave the old files in place after their rows are repointed')
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        if not is_content_addressed(storage):
+            raise CommandError('The default storage is not donations.storage.ContentAddressedStorage')
+
+        legacy, blobs, missing = set(), set(), 0
+        for model in (Donation, DonorProfile, HelpSeeker, VerificationRequest):
+            for field in counted_fields(model):
+                rows = (
+                    model._default_manager.exclude(**{field.attname: ''})
+                    .exclude(**{f'{field.attname}__isnull': True})
+                    .values_list('pk', field.attname)
+                )
+                for pk, name in rows.iterator():
+                    if storage.is_immutable(name):
+                        continue
+                    if not storage.exists(name):
+                        missing += 1
+                        continue
+                    legacy.add(name)
+                    if options['dry_run']:
+                        continue
+                    with storage.open(name) as f:
+                        blob = storage.save(name, f)
+                    with transaction.atomic():
+                        model._default_manager.filter(pk=pk).update(**{field.attname: blob})
+                        retain(storage, [blob])
+                    blobs.add(blob)
+
+        if options['dry_run']:
+            self.stdout.write(f'{len(legacy)} files would be moved into content-addressed storage')
+            return
+
+        legacy_bytes = sum(storage.size(name) for name in legacy)
+        blob_bytes = sum(storage.size(name) for name in blobs)
+        if not options['keep_originals']:
+            for name in legacy:
+                storage.delete(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {len(legacy)} files into {len(blobs)} blobs, '
+            f'{legacy_bytes - blob_bytes} bytes saved'
+        ))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'{missing} rows point at files that do not exist'))
+        if blobs:
+            self.stdout.write('Run generate_image_derivatives to re-create resized copies for moved donation images')
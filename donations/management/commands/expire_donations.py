@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from donations.expiry import expire_due_donations, seconds_until_next_expiry
+from donations.sync import prune_tombstones
+
+class Command(BaseCommand):
+    help = 'Mark available donations past their pickup deadline as expired and prune old sync tombstones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Run as a daemon, sleeping until the next pickup deadline')
+        parser.add_argument('--interval', type=float, default=60,
+                            help='Maximum seconds to sleep between sweeps in --loop mode')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Number of donations expired per UPDATE')
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_due_donations(chunk_size=options['chunk_size'])
+            if expired:
+                self.stdout.write(self.style.SUCCESS(f'Expired {expired} donations'))
+            pruned = prune_tombstones()
+            if pruned:
+                self.stdout.write(self.style.SUCCESS(f'Pruned {pruned} tombstones'))
+            if not options['loop']:
+                break
+            time.sleep(seconds_until_next_expiry(options['interval']))
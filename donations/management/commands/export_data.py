@@ -0,0 +1,39 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from donations.exports import CHUNK_SIZE, EXPORTS, FORMATS, stream_export
+
+class Command(BaseCommand):
+    help = 'Stream a whole table to a CSV or JSON Lines file, optionally gzip-compressed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(EXPORTS), help='What to export')
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv',
+                            help='Output format (default csv)')
+        parser.add_argument('--gzip', action='store_true',
+                            help='Compress the output with gzip')
+        parser.add_argument('--output', '-o', default='-', metavar='PATH',
+                            help='File to write (default: standard output)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Rows fetched from the database per round trip')
+
+    def handle(self, *args, **options):
+        path = options['output']
+        try:
+            output = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        written = 0
+        try:
+            for data in stream_export(options['name'], options['format'], options['gzip'], options['chunk_size']):
+                output.write(data)
+                written += len(data)
+        finally:
+            if path == '-':
+                output.flush()
+            else:
+                output.close()
+
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(f'Wrote {written} bytes to {path}'))
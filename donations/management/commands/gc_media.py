@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+from donations.media_gc import collect_garbage
+
+class Command(BaseCommand):
+    help = 'Delete or quarantine files under MEDIA_ROOT that no database row references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be removed')
+        parser.add_argument('--quarantine', metavar='DIR',
+                            help='Move unreferenced files into DIR instead of deleting them')
+        parser.add_argument('--min-age', type=float, default=24,
+                            help='Hours a file must be old before it is considered (default 24)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Files checked and removed per batch')
+
+    def handle(self, *args, **options):
+        try:
+            stats = collect_garbage(
+                batch_size=options['batch_size'],
+                min_age=options['min_age'] * 3600,
+                quarantine=options['quarantine'],
+                dry_run=options['dry_run'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        verb = 'Would remove' if options['dry_run'] else ('Quarantined' if options['quarantine'] else 'Removed')
+        self.stdout.write(self.style.SUCCESS(
+            f"Scanned {stats['scanned']} files. {verb} {stats['removed']} unreferenced files, "
+            f"{filesizeformat(stats['bytes'])} reclaimed"
+        ))
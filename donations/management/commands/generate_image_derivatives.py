@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from donations.images import needs_derivatives, process_donations, queue_image_derivatives
+from donations.models import Donation
+
+class Command(BaseCommand):
+    help = 'Create resized JPEG/WebP copies of donation images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate copies for every donation image, not just missing or stale ones')
+        parser.add_argument('--queue', action='store_true',
+                            help='Queue a background job for process_background_jobs instead of resizing here')
+
+    def handle(self, *args, **options):
+        donations = Donation.objects.exclude(image='').exclude(image__isnull=True)
+
+        if options['queue']:
+            ids = [
+                d.pk for d in donations.only('pk', 'image', 'image_variants').iterator()
+                if options['force'] or needs_derivatives(d)
+            ]
+            if ids:
+                job = queue_image_derivatives(ids)
+                self.stdout.write(self.style.SUCCESS(f'Queued job #{job.pk} for {len(ids)} donation images'))
+            else:
+                self.stdout.write('All donation images already have resized copies')
+            return
+
+        done, failed = process_donations(
+            donations,
+            on_chunk=lambda count: self.stdout.write(f'  checked {count} donations'),
+            force=options['force'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Resized {done} donation images'))
+        if failed:
+            raise CommandError(f'{failed} images could not be read (details are in the log)')
@@ -0,0 +1,74 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from donations.importer import (
+    CHUNK_SIZE, FORMATS, ImportFormatError, detect_format, geocode_donations, import_donations,
+    queue_geocoding, read_rows,
+)
+from donations.models import DonorProfile
+
+class Command(BaseCommand):
+    help = 'Create donations for one donor from a CSV, JSON array or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - to read standard input")
+        parser.add_argument('--donor', required=True, metavar='USERNAME',
+                            help='Username of the donor the donations belong to')
+        parser.add_argument('--format', choices=sorted(set(FORMATS.values())),
+                            help='File format (default: from the file extension)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Donations written per batch')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only validate the rows')
+        parser.add_argument('--geocode', choices=['queue', 'now', 'skip'], default='queue',
+                            help='Queue geocoding of new donations (default), do it here, or skip it')
+
+    def handle(self, *args, **options):
+        try:
+            donor = DonorProfile.objects.get(user__username=options['donor'])
+        except DonorProfile.DoesNotExist:
+            raise CommandError(f"{options['donor']} has no donor profile")
+
+        path = options['path']
+        try:
+            fmt = options['format'] or detect_format(path)
+        except ImportFormatError as e:
+            raise CommandError(f'{e} Or pass --format.')
+
+        started = time.monotonic()
+        try:
+            file = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+        try:
+            result = import_donations(
+                donor, read_rows(file, fmt),
+                chunk_size=options['chunk_size'], dry_run=options['dry_run'],
+            )
+        finally:
+            if file is not sys.stdin.buffer:
+                file.close()
+
+        for number, message in result['errors']:
+            self.stdout.write(self.style.WARNING(f'  row {number}: {message}'))
+        if result['invalid'] > len(result['errors']):
+            self.stdout.write(self.style.WARNING(f"  ... {result['invalid'] - len(result['errors'])} more invalid rows"))
+
+        if result['aborted']:
+            self.stdout.write(self.style.ERROR(f"Stopped after row {result['rows']}: {result['aborted']}"))
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        count = result['rows'] - result['invalid'] if options['dry_run'] else result['created']
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {count} of {result['rows']} rows in {time.monotonic() - started:.1f}s"
+        ))
+
+        ids = result['donation_ids']
+        if not ids or options['geocode'] == 'skip':
+            return
+        if options['geocode'] == 'queue':
+            job = queue_geocoding(ids)
+            self.stdout.write(self.style.SUCCESS(f'Queued job #{job.pk} to geocode {len(ids)} donations'))
+        else:
+            updated = geocode_donations(ids)
+            self.stdout.write(self.style.SUCCESS(f'Geocoded {updated} of {len(ids)} donations'))
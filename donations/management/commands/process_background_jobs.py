@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from donations.jobs import run_pending_jobs
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (bulk profile actions etc.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new jobs instead of exiting when the queue is empty')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to sleep between polls in --loop mode')
+        parser.add_argument('--batch', type=int, default=10,
+                            help='Maximum number of jobs to claim per poll')
+
+    def handle(self, *args, **options):
+        while True:
+            ran = run_pending_jobs(limit=options['batch'])
+            if ran:
+                self.stdout.write(self.style.SUCCESS(f'Ran {ran} background jobs'))
+            if not options['loop']:
+                break
+            if not ran:
+                time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from donations.outbox import drain_outbox, release_stuck
+
+class Command(BaseCommand):
+    help = 'Send queued outbox emails in batches over a reused SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep draining the outbox instead of exiting when it is empty')
+        parser.add_argument('--interval', type=float, default=10,
+                            help='Seconds to sleep when the outbox is empty in --loop mode')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Messages per batch (default: EMAIL_OUTBOX BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        while True:
+            # Every round, so a long-running worker also recovers what a crashed sibling left behind
+            release_stuck()
+            stats = drain_outbox(batch_size=options['batch_size'])
+            if any(stats.values()):
+                self.stdout.write(
+                    f"Sent {stats['sent']}, retrying {stats['retried']}, "
+                    f"dead-lettered {stats['dead']}, deferred {stats['deferred']}"
+                )
+            if stats['sent'] or stats['retried'] or stats['dead']:
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
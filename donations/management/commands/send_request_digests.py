@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from donations.digest import send_due_digests
+
+class Command(BaseCommand):
+    help = 'Queue digest emails for donors whose held donation requests are due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Send every pending digest now, ignoring EMAIL_DIGEST_WINDOW_MINUTES')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, checking for due digests every --interval seconds')
+        parser.add_argument('--interval', type=float, default=300,
+                            help='Seconds to sleep between checks in --loop mode')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = send_due_digests(force=options['force'])
+            if sent:
+                self.stdout.write(self.style.SUCCESS(f'Queued {sent} digest emails'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -2,11 +2,23 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from donations.models import Donation, DonationRequest
 from donations.email_utils import send_donation_request_email, send_request_status_email
+from donations.mail_benchmark import (
+    SMTPSink, benchmark_delivery, benchmark_renderer, benchmark_rendering, email_templates, sample_context,
+)
 
 class Command(BaseCommand):
-    help = 'Test the email notification system'
+    help = 'Test the email notification system, or benchmark it against a local SMTP sink'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--benchmark', action='store_true',
+                            help='Render and send messages to an in-process SMTP sink instead of a live email')
+        parser.add_argument('--count', type=int, default=50,
+                            help='Messages per template in --benchmark mode')
 
     def handle(self, *args, **options):
+        if options['benchmark']:
+            return self.benchmark(options['count'])
+
         # Create a test donation request and send email
         try:
             donor = User.objects.get(username='admin')
@@ -41,4 +53,35 @@ class Command(BaseCommand):
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'❌ Error testing email system: {str(e)}')
-            )
\ No newline at end of file
+            )
+
+    def benchmark(self, count):
+        templates = email_templates()
+        context = sample_context()
+
+        self.stdout.write(f'Rendering {count} messages per template...')
+        for name, seconds in benchmark_rendering(templates, count, context).items():
+            self.stdout.write(f'  {name:<45} {seconds * 1000:9.1f} ms  {seconds * 1000 / count:7.2f} ms/msg')
+
+        self.stdout.write(f'\nRender + text part, {count} messages per email (ms)...')
+        self.stdout.write(f"  {'email':<40} {'legacy':>9} {'renderer':>9} {'batch':>9}")
+        for row in benchmark_renderer(templates, count, context):
+            self.stdout.write(
+                f"  {row['email']:<40} {row['legacy_seconds'] * 1000:>9.1f} "
+                f"{row['renderer_seconds'] * 1000:>9.1f} {row['batch_seconds'] * 1000:>9.1f}"
+            )
+
+        with SMTPSink() as sink:
+            self.stdout.write(f'\nSending to SMTP sink on {sink.host}:{sink.port}...')
+            self.stdout.write(f"  {'path':<8} {'messages':>8} {'render s':>9} {'send s':>8} {'msg/s':>8} {'connections':>11}")
+            for row in benchmark_delivery(sink, templates, count, context):
+                self.stdout.write(
+                    f"  {row['path']:<8} {row['messages']:>8} {row['render_seconds']:>9.3f} "
+                    f"{row['send_seconds']:>8.3f} {row['per_second']:>8.1f} {row['connections']:>11}"
+                )
+                if row['delivered'] != row['messages']:
+                    self.stdout.write(self.style.WARNING(
+                        f"  {row['path']}: sink received {row['delivered']} of {row['messages']} messages"
+                    ))
+
+        self.stdout.write(self.style.SUCCESS('✅ Email benchmark completed'))
\ No newline at end of file
@@ -0,0 +1,183 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import DonorProfile, HelpSeeker, VerificationRequest
+from .storage import ContentAddressedStorage
+
+# Content-addressed names never change meaning, so browsers may keep them for a year
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Upload directories only the owner and staff may download from
+PRIVATE_MEDIA_PREFIXES = ('verification_docs/', 'seeker_verification/')
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def is_private(path):
+    # At any depth, so copies moved into a subdirectory (a quarantine left
+    # inside MEDIA_ROOT by an older gc_media run) stay private too
+    return any(f'/{prefix}' in f'/{path}' for prefix in PRIVATE_MEDIA_PREFIXES)
+
+
+def can_access(user, path):
+    """Staff, or a user whose own profile/verification request references the file"""
+    if not user.is_authenticated:
+        return False
+    if user.is_staff or user.is_superuser:
+        return True
+    return (
+        DonorProfile.objects.filter(user=user, verification_document=path).exists()
+        or HelpSeeker.objects.filter(user=user, verification_document=path).exists()
+        or VerificationRequest.objects.filter(user=user, document=path).exists()
+    )
+
+
+class RangeFile:
+    """
+    A file limited to `length` bytes from `start`. fileno()/tell() are
+    passed through so a WSGI server's file_wrapper can still sendfile() the
+    range (gunicorn bounds it by Content-Length).
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def tell(self):
+        return self.file.tell()
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single 'bytes=' range, None to send the
+    whole file (no header, or a multi-range request), or 'invalid' for a
+    range that cannot be satisfied.
+    """
+    match = RANGE_RE.match(header or '')
+    if not match:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    elif last:
+        # Suffix range: the final N bytes
+        start = max(size - int(last), 0)
+        end = size - 1
+    else:
+        return 'invalid'
+    if start > end or start >= size:
+        return 'invalid'
+    return start, end
+
+
+def _sendfile_response(path, full_path):
+    """Let the front proxy send the file; returns None when not configured"""
+    backend = getattr(settings, 'MEDIA_SENDFILE_BACKEND', '')
+    if backend not in ('nginx', 'apache'):
+        return None
+    content_type, _ = mimetypes.guess_type(full_path)
+    # The proxy fills in the body, length and ranges
+    response = HttpResponse(content_type=content_type or 'application/octet-stream')
+    if backend == 'nginx':
+        prefix = getattr(settings, 'MEDIA_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = quote(prefix.rstrip('/') + '/' + path)
+    else:
+        response['X-Sendfile'] = full_path
+    return response
+
+
+def serve_media(request, path):
+    """
+    Serve an uploaded file.
+
+    Verification documents are only shown to their owner and staff (others
+    get a 404). With MEDIA_SENDFILE_BACKEND set to 'nginx' (X-Accel-Redirect)
+    or 'apache' (X-Sendfile) the proxy sends the bytes; otherwise a
+    FileResponse is returned, handling conditional GET and single byte
+    ranges itself.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    if path.startswith(('.', '..')):
+        raise Http404
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    private = is_private(path)
+    if private and not can_access(request.user, path):
+        raise Http404
+
+    stat = os.stat(full_path)
+    etag = f'"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+    last_modified = int(stat.st_mtime)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+    if response is None:
+        response = _sendfile_response(path, full_path)
+    if response is None:
+        response = _file_response(request, full_path, stat.st_size, etag)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if private:
+        response['Cache-Control'] = 'private, no-cache'
+    elif ContentAddressedStorage.is_immutable(path):
+        response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def _file_response(request, full_path, size, etag):
+    byte_range = None
+    # If-Range: only honour the range if the client's copy is still current
+    if request.headers.get('If-Range', etag) == etag:
+        byte_range = parse_range(request.headers.get('Range'), size)
+
+    if byte_range == 'invalid':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    file = open(full_path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file)
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1), status=206)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        content_type, _ = mimetypes.guess_type(full_path)
+        response['Content-Type'] = content_type or 'application/octet-stream'
+    response['Accept-Ranges'] = 'bytes'
+    return response
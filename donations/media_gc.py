@@ -0,0 +1,133 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+
+from django.apps import apps
+from django.conf import settings
+
+from .blobs import file_fields
+from .images import variant_names
+from .models import Donation, StoredBlob
+
+
+class ReferenceSet:
+    """
+    Every media name referenced from the database, kept in a temporary
+    SQLite file instead of a Python set so memory stays flat no matter how
+    many rows there are.
+    """
+
+    def __init__(self):
+        self._dir = tempfile.mkdtemp(prefix='media-gc-')
+        self.db = sqlite3.connect(os.path.join(self._dir, 'refs.sqlite3'))
+        self.db.execute('CREATE TABLE refs (name TEXT PRIMARY KEY) WITHOUT ROWID')
+
+    def add_many(self, names):
+        self.db.executemany('INSERT OR IGNORE INTO refs VALUES (?)', ((n,) for n in names))
+
+    def missing(self, names):
+        """The subset of `names` that is not referenced"""
+        names = list(names)
+        found = set()
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(names), 500):
+            part = names[i:i + 500]
+            placeholders = ','.join('?' * len(part))
+            found.update(row[0] for row in self.db.execute(
+                f'SELECT name FROM refs WHERE name IN ({placeholders})', part,
+            ))
+        return [n for n in names if n not in found]
+
+    def close(self):
+        self.db.close()
+        shutil.rmtree(self._dir, ignore_errors=True)
+
+
+def referenced_names(chunk_size=2000):
+    """Stream every file name stored in a FileField or in Donation.image_variants"""
+    for model in apps.get_models():
+        for field in file_fields(model):
+            yield from (
+                model._default_manager.exclude(**{field.attname: ''})
+                .exclude(**{f'{field.attname}__isnull': True})
+                .values_list(field.attname, flat=True)
+                .iterator(chunk_size=chunk_size)
+            )
+    variants = Donation.objects.exclude(image_variants={}).values_list('image_variants', flat=True)
+    for value in variants.iterator(chunk_size=chunk_size):
+        yield from variant_names(value or {})
+
+
+def walk_files(root):
+    """Yield (relative name, DirEntry) for every file under root, depth first, via os.scandir"""
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield os.path.relpath(entry.path, root).replace(os.sep, '/'), entry
+
+
+def collect_garbage(batch_size=1000, min_age=86400, quarantine=None, dry_run=False, now=None):
+    """
+    Delete (or move into `quarantine`) files under MEDIA_ROOT that no row
+    references. Files younger than `min_age` seconds are left alone, since
+    their row may not be committed yet. Returns a dict with the number of
+    files scanned, removed and the bytes reclaimed.
+
+    `quarantine` must be outside MEDIA_ROOT: everything under MEDIA_ROOT is
+    reachable through serve_media. Raises ValueError otherwise.
+    """
+    root = os.path.abspath(settings.MEDIA_ROOT)
+    now = now or time.time()
+    quarantine = os.path.abspath(quarantine) if quarantine else None
+    if quarantine and os.path.commonpath([root, quarantine]) == root:
+        raise ValueError('The quarantine directory must be outside MEDIA_ROOT.')
+    stats = {'scanned': 0, 'removed': 0, 'bytes': 0}
+
+    references = ReferenceSet()
+    try:
+        batch = []
+        for name in referenced_names():
+            batch.append(name)
+            if len(batch) >= batch_size:
+                references.add_many(batch)
+                batch = []
+        references.add_many(batch)
+
+        candidates = {}
+        for name, entry in walk_files(root):
+            stats['scanned'] += 1
+            stat = entry.stat(follow_symlinks=False)
+            if now - stat.st_mtime < min_age:
+                continue
+            candidates[name] = stat.st_size
+            if len(candidates) >= batch_size:
+                _remove(root, references.missing(candidates), candidates, quarantine, dry_run, stats)
+                candidates = {}
+        _remove(root, references.missing(candidates), candidates, quarantine, dry_run, stats)
+    finally:
+        references.close()
+    return stats
+
+
+def _remove(root, names, sizes, quarantine, dry_run, stats):
+    stats['removed'] += len(names)
+    stats['bytes'] += sum(sizes[n] for n in names)
+    if dry_run or not names:
+        return
+    for name in names:
+        path = os.path.join(root, name)
+        if quarantine:
+            target = os.path.join(quarantine, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(path, target)
+        else:
+            os.remove(path)
+    # Reference counts for files that no longer exist are meaningless
+    StoredBlob.objects.filter(name__in=names).delete()
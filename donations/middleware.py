@@ -0,0 +1,168 @@
+import json
+import logging
+import re
+import time
+import traceback
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .routers import replicas, use_primary
+
+logger = logging.getLogger('donations.queries')
+
+# Session key holding the time of the user's last write request
+LAST_WRITE_SESSION_KEY = '_last_write_at'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class ReplicaPinningMiddleware:
+    """
+    Read-your-writes for PrimaryReplicaRouter. Write requests (POST etc.)
+    read from the primary, and so does every later request in the same
+    session, for REPLICA_STICKY_SECONDS or, when that is None, for the rest
+    of the session. Must come after SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replicas():
+            return self.get_response(request)
+
+        if request.method not in SAFE_METHODS:
+            with use_primary():
+                response = self.get_response(request)
+            # Not after logging out (the session was just emptied) or a failed login
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated and (
+                LAST_WRITE_SESSION_KEY not in request.session or self.sticky_seconds() is not None
+            ):
+                request.session[LAST_WRITE_SESSION_KEY] = time.time()
+            return response
+
+        if self.is_pinned(request):
+            with use_primary():
+                return self.get_response(request)
+        return self.get_response(request)
+
+    @staticmethod
+    def sticky_seconds():
+        return getattr(settings, 'REPLICA_STICKY_SECONDS', None)
+
+    def is_pinned(self, request):
+        last_write = request.session.get(LAST_WRITE_SESSION_KEY)
+        if last_write is None:
+            return False
+        seconds = self.sticky_seconds()
+        return seconds is None or time.time() - last_write < seconds
+
+
+# Literals and placeholder lists that vary between otherwise identical queries
+FINGERPRINT_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\bIN \((?:\?,\s*)*\?\)'), 'IN (...)'),
+]
+
+
+def fingerprint(sql):
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class QueryLog:
+    """execute_wrapper() hook counting and timing the queries of one request"""
+
+    def __init__(self, repeat_threshold):
+        self.repeat_threshold = repeat_threshold
+        self.count = 0
+        self.seconds = 0.0
+        self.repeats = defaultdict(lambda: {'count': 0, 'seconds': 0.0, 'where': None})
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            entry = self.repeats[fingerprint(sql)]
+            entry['count'] += 1
+            entry['seconds'] += elapsed
+            if entry['count'] == self.repeat_threshold:
+                # Once per suspect, and only then: walking the stack is not free
+                entry['where'] = self.caller()
+
+    @staticmethod
+    def caller():
+        """The innermost project frame (view, template tag, model method) issuing the query"""
+        base = str(settings.BASE_DIR)
+        for frame in reversed(traceback.extract_stack()[:-3]):
+            if frame.filename.startswith(base) and frame.filename != __file__:
+                return f'{frame.filename[len(base) + 1:]}:{frame.lineno} in {frame.name}'
+        return None
+
+    def suspects(self):
+        """Queries repeated often enough to look like one query per row (N+1)"""
+        return [
+            {'sql': sql[:300], 'count': entry['count'], 'ms': round(entry['seconds'] * 1000, 1), 'where': entry['where']}
+            for sql, entry in sorted(self.repeats.items(), key=lambda item: -item[1]['count'])
+            if entry['count'] >= self.repeat_threshold
+        ]
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Counts and times every SQL query a request runs, on every database
+    alias, via connection.execute_wrapper(). Requests slower than
+    SLOW_REQUEST_MS, or running one query shape N_PLUS_ONE_THRESHOLD times
+    or more (likely N+1), are logged to 'donations.queries' as JSON. With
+    SQL_SERVER_TIMING on, responses carry a Server-Timing header for the
+    browser's network panel.
+
+    Streaming responses are measured up to the point the view returns.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        self.repeat_threshold = getattr(settings, 'N_PLUS_ONE_THRESHOLD', 5)
+        self.server_timing = getattr(settings, 'SQL_SERVER_TIMING', False)
+
+    def __call__(self, request):
+        queries = QueryLog(self.repeat_threshold)
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = queries.seconds * 1000
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={db_ms:.1f};desc="{queries.count} queries", app;dur={total_ms - db_ms:.1f}'
+            )
+
+        suspects = queries.suspects()
+        if total_ms >= self.slow_ms or suspects:
+            logger.warning('%s', json.dumps({
+                'event': 'slow_request' if total_ms >= self.slow_ms else 'repeated_queries',
+                'method': request.method,
+                'path': request.path,
+                'view': getattr(request.resolver_match, 'view_name', None),
+                'status': response.status_code,
+                'duration_ms': round(total_ms, 1),
+                'queries': queries.count,
+                'db_ms': round(db_ms, 1),
+                'n_plus_one': suspects,
+            }))
+        return response
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0004_auditlog_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='donation',
+            name='title',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='donorprofile',
+            name='organization_name',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='helpseeker',
+            name='organization_name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
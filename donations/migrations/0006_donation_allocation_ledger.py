@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_allocations(apps, schema_editor):
+    Donation = apps.get_model('donations', 'Donation')
+    DonationRequest = apps.get_model('donations', 'DonationRequest')
+    DonationAllocation = apps.get_model('donations', 'DonationAllocation')
+
+    # Allocations must add up to quantity - remaining_quantity, or the next
+    # Donation.save() recomputes a different remaining quantity
+    Donation.objects.update(remaining_quantity=models.F('quantity'))
+
+    accepted = (
+        DonationRequest.objects.filter(status__in=['accepted', 'completed'])
+        .order_by('donation_id', 'pk')
+        .values_list('pk', 'donation_id', 'requested_quantity', 'donation__quantity', 'donation__status')
+    )
+    # donation id -> [quantity, status, allocations]
+    donations = {}
+    for pk, donation_id, requested, quantity, status in accepted.iterator():
+        entry = donations.setdefault(donation_id, [quantity, status, []])
+        left = quantity - sum(a.quantity for a in entry[2])
+        if left > 0:
+            entry[2].append(DonationAllocation(donation_id=donation_id, request_id=pk, quantity=min(requested, left)))
+
+    for donation_id, (quantity, status, allocations) in donations.items():
+        if not allocations:
+            continue
+        # Before the ledger, accepting a request reserved the whole donation:
+        # the first accepted request gets whatever the others did not ask for
+        if status != 'available':
+            allocations[0].quantity += quantity - sum(a.quantity for a in allocations)
+        DonationAllocation.objects.bulk_create(allocations)
+        Donation.objects.filter(pk=donation_id).update(
+            remaining_quantity=quantity - sum(a.quantity for a in allocations),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0005_index_autocomplete_search_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donation',
+            name='remaining_quantity',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.CreateModel(
+            name='DonationAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('donation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='donations.donation')),
+                ('request', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='allocation', to='donations.donationrequest')),
+            ],
+            options={
+                'verbose_name': 'Donation Allocation',
+                'verbose_name_plural': 'Donation Allocations',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.RunPython(backfill_allocations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0007_outbox_email'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('donation_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='digest_entries', to='donations.donationrequest')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='digest_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Digest Entry',
+                'verbose_name_plural': 'Digest Entries',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['user', 'created_at'], name='donations_d_user_id_3293d3_idx')],
+            },
+        ),
+    ]
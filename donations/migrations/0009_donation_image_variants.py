@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0008_email_digest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donation',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def copy_created_at(apps, schema_editor):
+    DonationMatch = apps.get_model('donations', 'DonationMatch')
+    DonationMatch.objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0010_stored_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donationmatch',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copy_created_at, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,15 @@
-from django.db import models
+import logging
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+logger = logging.getLogger(__name__)
+
 class VerificationRequest(models.Model):
     VERIFICATION_TYPES = [
         ('donor', 'Donor Verification'),
@@ -57,7 +62,7 @@ class DonorProfile(models.Model):
     ]
     
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    organization_name = models.CharField(max_length=255, blank=True, null=True)
+    organization_name = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     user_type = models.CharField(max_length=20, choices=USER_TYPES)
     phone = models.CharField(max_length=15)
     address = models.TextField()
@@ -125,7 +130,7 @@ class HelpSeeker(models.Model):
     ]
     
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    organization_name = models.CharField(max_length=255)
+    organization_name = models.CharField(max_length=255, db_index=True)
     seeker_type = models.ForeignKey(HelpSeekerType, on_delete=models.CASCADE)
     description = models.TextField()
     phone = models.CharField(max_length=15)
@@ -221,9 +226,11 @@ class Donation(models.Model):
     
     donor = models.ForeignKey(DonorProfile, on_delete=models.CASCADE, related_name='donations')
     category = models.ForeignKey(DonationCategory, on_delete=models.CASCADE)
-    title = models.CharField(max_length=255)
+    title = models.CharField(max_length=255, db_index=True)
     description = models.TextField()
     quantity = models.PositiveIntegerField(default=1)
+    # Units not yet allocated to accepted requests, maintained by donations.reservations
+    remaining_quantity = models.PositiveIntegerField(default=1)
     
     # Food specific fields
     food_type = models.CharField(max_length=15, choices=FOOD_TYPE_CHOICES, blank=True, null=True)
@@ -247,6 +254,9 @@ class Donation(models.Model):
     
     # Image fields
     image = models.ImageField(upload_to='donation_images/', blank=True, null=True)
+    # Resized copies written by donations.images:
+    # {'source': image.name, 'jpeg': {'240': name, ...}, 'webp': {...}}
+    image_variants = models.JSONField(default=dict, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -258,6 +268,7 @@ class Donation(models.Model):
         indexes = [
             models.Index(fields=['status', 'pickup_deadline']),
             models.Index(fields=['category', 'status']),
+            models.Index(fields=['updated_at', 'id']),
         ]
 
     def is_expired(self):
@@ -275,11 +286,42 @@ class Donation(models.Model):
     def donor_name(self):
         return self.donor.display_name
 
+    def image_srcset(self, image_format):
+        """srcset for the resized copies in `image_format`; empty while they are pending"""
+        variants = self.image_variants or {}
+        if not self.image or variants.get('source') != self.image.name:
+            return ''
+        storage = self.image.storage
+        return ', '.join(
+            f'{storage.url(name)} {width}w'
+            for width, name in sorted(variants.get(image_format, {}).items(), key=lambda item: int(item[0]))
+        )
+
+    @property
+    def jpeg_srcset(self):
+        return self.image_srcset('jpeg')
+
+    @property
+    def webp_srcset(self):
+        return self.image_srcset('webp')
+
+    def allocated_quantity(self):
+        """Units already handed to accepted requests"""
+        return self.allocations.aggregate(total=models.Sum('quantity'))['total'] or 0
+
+    def _check_quantity(self, allocated):
+        if self.quantity is not None and self.quantity < allocated:
+            raise ValidationError({
+                'quantity': f"{allocated} units are already allocated to accepted requests; "
+                            f"the quantity cannot be lower than that.",
+            })
+
+    def clean(self):
+        super().clean()
+        if self.pk:
+            self._check_quantity(self.allocated_quantity())
+
     def save(self, *args, **kwargs):
-        # Auto-expire donations
-        if self.is_expired() and self.status == 'available':
-            self.status = 'expired'
-        
         # Extract city and state from pickup address if not provided
         self._extract_location_from_address()
         
@@ -287,7 +329,51 @@ class Donation(models.Model):
         if self.pickup_address and not (self.latitude and self.longitude):
             self._geocode_address()
         
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if self._state.adding:
+                # Nothing is allocated yet on a new donation
+                self.remaining_quantity = self.quantity
+            else:
+                self._sync_remaining_quantity()
+
+            # Auto-expire donations
+            if self.is_expired() and self.status == 'available':
+                self.status = 'expired'
+
+            super().save(*args, **kwargs)
+
+    def prepare_for_bulk_create(self):
+        """
+        Fill in what save() derives for a new donation (pickup city/state,
+        remaining quantity, expiry) for rows written with bulk_create(),
+        which skips save(). Geocoding is left to the caller.
+        """
+        self._extract_location_from_address()
+        self.remaining_quantity = self.quantity
+        if self.is_expired() and self.status == 'available':
+            self.status = 'expired'
+
+    def _sync_remaining_quantity(self):
+        """
+        Recompute remaining_quantity from quantity and the allocation ledger,
+        so editing the quantity keeps the two consistent. The row is locked
+        first: a concurrent allocate() is either counted or waits for this save.
+
+        A quantity below the allocated units is rejected by clean() (forms,
+        the admin); code that saves it anyway gets remaining_quantity 0 and
+        a warning in the log rather than an error.
+        """
+        Donation.objects.select_for_update().filter(pk=self.pk).values_list('pk').first()
+        allocated = self.allocated_quantity()
+        if self.quantity < allocated:
+            logger.warning("Donation %s: quantity %s is below the %s units already allocated",
+                           self.pk, self.quantity, allocated)
+        self.remaining_quantity = max(0, self.quantity - allocated)
+        # Same rule as allocate() / release_allocation()
+        if self.remaining_quantity == 0 and self.status == 'available':
+            self.status = 'reserved'
+        elif self.remaining_quantity > 0 and self.status == 'reserved' and not self.is_expired():
+            self.status = 'available'
 
     def _extract_location_from_address(self):
         """Extract city and state from pickup address"""
@@ -349,6 +435,22 @@ class DonationRequest(models.Model):
         # Email sending is now handled in views.py
 
 
+class DonationAllocation(models.Model):
+    """Ledger entry: part of a donation's quantity handed to one accepted request"""
+    donation = models.ForeignKey(Donation, on_delete=models.CASCADE, related_name='allocations')
+    request = models.OneToOneField(DonationRequest, on_delete=models.CASCADE, related_name='allocation')
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Donation Allocation"
+        verbose_name_plural = "Donation Allocations"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.quantity} of {self.donation.title} for {self.request.requester.username}"
+
+
 class DonationMatch(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -367,11 +469,15 @@ class DonationMatch(models.Model):
     scheduled_pickup = models.DateTimeField(null=True, blank=True)
     actual_delivery = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Donation Match"
         verbose_name_plural = "Donation Matches"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['updated_at', 'id']),
+        ]
 
     @property
     def is_active(self):
@@ -419,11 +525,15 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     link = models.CharField(max_length=255, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Notification"
         verbose_name_plural = "Notifications"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'updated_at', 'id']),
+        ]
 
     def mark_as_read(self):
         self.is_read = True
@@ -478,6 +588,187 @@ class Rating(models.Model):
     def __str__(self):
         return f"Rating {self.rating} for {self.help_seeker.organization_name}"
 
+class AuditLog(models.Model):
+    ACTIONS = [
+        ('verify', 'Verified'),
+        ('reject', 'Rejected'),
+        ('approve', 'Approved'),
+        ('delete', 'Deleted'),
+    ]
+
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='audit_entries')
+    action = models.CharField(max_length=20, choices=ACTIONS)
+    object_type = models.CharField(max_length=50)
+    object_id = models.PositiveBigIntegerField()
+    object_repr = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Audit Log Entry"
+        verbose_name_plural = "Audit Log"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['object_type', 'object_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.object_type} #{self.object_id}"
+
+
+class BackgroundJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    result = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='background_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Bumped on claim and on every advance(); a running job whose heartbeat
+    # stops was left behind by a worker that died (see jobs.release_stuck)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Background Job"
+        verbose_name_plural = "Background Jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    @property
+    def progress(self):
+        """Completion percentage (0-100)"""
+        if not self.total:
+            return 100 if self.status == 'completed' else 0
+        return min(100, int(self.processed * 100 / self.total))
+
+    @property
+    def is_finished(self):
+        return self.status in ['completed', 'failed']
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.get_status_display()})"
+
+class OutboxEmail(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead Letter'),
+    ]
+
+    to = models.EmailField(max_length=254)
+    domain = models.CharField(max_length=255, blank=True, help_text="Recipient domain, used for rate limiting")
+    from_email = models.CharField(max_length=254)
+    reply_to = models.CharField(max_length=254, blank=True)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Outbox Email"
+        verbose_name_plural = "Outbox Emails"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['domain', 'sent_at']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self.domain and '@' in self.to:
+            self.domain = self.to.rsplit('@', 1)[1].lower()
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.subject} → {self.to} ({self.get_status_display()})"
+
+
+class DigestEntry(models.Model):
+    """A request notification held back for a donor's next digest email"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='digest_entries')
+    donation_request = models.ForeignKey(DonationRequest, on_delete=models.CASCADE, related_name='digest_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = 'Digest Entry'
+        verbose_name_plural = 'Digest Entries'
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.donation_request}"
+
+
+class StoredBlob(models.Model):
+    """
+    Reference count for a file kept by ContentAddressedStorage. One row per
+    stored file; `refcount` is the number of FileField values (and image
+    derivatives) pointing at it.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Stored Blob'
+        verbose_name_plural = 'Stored Blobs'
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount} refs)"
+
+
+class Tombstone(models.Model):
+    """
+    Marker left behind when a synced row disappears, so delta-sync clients
+    (see donations.sync) can drop it. `user` is the only account that gets
+    the marker; None means every client does.
+    """
+    REASON_CHOICES = [
+        ('deleted', 'Deleted'),
+        ('expired', 'Expired'),
+    ]
+
+    model_name = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='tombstones')
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default='deleted')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        verbose_name = 'Tombstone'
+        verbose_name_plural = 'Tombstones'
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.model_name} #{self.object_id} {self.reason}"
+
+
 # Remove or comment out the problematic signal
 # @receiver(post_save, sender=DonationRequest)
 # def send_donation_request_notification(sender, instance, created, **kwargs):
@@ -0,0 +1,190 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+# Defaults, overridable through settings.EMAIL_OUTBOX
+OUTBOX_DEFAULTS = {
+    'BATCH_SIZE': 50,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_SECONDS': 60,       # first retry delay, doubled on every failure
+    'MAX_BACKOFF_SECONDS': 3600,
+    # {'gmail.com': 100} -> at most 100 messages per minute to that domain
+    'DOMAIN_RATE_LIMITS': {},
+}
+
+
+def outbox_setting(name):
+    return getattr(settings, 'EMAIL_OUTBOX', {}).get(name, OUTBOX_DEFAULTS[name])
+
+
+def _domain(address):
+    return address.rsplit('@', 1)[1].lower() if '@' in address else ''
+
+
+def enqueue(message, using=DEFAULT_DB_ALIAS):
+    """
+    Store an EmailMessage/EmailMultiAlternatives in the outbox instead of
+    sending it. One row is written per recipient; returns the rows.
+    """
+    if not getattr(settings, 'ENABLE_EMAIL_NOTIFICATIONS', True):
+        return []
+
+    html_body = ''
+    for content, mimetype in getattr(message, 'alternatives', []):
+        if mimetype == 'text/html':
+            html_body = content
+
+    return OutboxEmail.objects.using(using).bulk_create([
+        OutboxEmail(
+            to=recipient,
+            domain=_domain(recipient),
+            from_email=message.from_email or settings.DEFAULT_FROM_EMAIL,
+            reply_to=', '.join(message.reply_to),
+            subject=message.subject,
+            body=message.body,
+            html_body=html_body,
+        )
+        for recipient in message.recipients()
+    ])
+
+
+def build_message(entry, connection=None):
+    message = EmailMultiAlternatives(
+        subject=entry.subject,
+        body=entry.body,
+        from_email=entry.from_email,
+        to=[entry.to],
+        reply_to=[a.strip() for a in entry.reply_to.split(',') if a.strip()],
+        connection=connection,
+    )
+    if entry.html_body:
+        message.attach_alternative(entry.html_body, 'text/html')
+    return message
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts` (1-based), exponential and capped"""
+    delay = outbox_setting('BACKOFF_SECONDS') * (2 ** (attempts - 1))
+    return timedelta(seconds=min(delay, outbox_setting('MAX_BACKOFF_SECONDS')))
+
+
+def _claim_batch(now, batch_size, using):
+    """Mark up to batch_size due messages as 'sending' and return them"""
+    outbox = OutboxEmail.objects.using(using)
+    with transaction.atomic(using=using):
+        ids = list(
+            outbox.select_for_update(skip_locked=True)
+            .filter(status='queued', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        # next_attempt_at doubles as the claim time for release_stuck()
+        outbox.filter(pk__in=ids).update(status='sending', next_attempt_at=now)
+    return list(outbox.filter(pk__in=ids).order_by('pk'))
+
+
+def _rate_limit_budget(entries, now, using):
+    """Remaining messages each rate-limited domain may receive in the current minute"""
+    limits = outbox_setting('DOMAIN_RATE_LIMITS')
+    domains = {e.domain for e in entries if e.domain in limits}
+    if not domains:
+        return {}
+    sent = dict(
+        OutboxEmail.objects.using(using).filter(domain__in=domains, status='sent', sent_at__gt=now - timedelta(minutes=1))
+        .values_list('domain')
+        .annotate(n=Count('pk'))
+    )
+    return {domain: max(0, limits[domain] - sent.get(domain, 0)) for domain in domains}
+
+
+def drain_outbox(batch_size=None, now=None, using=DEFAULT_DB_ALIAS):
+    """
+    Send one batch of due messages over a single reused SMTP connection.
+
+    Messages go through connection.send_messages() one at a time on the
+    shared connection so a failure can be attributed to its own row.
+
+    Failures are retried with exponential backoff and dead-lettered after
+    MAX_ATTEMPTS; messages over a domain's rate limit are deferred to the
+    next minute without counting as an attempt. Returns a dict of counts.
+
+    `using` picks the database holding the outbox (the mail benchmark
+    drains a scratch one).
+    """
+    now = now or timezone.now()
+    entries = _claim_batch(now, batch_size or outbox_setting('BATCH_SIZE'), using)
+    stats = {'sent': 0, 'retried': 0, 'dead': 0, 'deferred': 0}
+    if not entries:
+        return stats
+
+    budget = _rate_limit_budget(entries, now, using)
+    sent_ids, deferred_ids = [], []
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        for entry in entries:
+            _record_failure(entry, e, now, stats)
+        return stats
+
+    try:
+        for index, entry in enumerate(entries):
+            if entry.domain in budget:
+                if budget[entry.domain] <= 0:
+                    deferred_ids.append(entry.pk)
+                    continue
+                budget[entry.domain] -= 1
+
+            try:
+                connection.send_messages([build_message(entry, connection)])
+            except Exception as e:
+                _record_failure(entry, e, now, stats)
+                # A failed SMTP conversation may leave the connection unusable
+                try:
+                    connection.close()
+                    connection.open()
+                except Exception as e:
+                    # Nothing else in this batch can go out
+                    for remaining in entries[index + 1:]:
+                        _record_failure(remaining, e, now, stats)
+                    break
+            else:
+                sent_ids.append(entry.pk)
+    finally:
+        # Whatever happened above, delivered messages must not stay 'sending'
+        # (release_stuck() would queue them for a second delivery)
+        outbox = OutboxEmail.objects.using(using)
+        outbox.filter(pk__in=sent_ids).update(status='sent', sent_at=timezone.now(), last_error='')
+        outbox.filter(pk__in=deferred_ids).update(
+            status='queued', next_attempt_at=now + timedelta(minutes=1),
+        )
+        connection.close()
+
+    stats['sent'] = len(sent_ids)
+    stats['deferred'] = len(deferred_ids)
+    return stats
+
+
+def _record_failure(entry, error, now, stats):
+    attempts = entry.attempts + 1
+    if attempts >= outbox_setting('MAX_ATTEMPTS'):
+        values = {'status': 'dead'}
+        stats['dead'] += 1
+    else:
+        values = {'status': 'queued', 'next_attempt_at': now + backoff(attempts)}
+        stats['retried'] += 1
+    OutboxEmail.objects.using(entry._state.db).filter(pk=entry.pk).update(attempts=attempts, last_error=str(error)[:1000], **values)
+
+
+def release_stuck(older_than=timedelta(minutes=15)):
+    """Requeue messages left in 'sending' by a worker that died mid-batch"""
+    return OutboxEmail.objects.filter(
+        status='sending', next_attempt_at__lt=timezone.now() - older_than,
+    ).update(status='queued')
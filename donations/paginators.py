@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for very large tables.
+
+    On PostgreSQL an unfiltered changelist would run an exact COUNT(*) over the
+    whole table on every page view. When the planner statistics say the table
+    holds more than ESTIMATED_COUNT_THRESHOLD rows, the estimate from pg_class
+    is used instead. Filtered querysets, small tables and other databases keep
+    the exact count.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = self._estimated_count()
+        if estimate is not None:
+            return estimate
+        return super().count
+
+    def _estimated_count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or queryset.query.where:
+            return None
+
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+
+        # reltuples is -1 (or 0) until the table has been analyzed
+        threshold = getattr(settings, 'ESTIMATED_COUNT_THRESHOLD', 100000)
+        if row and row[0] >= threshold:
+            return row[0]
+        return None
@@ -0,0 +1,121 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Donation, DonationAllocation, DonationRequest
+
+
+class DonationUnavailable(Exception):
+    """Raised when a donation can no longer be requested or reserved"""
+
+
+def _available(donation_id, now):
+    return Donation.objects.filter(pk=donation_id, status='available', pickup_deadline__gt=now)
+
+
+def submit_request(donation_request):
+    """
+    Save a new request, but only while its donation is still available and
+    has enough unallocated quantity left.
+
+    The donation row is locked for the duration (select_for_update), so a
+    reservation that commits first makes this request fail instead of piling
+    onto an already reserved donation.
+    """
+    try:
+        with transaction.atomic():
+            available = _available(donation_request.donation_id, timezone.now()).select_for_update()
+            if not available.exists():
+                raise DonationUnavailable('This donation is no longer available.')
+            if not available.filter(remaining_quantity__gte=donation_request.requested_quantity).exists():
+                raise DonationUnavailable('Not enough quantity left for this request.')
+            donation_request.save()
+    except IntegrityError:
+        raise DonationUnavailable('You have already requested this donation.')
+    return donation_request
+
+
+def allocate(donation_request, quantity=None):
+    """
+    Accept a pending request and allocate `quantity` units (default: the
+    requested quantity) of its donation to it.
+
+    remaining_quantity is decremented with a conditional UPDATE
+    (remaining_quantity >= quantity), so concurrent allocations can never
+    over-commit a donation; the one that would go below zero raises
+    DonationUnavailable and leaves nothing behind. When the last unit is
+    allocated the donation moves to 'reserved' in the same transaction.
+    """
+    quantity = quantity or donation_request.requested_quantity
+    donation_id = donation_request.donation_id
+    now = timezone.now()
+
+    with transaction.atomic():
+        taken = _available(donation_id, now).filter(remaining_quantity__gte=quantity).update(
+            remaining_quantity=F('remaining_quantity') - quantity,
+            updated_at=now,
+        )
+        if not taken:
+            raise DonationUnavailable('Not enough of this donation is left, or it has been reserved or expired.')
+
+        accepted = DonationRequest.objects.filter(pk=donation_request.pk, status='pending').update(status='accepted')
+        if not accepted:
+            # Rolls back the decrement above
+            raise DonationUnavailable('This request is no longer pending.')
+
+        allocation = DonationAllocation.objects.create(
+            donation_id=donation_id,
+            request=donation_request,
+            quantity=quantity,
+        )
+        Donation.objects.filter(pk=donation_id, status='available', remaining_quantity=0).update(
+            status='reserved',
+            updated_at=now,
+        )
+
+    donation_request.status = 'accepted'
+    return allocation
+
+
+def accept_request(donation_request):
+    """Accept a pending request for the quantity it asked for"""
+    allocate(donation_request)
+    return donation_request
+
+
+def release_allocation(donation_request):
+    """
+    Return an accepted request's units to its donation.
+
+    A donation that was reserved only because it ran out becomes available
+    again (if its deadline has not passed).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        allocation = DonationAllocation.objects.select_for_update().filter(request=donation_request).first()
+        if allocation is None:
+            return 0
+        Donation.objects.filter(pk=allocation.donation_id).update(
+            remaining_quantity=F('remaining_quantity') + allocation.quantity,
+            updated_at=now,
+        )
+        Donation.objects.filter(
+            pk=allocation.donation_id, status='reserved', pickup_deadline__gt=now,
+        ).update(status='available')
+        allocation.delete()
+    return allocation.quantity
+
+
+def set_request_status(donation_request, status):
+    """Move a request to another status; accepting goes through allocate()"""
+    if status == 'accepted':
+        return accept_request(donation_request)
+    if status not in dict(DonationRequest.STATUS_CHOICES):
+        raise ValueError(f"Unknown request status: {status}")
+
+    with transaction.atomic():
+        if status == 'rejected':
+            release_allocation(donation_request)
+        DonationRequest.objects.filter(pk=donation_request.pk).update(status=status)
+    donation_request.status = status
+    return donation_request
@@ -0,0 +1,62 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Set while a request (or block of code) must read from the primary
+_use_primary = ContextVar('use_primary', default=False)
+
+# Apps whose rows are read straight after being written by the same
+# request (a replica may not have them yet)
+PRIMARY_ONLY_APPS = {'sessions'}
+
+
+def replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+@contextmanager
+def use_primary():
+    """Send every read inside the block to the primary database"""
+    token = _use_primary.set(True)
+    try:
+        yield
+    finally:
+        _use_primary.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary ('default'); reads go to a random database
+    from REPLICA_DATABASES unless they have to see the primary's latest
+    state: inside use_primary() (see ReplicaPinningMiddleware), inside a
+    transaction on the primary (so select_for_update() and read-then-write
+    code stay on one connection), or for PRIMARY_ONLY_APPS.
+    """
+
+    def db_for_read(self, model, **hints):
+        pool = replicas()
+        if (
+            not pool
+            or _use_primary.get()
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block
+            or model._meta.app_label in PRIMARY_ONLY_APPS
+        ):
+            return DEFAULT_DB_ALIAS
+        return random.choice(pool)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        pool = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas receive their schema through replication
+        return db not in replicas()
@@ -0,0 +1,108 @@
+from rest_framework import serializers
+
+from .models import Donation, DonationMatch, HelpRequest, HelpSeeker
+
+
+class SparseFieldsetSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer that honours ?fields=a,b,c and knows which relations
+    its fields read.
+
+    `related_fields` maps a serializer field to the select_related path it
+    needs, `prefetch_fields` to a prefetch_related lookup. eager_load()
+    applies only the joins the requested fields actually use.
+    """
+
+    related_fields = {}
+    prefetch_fields = {}
+
+    @classmethod
+    def requested_fields(cls, request):
+        fields = request.query_params.get('fields') if request else None
+        if not fields:
+            return None
+        return {f.strip() for f in fields.split(',') if f.strip()}
+
+    @classmethod
+    def eager_load(cls, queryset, request=None):
+        requested = cls.requested_fields(request)
+        wanted = lambda field: requested is None or field in requested
+        select = {path for field, path in cls.related_fields.items() if wanted(field)}
+        prefetch = {path for field, path in cls.prefetch_fields.items() if wanted(field)}
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.requested_fields(self.context.get('request'))
+        if requested is not None:
+            for name in set(self.fields) - requested - {'id'}:
+                self.fields.pop(name)
+
+
+class DonationSerializer(SparseFieldsetSerializer):
+    category = serializers.CharField(source='category.name', read_only=True)
+    donor = serializers.CharField(source='donor_name', read_only=True)
+    preferred_help_seekers = serializers.StringRelatedField(many=True, read_only=True)
+    image = serializers.ImageField(read_only=True)
+
+    related_fields = {'category': 'category', 'donor': 'donor__user'}
+    prefetch_fields = {'preferred_help_seekers': 'preferred_help_seekers'}
+
+    class Meta:
+        model = Donation
+        fields = [
+            'id', 'title', 'description', 'category', 'donor', 'quantity', 'remaining_quantity',
+            'food_type', 'cooked_time', 'best_before', 'pickup_city', 'pickup_state',
+            'pickup_deadline', 'status', 'latitude', 'longitude', 'preferred_help_seekers',
+            'image', 'created_at', 'updated_at',
+        ]
+
+
+class HelpSeekerSerializer(SparseFieldsetSerializer):
+    seeker_type = serializers.CharField(source='seeker_type.name', read_only=True)
+
+    related_fields = {'seeker_type': 'seeker_type'}
+
+    class Meta:
+        model = HelpSeeker
+        fields = [
+            'id', 'organization_name', 'seeker_type', 'description', 'city', 'state',
+            'latitude', 'longitude', 'capacity', 'verification_status', 'is_urgent',
+            'urgent_needs', 'created_at', 'updated_at',
+        ]
+
+
+class HelpRequestSerializer(SparseFieldsetSerializer):
+    help_seeker = serializers.PrimaryKeyRelatedField(read_only=True)
+    organization_name = serializers.CharField(source='help_seeker.organization_name', read_only=True)
+    category = serializers.CharField(source='category.name', read_only=True)
+
+    related_fields = {'organization_name': 'help_seeker', 'category': 'category'}
+
+    class Meta:
+        model = HelpRequest
+        fields = [
+            'id', 'help_seeker', 'organization_name', 'category', 'title', 'description',
+            'quantity_needed', 'urgency', 'is_active', 'deadline', 'created_at', 'updated_at',
+        ]
+
+
+class DonationMatchSerializer(SparseFieldsetSerializer):
+    donation = serializers.PrimaryKeyRelatedField(read_only=True)
+    donation_title = serializers.CharField(source='donation.title', read_only=True)
+    help_seeker = serializers.PrimaryKeyRelatedField(read_only=True)
+    organization_name = serializers.CharField(source='help_seeker.organization_name', read_only=True)
+
+    related_fields = {'donation_title': 'donation', 'organization_name': 'help_seeker'}
+
+    class Meta:
+        model = DonationMatch
+        fields = [
+            'id', 'donation', 'donation_title', 'help_seeker', 'organization_name', 'status',
+            'distance_km', 'match_score', 'donor_message', 'seeker_response',
+            'scheduled_pickup', 'actual_delivery', 'created_at', 'updated_at',
+        ]
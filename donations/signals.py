@@ -0,0 +1,87 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from . import blobs, sync
+from .cache import HELP_SEEKER_MAP_KEY, HOME_STATS_KEY, invalidate
+from .models import (
+    Donation, DonationMatch, DonorProfile, HelpSeeker, HelpSeekerType, Notification, VerificationRequest,
+)
+
+# Sent by the expiry sweeper after a batch of donations moved from
+# 'available' to 'expired'. Receivers get `donation_ids` (list of pks).
+donations_expired = Signal()
+
+
+@receiver(donations_expired, sender=Donation)
+def notify_donors_of_expiry(sender, donation_ids, **kwargs):
+    """Let donors know their unclaimed donations expired"""
+    rows = Donation.objects.filter(pk__in=donation_ids).values_list('pk', 'title', 'donor__user_id')
+    Notification.objects.bulk_create([
+        Notification(
+            user_id=user_id,
+            message=f"Your donation '{title}' expired before it was picked up.",
+            link=f"/donations/{pk}/",
+        )
+        for pk, title, user_id in rows
+    ])
+
+
+# Keep ContentAddressedStorage reference counts in step with FileField values
+for model in (Donation, DonorProfile, HelpSeeker, VerificationRequest):
+    if blobs.counted_fields(model):
+        pre_save.connect(blobs.remember_files, sender=model, dispatch_uid=f'remember_files_{model.__name__}')
+        post_save.connect(blobs.update_references, sender=model, dispatch_uid=f'update_references_{model.__name__}')
+        post_delete.connect(blobs.drop_references, sender=model, dispatch_uid=f'drop_references_{model.__name__}')
+
+
+@receiver(post_delete, sender=Donation)
+def release_image_variants(sender, instance, **kwargs):
+    """Resized copies are not a FileField, so release them here"""
+    from .images import variant_names
+    if instance.image_variants:
+        blobs.release(instance.image.storage, variant_names(instance.image_variants))
+
+
+# Tombstones let delta-sync clients drop deleted and expired rows
+pre_delete.connect(sync.note_deleted_user, sender=User, dispatch_uid='note_deleted_user')
+for model in (Donation, DonationMatch, Notification):
+    post_delete.connect(sync.record_deletion, sender=model, dispatch_uid=f'record_deletion_{model.__name__}')
+
+
+@receiver(donations_expired, sender=Donation)
+def record_expiry(sender, donation_ids, **kwargs):
+    sync.record_expiry(donation_ids)
+
+
+# Cached values (donations.cache.memoize) built from each model's rows
+CACHED_FROM = {
+    Donation: [HOME_STATS_KEY],
+    DonorProfile: [HOME_STATS_KEY],
+    HelpSeeker: [HOME_STATS_KEY, HELP_SEEKER_MAP_KEY],
+    HelpSeekerType: [HELP_SEEKER_MAP_KEY],
+}
+
+
+def invalidate_cached_for(model):
+    """
+    Drop the cached values built from `model` once the transaction commits.
+    Called directly after writes that send no signals (QuerySet.update()).
+    """
+    keys = CACHED_FROM.get(model)
+    if keys:
+        # After commit, so a request racing this one cannot cache the old rows again
+        transaction.on_commit(lambda: invalidate(*keys))
+
+
+def invalidate_cached(sender, created=True, **kwargs):
+    # Only new donations change the home statistics
+    if sender is Donation and not created:
+        return
+    invalidate_cached_for(sender)
+
+
+for model in CACHED_FROM:
+    post_save.connect(invalidate_cached, sender=model, dispatch_uid=f'invalidate_cached_save_{model.__name__}')
+    post_delete.connect(invalidate_cached, sender=model, dispatch_uid=f'invalidate_cached_delete_{model.__name__}')
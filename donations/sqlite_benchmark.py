@@ -0,0 +1,164 @@
+"""
+Concurrent write benchmark used by `manage.py benchmark_sqlite`.
+
+Each configuration gets a scratch SQLite file and its own database alias,
+so the run goes through Django's SQLite backend (init_command,
+transaction_mode) exactly like the site does, without touching the real
+database.
+"""
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+# Label -> OPTIONS. 'defaults' is SQLite as Django configures it out of the
+# box (rollback journal, synchronous=FULL, deferred transactions).
+CONFIGURATIONS = {
+    'defaults': {},
+    'tuned': settings.SQLITE_OPTIONS,
+}
+
+SCHEMA = [
+    'CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER NOT NULL)',
+    'CREATE TABLE event (id INTEGER PRIMARY KEY, counter INTEGER NOT NULL, payload TEXT NOT NULL)',
+    'INSERT INTO counter (id, value) VALUES (1, 0)',
+]
+
+
+def _add_database(alias, name, options):
+    database = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': name, 'OPTIONS': dict(options)}
+    # configure_settings() fills in the defaults (ATOMIC_REQUESTS, TIME_ZONE, ...)
+    connections.settings[alias] = connections.configure_settings({DEFAULT_DB_ALIAS: database})[DEFAULT_DB_ALIAS]
+
+
+def _remove_database(alias):
+    connections[alias].close()
+    del connections[alias]
+    del connections.settings[alias]
+
+
+@contextmanager
+def scratch_database(options=None, prefix='sqlite-bench-'):
+    """
+    Register a throwaway SQLite file as its own database alias and yield the
+    alias; the file and the alias are removed afterwards.
+    """
+    directory = tempfile.mkdtemp(prefix=prefix)
+    alias = f'scratch_{os.path.basename(directory)}'.replace('-', '_')
+    _add_database(alias, os.path.join(directory, 'bench.sqlite3'), options or {})
+    try:
+        # Open it up front: Django's TestCase only lets aliases it was not
+        # told about through when they already have a connection
+        connections[alias].connect()
+        yield alias
+    finally:
+        _remove_database(alias)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _write(alias, payload):
+    """
+    Read-modify-write in one transaction, the pattern that deadlocks under
+    deferred transactions: both writers hold read locks, neither can upgrade.
+    """
+    with transaction.atomic(using=alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT value FROM counter WHERE id = 1')
+            value = cursor.fetchone()[0] + 1
+            cursor.execute('UPDATE counter SET value = %s WHERE id = 1', [value])
+            cursor.execute('INSERT INTO event (counter, payload) VALUES (%s, %s)', [value, payload])
+
+
+def run_configuration(options, threads=8, transactions=200, readers=2):
+    """
+    `threads` writers each attempt `transactions` writes while `readers`
+    threads keep counting rows. Returns a dict of results.
+    """
+    with scratch_database(options) as alias:
+        with connections[alias].cursor() as cursor:
+            for statement in SCHEMA:
+                cursor.execute(statement)
+
+        lock = threading.Lock()
+        latencies, errors, reads = [], [], []
+        writing = threading.Event()
+        writing.set()
+        payload = 'x' * 200
+
+        def writer():
+            mine, failed = [], 0
+            try:
+                for _ in range(transactions):
+                    started = time.perf_counter()
+                    try:
+                        _write(alias, payload)
+                    except OperationalError:
+                        failed += 1
+                    else:
+                        mine.append(time.perf_counter() - started)
+            finally:
+                connections[alias].close()
+            with lock:
+                latencies.extend(mine)
+                errors.append(failed)
+
+        def reader():
+            count = 0
+            try:
+                while writing.is_set():
+                    with connections[alias].cursor() as cursor:
+                        cursor.execute('SELECT COUNT(*) FROM event')
+                        cursor.fetchone()
+                    count += 1
+            except OperationalError:
+                pass
+            finally:
+                connections[alias].close()
+            with lock:
+                reads.append(count)
+
+        reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+        writer_threads = [threading.Thread(target=writer) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in reader_threads + writer_threads:
+            thread.start()
+        for thread in writer_threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        writing.clear()
+        for thread in reader_threads:
+            thread.join()
+
+        with connections[alias].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal_mode = cursor.fetchone()[0]
+            cursor.execute('SELECT value FROM counter WHERE id = 1')
+            counter = cursor.fetchone()[0]
+
+        latencies.sort()
+        return {
+            'journal_mode': journal_mode,
+            'committed': len(latencies),
+            'failed': sum(errors),
+            'lost_updates': len(latencies) - counter,
+            'seconds': elapsed,
+            'writes_per_second': len(latencies) / elapsed if elapsed else 0,
+            'p50_ms': statistics.median(latencies) * 1000 if latencies else 0,
+            'p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0,
+            'reads_per_second': sum(reads) / elapsed if elapsed else 0,
+        }
+
+
+def benchmark(threads=8, transactions=200, readers=2, configurations=None):
+    """Run every configuration in turn; returns {label: results}"""
+    configurations = configurations or CONFIGURATIONS
+    return {
+        label: run_configuration(options, threads, transactions, readers)
+        for label, options in configurations.items()
+    }
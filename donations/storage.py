@@ -0,0 +1,68 @@
+import hashlib
+import os
+import posixpath
+import re
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+# <upload_to>/<first two hex digits>/<sha256 hex><ext>
+CONTENT_ADDRESSED_NAME = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}(\.\w+)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage that keeps one copy of each distinct file.
+
+    Uploads are hashed (SHA-256) while they are streamed to a temporary file
+    and then moved to a name derived from the digest inside the field's
+    upload_to directory, e.g. donation_images/meal.jpg becomes
+    donation_images/3f/3fa4...e1.jpg. Saving content that is already stored
+    just returns the existing name. Since a name can never point at
+    different bytes, its URL may be cached forever (see is_immutable()).
+
+    Files are shared between rows, so nothing should delete them directly;
+    donations.blobs keeps a reference count per file and removes it when
+    the last FileField referencing it lets go.
+    """
+
+    incoming_dir = '.incoming'
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is chosen in _save() and may legitimately exist already
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name.replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+
+        incoming = self.path(self.incoming_dir)
+        os.makedirs(incoming, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=incoming)
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                if hasattr(content, 'seek') and content.seekable():
+                    content.seek(0)
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            hexdigest = digest.hexdigest()
+            final_name = posixpath.join(directory, hexdigest[:2], hexdigest + extension)
+            final_path = self.path(final_name)
+            if os.path.exists(final_path):
+                os.remove(temp_path)
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.chmod(temp_path, self.file_permissions_mode or 0o644)
+                os.replace(temp_path, final_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return final_name
+
+    @staticmethod
+    def is_immutable(name):
+        return bool(CONTENT_ADDRESSED_NAME.search(name))
@@ -0,0 +1,176 @@
+from datetime import datetime, timedelta
+
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Donation, DonationMatch, HelpSeeker, Notification, Tombstone
+
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+
+# Rows newer than this are held back until the next sync: a transaction
+# that started earlier may still commit an older updated_at, and a cursor
+# that had already moved past it would never see that row.
+SETTLE_SECONDS = 2
+
+# Tombstones older than this are pruned (see prune_tombstones), so a client
+# may go at most this long between syncs. A token from before the cutoff
+# could have missed deletions; it restarts as a full sync with 'reset' set,
+# and the client replaces its local copy instead of merging into it.
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+TOKEN_SALT = 'donations.sync'
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class Stream:
+    """One kind of row a client keeps in sync, read in (`key`, id) order"""
+
+    def __init__(self, name, key, fields, queryset):
+        self.name = name
+        self.key = key
+        self.fields = fields
+        self.queryset = queryset
+
+    def after(self, user, position, until):
+        queryset = self.queryset(user).filter(**{f'{self.key}__lt': until})
+        if position is not None:
+            moment, pk = position
+            queryset = queryset.filter(
+                Q(**{f'{self.key}__gt': moment}) | Q(**{self.key: moment, 'pk__gt': pk})
+            )
+        return queryset.order_by(self.key, 'pk').values(*self.fields)
+
+
+def own_matches(user):
+    return DonationMatch.objects.filter(Q(donation__donor__user=user) | Q(help_seeker__user=user))
+
+
+def own_tombstones(user):
+    return Tombstone.objects.filter(Q(user=user) | Q(user__isnull=True))
+
+
+STREAMS = [
+    Stream('donations', 'updated_at', [
+        'id', 'title', 'category_id', 'status', 'quantity', 'remaining_quantity', 'food_type',
+        'pickup_city', 'pickup_state', 'pickup_deadline', 'latitude', 'longitude', 'updated_at',
+    ], lambda user: Donation.objects.all()),
+    Stream('donation_matches', 'updated_at', [
+        'id', 'donation_id', 'help_seeker_id', 'status', 'distance_km', 'match_score',
+        'scheduled_pickup', 'actual_delivery', 'updated_at',
+    ], own_matches),
+    Stream('notifications', 'updated_at', [
+        'id', 'message', 'link', 'is_read', 'created_at', 'updated_at',
+    ], lambda user: Notification.objects.filter(user=user)),
+    Stream('deleted', 'created_at', [
+        'id', 'model_name', 'object_id', 'reason', 'created_at',
+    ], own_tombstones),
+]
+
+
+def dump_token(positions):
+    return signing.dumps(
+        {name: [moment.isoformat(), pk] for name, (moment, pk) in positions.items()},
+        salt=TOKEN_SALT, compress=True,
+    )
+
+
+def load_token(token):
+    """Per-stream (moment, pk) positions from a resume token; {} for a full sync"""
+    if not token:
+        return {}
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT)
+        return {name: (datetime.fromisoformat(moment), int(pk)) for name, (moment, pk) in data.items()}
+    except (signing.BadSignature, AttributeError, TypeError, ValueError):
+        raise InvalidToken('Invalid or corrupted sync token.')
+
+
+def changes_since(user, token=None, limit=DEFAULT_LIMIT, now=None):
+    """
+    Everything that changed for `user` since `token` was handed out.
+
+    Each stream returns at most `limit` rows in (updated_at, id) order;
+    `next` resumes every stream where this batch stopped, and `has_more`
+    says whether the client should ask again straight away. Deleted rows
+    and expired donations come back under 'deleted' as
+    {'type', 'id', 'reason', 'at'}. `reset` is true when the token is older
+    than TOMBSTONE_RETENTION and this is the start of a full sync instead.
+    """
+    now = now or timezone.now()
+    positions = load_token(token)
+    result = {'has_more': False, 'reset': False}
+    deleted_position = positions.get('deleted')
+    if deleted_position is not None and deleted_position[0] < now - TOMBSTONE_RETENTION:
+        positions = {}
+        result['reset'] = True
+    until = now - timedelta(seconds=SETTLE_SECONDS)
+
+    for stream in STREAMS:
+        rows = list(stream.after(user, positions.get(stream.name), until)[:limit + 1])
+        if len(rows) > limit:
+            rows = rows[:limit]
+            positions[stream.name] = (rows[-1][stream.key], rows[-1]['id'])
+            result['has_more'] = True
+        else:
+            # Caught up: the next sync starts where this one's window ended
+            positions[stream.name] = (until, 0)
+        result[stream.name] = rows
+
+    result['deleted'] = [
+        {'type': row['model_name'], 'id': row['object_id'], 'reason': row['reason'], 'at': row['created_at']}
+        for row in result['deleted']
+    ]
+    result['next'] = dump_token(positions)
+    return result
+
+
+def audience(instance):
+    """User ids that should receive a tombstone for `instance`; [None] means everyone"""
+    if isinstance(instance, Notification):
+        return [instance.user_id]
+    if isinstance(instance, DonationMatch):
+        donors = Donation.objects.filter(pk=instance.donation_id).values_list('donor__user_id', flat=True)
+        seekers = HelpSeeker.objects.filter(pk=instance.help_seeker_id).values_list('user_id', flat=True)
+        return sorted({pk for pk in [*donors, *seekers] if pk is not None})
+    return [None]
+
+
+def note_deleted_user(sender, instance, origin=None, **kwargs):
+    """
+    pre_delete receiver for User. Every pre_delete of a delete() is sent
+    before any row goes, so by the time record_deletion runs the origin
+    (the instance or QuerySet delete() was called on) lists every account
+    it removes.
+    """
+    if origin is not None:
+        origin.__dict__.setdefault('_deleted_user_ids', set()).add(instance.pk)
+
+
+def record_deletion(sender, instance, origin=None, **kwargs):
+    """post_delete receiver for every synced model"""
+    # An account being deleted needs no tombstones (and could not hold them)
+    gone = getattr(origin, '_deleted_user_ids', ())
+    Tombstone.objects.bulk_create([
+        Tombstone(model_name=sender._meta.model_name, object_id=instance.pk, user_id=user_id)
+        for user_id in audience(instance)
+        if user_id not in gone
+    ])
+
+
+def prune_tombstones(now=None):
+    """Delete tombstones past TOMBSTONE_RETENTION; returns how many went"""
+    cutoff = (now or timezone.now()) - TOMBSTONE_RETENTION
+    deleted, _ = Tombstone.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+def record_expiry(donation_ids):
+    Tombstone.objects.bulk_create([
+        Tombstone(model_name='donation', object_id=pk, reason='expired')
+        for pk in donation_ids
+    ])
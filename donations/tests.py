@@ -1,3 +1,1568 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import sqlite3
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from smtplib import SMTPException
+import unittest
+from unittest import mock
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend as LocmemBackend
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, transaction
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from .models import (
+    AuditLog, Donation, DonationAllocation, DonationCategory, DonationRequest, DigestEntry, DonorProfile, OutboxEmail,
+    BackgroundJob, DonationMatch, HelpRequest, HelpSeeker, HelpSeekerType, Notification, StoredBlob,
+    Tombstone, VerificationRequest,
+)
+from .cache import HELP_SEEKER_MAP_KEY, HOME_STATS_KEY, memoize
+from .bulk import delete_profiles, parse_ids, queue_bulk_job, verify_donors_and_seekers, verify_profiles
+from .digest import send_due_digests
+from .middleware import fingerprint
+from .email_rendering import EmailRenderer
+from .email_utils import send_donation_request_email
+from .expiry import MIN_SLEEP_SECONDS, expire_due_donations, seconds_until_next_expiry
+from .forms import DonorVerificationForm
+from .images import process_donations
+from .jobs import MAX_ATTEMPTS as MAX_JOB_ATTEMPTS, release_stuck, run_pending_jobs
+from .importer import geocode_donations, import_donations, iter_json_array, read_rows
+from .media_gc import collect_garbage
+from .paginators import EstimatedCountPaginator
+from .uploads import RejectedUpload
+from .mail_benchmark import SMTPSink, benchmark_delivery, email_templates, sample_context
+from .outbox import drain_outbox, enqueue
+from .sync import TOMBSTONE_RETENTION, changes_since
+from .routers import PrimaryReplicaRouter
+from .signals import donations_expired
+from .sqlite_benchmark import benchmark as benchmark_sqlite
+from .reservations import (
+    DonationUnavailable, accept_request, allocate, release_allocation, submit_request,
+)
+
+
+def make_donation(username='donor', quantity=1, **kwargs):
+    user = User.objects.create_user(username, f'{username}@example.com')
+    donor = DonorProfile.objects.create(
+        user=user, user_type='individual', phone='1', address='Street',
+        city='Pune', state='MH', pincode='411001',
+    )
+    category, _ = DonationCategory.objects.get_or_create(name='Food')
+    fields = {
+        'donor': donor,
+        'category': category,
+        'title': 'Meals',
+        'description': 'Fresh meals',
+        'quantity': quantity,
+        'pickup_address': 'Street, Pune, MH',
+        'pickup_deadline': timezone.now() + timedelta(hours=4),
+        # Coordinates set so save() does not try to geocode over the network
+        'latitude': 18.5,
+        'longitude': 73.8,
+    }
+    fields.update(kwargs)
+    return Donation.objects.create(**fields)
+
+
+def make_requests(donation, count, quantity=1):
+    requests = []
+    for i in range(count):
+        requester = User.objects.create_user(f'requester{i}', f'r{i}@example.com')
+        requests.append(DonationRequest.objects.create(
+            donation=donation, requester=requester, requested_quantity=quantity,
+        ))
+    return requests
+
+
+def run_concurrently(func, args_list):
+    """Run func(*args) for every args tuple on its own thread, all released at once"""
+    barrier = threading.Barrier(len(args_list))
+    outcomes = [None] * len(args_list)
+
+    def worker(index, args):
+        try:
+            barrier.wait()
+            outcomes[index] = func(*args)
+        except Exception as e:
+            outcomes[index] = e
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(i, args)) for i, args in enumerate(args_list)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+class BulkProfileActionTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.seekers = [make_help_seeker(f'seeker{i}') for i in range(3)]
+        self.ids = [seeker.pk for seeker in self.seekers]
+
+    def test_parse_ids_accepts_comma_separated_and_repeated_values(self):
+        self.assertEqual(parse_ids(['3, 1,x', '2', '1', '', '-4']), [1, 2, 3])
+
+    def test_verify_skips_profiles_that_are_already_verified(self):
+        HelpSeeker.objects.filter(pk=self.ids[0]).update(verification_status='verified')
+
+        self.assertEqual(verify_profiles('seeker', self.ids + [999], self.admin), 2)
+
+        self.assertEqual(HelpSeeker.objects.filter(verification_status='verified', verified_by=self.admin).count(), 2)
+        self.assertEqual(AuditLog.objects.filter(action='verify', object_type='helpseeker').count(), 2)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_delete_notifies_users_who_keep_their_account(self):
+        self.assertEqual(delete_profiles('seeker', self.ids[:2], self.admin), 2)
+
+        self.assertEqual(list(HelpSeeker.objects.values_list('pk', flat=True)), self.ids[2:])
+        self.assertEqual(User.objects.filter(username__in=['seeker0', 'seeker1']).count(), 2)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(AuditLog.objects.filter(action='delete').count(), 2)
+
+    def test_delete_with_users(self):
+        self.assertEqual(delete_profiles('seeker', self.ids[:2], self.admin, delete_users=True), 2)
+
+        self.assertFalse(User.objects.filter(username__in=['seeker0', 'seeker1']).exists())
+        self.assertFalse(Notification.objects.exists())
+
+    def test_donors_and_seekers_change_in_one_transaction(self):
+        donor = make_donation('donor').donor
+        real_verify = verify_profiles
+
+        def verify(profile_type, ids, actor):
+            if profile_type == 'seeker':
+                raise RuntimeError('database went away')
+            return real_verify(profile_type, ids, actor)
+
+        with mock.patch('donations.bulk.verify_profiles', side_effect=verify):
+            with self.assertRaises(RuntimeError):
+                verify_donors_and_seekers([donor.pk], self.ids, self.admin)
+
+        donor.refresh_from_db()
+        self.assertNotEqual(donor.verification_status, 'verified')
+        self.assertFalse(AuditLog.objects.exists())
+
+    @override_settings(BULK_ACTION_ASYNC_THRESHOLD=2)
+    def test_large_batches_run_as_a_job_with_progress(self):
+        self.client.force_login(self.admin)
+        self.client.post('/superuser/bulk-verify/', {'seeker_ids': ','.join(map(str, self.ids))})
+        job = BackgroundJob.objects.get()
+        self.assertEqual((job.status, job.total), ('queued', 3))
+        self.assertFalse(HelpSeeker.objects.filter(verification_status='verified').exists())
+
+        self.assertEqual(run_pending_jobs(), 1)
+
+        status = self.client.get(f'/superuser/jobs/{job.pk}/').json()
+        self.assertEqual(
+            (status['status'], status['processed'], status['progress'], status['result']),
+            ('completed', 3, 100, '3 profiles verified'),
+        )
+        self.assertEqual(HelpSeeker.objects.filter(verification_status='verified').count(), 3)
+
+    @override_settings(BULK_ACTION_ASYNC_THRESHOLD=2)
+    def test_failed_job_records_the_error(self):
+        self.client.force_login(self.admin)
+        self.client.post('/superuser/bulk-delete/', {'seeker_ids': ','.join(map(str, self.ids))})
+
+        with mock.patch('donations.bulk.delete_profiles', side_effect=RuntimeError('disk full')):
+            with self.assertLogs('donations.jobs', 'ERROR') as logs:
+                run_pending_jobs()
+
+        job = BackgroundJob.objects.get()
+        self.assertEqual((job.status, job.result), ('failed', 'disk full'))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(HelpSeeker.objects.count(), 3)
+        self.assertIn('RuntimeError: disk full', logs.output[0])
+
+    def test_jobs_left_running_by_a_dead_worker_are_requeued(self):
+        job = queue_bulk_job('bulk_verify_profiles', [], self.ids, self.admin)
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status='running', attempts=1, processed=2, heartbeat_at=timezone.now() - timedelta(hours=1),
+        )
+        self.assertEqual(release_stuck(), (1, 0))
+        self.assertEqual(BackgroundJob.objects.get().status, 'queued')
+
+        self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.attempts), ('completed', 3, 2))
+
+    def test_jobs_that_keep_killing_their_worker_are_failed(self):
+        job = queue_bulk_job('bulk_verify_profiles', [], self.ids, self.admin)
+        BackgroundJob.objects.filter(pk=job.pk).update(
+            status='running', attempts=MAX_JOB_ATTEMPTS, heartbeat_at=timezone.now() - timedelta(hours=1),
+        )
+
+        self.assertEqual(release_stuck(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIsNotNone(job.finished_at)
+
+
+class VerificationAdminActionTests(TestCase):
+    def test_approving_requests_keeps_the_original_verifier(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        original = User.objects.create_user('original')
+        earlier, fresh = make_help_seeker('earlier'), make_help_seeker('fresh')
+        HelpSeeker.objects.filter(pk=earlier.pk).update(verification_status='verified', verified_by=original)
+        # bulk_create: no document file (and no blob reference) is needed here
+        requests = VerificationRequest.objects.bulk_create([
+            VerificationRequest(user=seeker.user, verification_type='help_seeker', document='verification_docs/id.pdf')
+            for seeker in (earlier, fresh)
+        ])
+
+        self.client.force_login(admin_user)
+        self.client.post('/admin/donations/verificationrequest/', {
+            'action': 'approve_requests',
+            '_selected_action': [r.pk for r in requests],
+        })
+
+        self.assertEqual(HelpSeeker.objects.get(pk=earlier.pk).verified_by, original)
+        self.assertEqual(HelpSeeker.objects.get(pk=fresh.pk).verified_by, admin_user)
+        self.assertEqual(
+            list(AuditLog.objects.filter(action='verify').values_list('object_type', 'object_id')),
+            [('helpseeker', fresh.pk)],
+        )
+        self.assertEqual(AuditLog.objects.filter(action='approve').count(), 2)
+        self.assertEqual(VerificationRequest.objects.filter(status='approved').count(), 2)
+
+
+class AdminChangelistQueryTests(TestCase):
+    def setUp(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        for i in range(6):
+            donation = make_donation(f'donor{i}')
+            seeker = make_help_seeker(f'seeker{i}')
+            DonationRequest.objects.create(donation=donation, requester=seeker.user, requested_quantity=1)
+            DonationMatch.objects.create(donation=donation, help_seeker=seeker, match_score=80)
+            Notification.objects.create(user=seeker.user, message='Hello')
+            AuditLog.objects.create(actor=admin_user, action='verify', object_type='helpseeker', object_id=seeker.pk)
+        VerificationRequest.objects.bulk_create([
+            VerificationRequest(user=seeker.user, verification_type='help_seeker', document='verification_docs/id.pdf')
+            for seeker in HelpSeeker.objects.all()
+        ])
+        self.client.force_login(admin_user)
+
+    def assertQueriesIndependentOfPageSize(self, model, url):
+        model_admin = admin.site._registry[model]
+        with mock.patch.object(model_admin, 'list_per_page', 2), CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['cl'].result_list), 2)
+
+        with mock.patch.object(model_admin, 'list_per_page', 6), self.assertNumQueries(len(queries)):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['cl'].result_list), 6)
+
+    def test_changelists_run_a_fixed_number_of_queries(self):
+        for model, url in [
+            (User, '/admin/auth/user/'),
+            (Donation, '/admin/donations/donation/'),
+            (DonorProfile, '/admin/donations/donorprofile/'),
+            (HelpSeeker, '/admin/donations/helpseeker/'),
+            (DonationRequest, '/admin/donations/donationrequest/'),
+            (DonationMatch, '/admin/donations/donationmatch/'),
+            (Notification, '/admin/donations/notification/'),
+            (VerificationRequest, '/admin/donations/verificationrequest/'),
+            (AuditLog, '/admin/donations/auditlog/'),
+        ]:
+            with self.subTest(model=model.__name__):
+                self.assertQueriesIndependentOfPageSize(model, url)
+
+    def test_user_admin_shows_donor_and_seeker_profiles(self):
+        donor = DonorProfile.objects.select_related('user').first()
+        response = self.client.get('/admin/auth/user/')
+        self.assertContains(response, 'Donor Status')
+        self.assertContains(response, 'Seeker Status')
+
+        response = self.client.get(f'/admin/auth/user/{donor.user.pk}/change/')
+        self.assertContains(response, 'Donor Profile')
+        self.assertNotContains(response, 'Help Seeker Profile')
+
+    def test_estimated_count_only_for_unfiltered_querysets(self):
+        cursor = mock.MagicMock()
+        cursor.__enter__.return_value = cursor
+        cursor.fetchone.return_value = (500000,)
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            with mock.patch.object(connection, 'cursor', return_value=cursor):
+                self.assertEqual(EstimatedCountPaginator(Notification.objects.all(), 20).count, 500000)
+            # Filtered: falls back to the exact COUNT(*)
+            with self.assertNumQueries(1):
+                self.assertEqual(EstimatedCountPaginator(Notification.objects.filter(message='Hello'), 20).count, 6)
+
+
+class AutocompleteSearchTests(TestCase):
+    def test_autocomplete_uses_prefix_search_fields(self):
+        donor = make_donation('alice').donor
+        DonorProfile.objects.filter(pk=donor.pk).update(organization_name='Food Bank')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+        def autocomplete(term):
+            response = self.client.get('/admin/autocomplete/', {
+                'app_label': 'donations', 'model_name': 'donation', 'field_name': 'donor', 'term': term,
+            })
+            return [result['id'] for result in response.json()['results']]
+
+        self.assertEqual(autocomplete('foo'), [str(donor.pk)])
+        self.assertEqual(autocomplete('ali'), [str(donor.pk)])
+        # 'Pune' (city) and 'Bank' (not a prefix) only match the changelist search
+        self.assertEqual(autocomplete('Pune'), [])
+        self.assertEqual(autocomplete('Bank'), [])
+        response = self.client.get('/admin/donations/donorprofile/', {'q': 'Pune'})
+        self.assertEqual(list(response.context['cl'].result_list), [donor])
+
+
+class ExpiryTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.due = [make_donation(f'due{i}') for i in range(3)]
+        # update(): save() already marks donations past their deadline as expired
+        for i, donation in enumerate(self.due):
+            Donation.objects.filter(pk=donation.pk).update(pickup_deadline=self.now - timedelta(minutes=i + 1))
+        self.upcoming = make_donation('upcoming', pickup_deadline=self.now + timedelta(seconds=30))
+
+    def test_due_donations_expire_in_chunks(self):
+        sent = []
+        receiver = lambda sender, donation_ids, **kwargs: sent.append(sorted(donation_ids))
+        donations_expired.connect(receiver, sender=Donation)
+        self.addCleanup(donations_expired.disconnect, receiver, sender=Donation)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_due_donations(now=self.now, chunk_size=2), 3)
+
+        self.assertEqual(
+            set(Donation.objects.filter(status='expired').values_list('pk', flat=True)),
+            {d.pk for d in self.due},
+        )
+        self.assertEqual(Donation.objects.get(pk=self.upcoming.pk).status, 'available')
+        self.assertEqual(sorted(map(len, sent)), [1, 2])
+        self.assertEqual(sorted(sum(sent, [])), sorted(d.pk for d in self.due))
+        # notify_donors_of_expiry
+        self.assertEqual(Notification.objects.filter(message__contains='expired').count(), 3)
+        self.assertEqual(expire_due_donations(now=self.now), 0)
+
+    def test_sleep_until_the_next_deadline(self):
+        expire_due_donations(now=self.now)
+        self.assertAlmostEqual(seconds_until_next_expiry(600, now=self.now), 30)
+        self.assertEqual(seconds_until_next_expiry(10, now=self.now), 10)
+
+        Donation.objects.all().delete()
+        self.assertEqual(seconds_until_next_expiry(10, now=self.now), 10)
+
+    def test_sleep_has_a_floor_while_donations_stay_due(self):
+        # e.g. rows another sweeper holds locked (skip_locked)
+        self.assertEqual(seconds_until_next_expiry(600, now=self.now), MIN_SLEEP_SECONDS)
+
+
+class ReservationTests(TestCase):
+    def test_accept_reserves_donation(self):
+        donation = make_donation()
+        donation_request = make_requests(donation, 1)[0]
+
+        accept_request(donation_request)
+
+        donation.refresh_from_db()
+        donation_request.refresh_from_db()
+        self.assertEqual(donation.status, 'reserved')
+        self.assertEqual(donation_request.status, 'accepted')
+
+    def test_second_accept_is_rejected_and_rolled_back(self):
+        donation = make_donation()
+        first, second = make_requests(donation, 2)
+
+        accept_request(first)
+        with self.assertRaises(DonationUnavailable):
+            accept_request(second)
+
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'pending')
+
+    def test_requests_on_reserved_donation_are_refused(self):
+        donation = make_donation(status='reserved')
+        requester = User.objects.create_user('late', 'late@example.com')
+
+        with self.assertRaises(DonationUnavailable):
+            submit_request(DonationRequest(donation=donation, requester=requester))
+        self.assertFalse(DonationRequest.objects.filter(donation=donation).exists())
+
+
+class ReservationConcurrencyTests(TransactionTestCase):
+    def test_exactly_one_concurrent_accept_wins(self):
+        donation = make_donation()
+        requests = make_requests(donation, 12)
+
+        outcomes = run_concurrently(accept_request, [(r,) for r in requests])
+
+        winners = [o for o in outcomes if isinstance(o, DonationRequest)]
+        losers = [o for o in outcomes if isinstance(o, DonationUnavailable)]
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(len(losers), len(requests) - 1)
+        self.assertEqual(DonationRequest.objects.filter(donation=donation, status='accepted').count(), 1)
+        donation.refresh_from_db()
+        self.assertEqual(donation.status, 'reserved')
+
+
+class AllocationTests(TestCase):
+    def test_quantity_is_split_across_requests(self):
+        donation = make_donation(quantity=200)
+        first, second = make_requests(donation, 2, quantity=80)
+
+        allocate(first)
+        allocate(second)
+
+        donation.refresh_from_db()
+        self.assertEqual(donation.remaining_quantity, 40)
+        self.assertEqual(donation.status, 'available')
+        self.assertEqual(DonationAllocation.objects.filter(donation=donation).count(), 2)
+
+    def test_last_unit_reserves_donation(self):
+        donation = make_donation(quantity=5)
+        first, second = make_requests(donation, 2)
+
+        allocate(first, quantity=2)
+        allocate(second, quantity=3)
+
+        donation.refresh_from_db()
+        self.assertEqual(donation.remaining_quantity, 0)
+        self.assertEqual(donation.status, 'reserved')
+
+    def test_editing_quantity_keeps_remaining_consistent(self):
+        donation = make_donation(quantity=5)
+        allocate(make_requests(donation, 1)[0], quantity=2)
+        donation.refresh_from_db()
+
+        donation.quantity = 8
+        donation.save()
+        self.assertEqual((donation.remaining_quantity, donation.status), (6, 'available'))
+
+        donation.quantity = 2
+        donation.save()
+        self.assertEqual((donation.remaining_quantity, donation.status), (0, 'reserved'))
+
+        donation.quantity = 3
+        donation.save()
+        self.assertEqual((donation.remaining_quantity, donation.status), (1, 'available'))
+
+        donation.quantity = 1
+        with self.assertRaises(ValidationError):
+            donation.full_clean()
+        with self.assertLogs('donations.models', 'WARNING'):
+            donation.save()
+        donation.refresh_from_db()
+        self.assertEqual((donation.remaining_quantity, donation.status), (0, 'reserved'))
+
+    def test_backfill_matches_the_ledger_to_remaining_quantity(self):
+        backfill = import_module('donations.migrations.0006_donation_allocation_ledger').backfill_allocations
+        promised = make_donation('promised', quantity=5)
+        open_donation = make_donation('open', quantity=10)
+        requests = make_requests(promised, 2, quantity=4) + [DonationRequest.objects.create(
+            donation=open_donation, requester=User.objects.create_user('other'), requested_quantity=3,
+        )]
+        DonationRequest.objects.filter(pk__in=[r.pk for r in requests]).update(status='accepted')
+        DonationRequest.objects.create(donation=promised, requester=User.objects.create_user('late'), requested_quantity=1)
+        Donation.objects.filter(pk=promised.pk).update(status='reserved')
+
+        backfill(django_apps, None)
+
+        promised.refresh_from_db()
+        open_donation.refresh_from_db()
+        self.assertEqual(
+            list(promised.allocations.order_by('request_id').values_list('quantity', flat=True)), [4, 1],
+        )
+        self.assertEqual(promised.remaining_quantity, 0)
+        self.assertEqual(open_donation.remaining_quantity, 7)
+        for donation in (promised, open_donation):
+            donation.save()
+        promised.refresh_from_db()
+        self.assertEqual((promised.remaining_quantity, promised.status), (0, 'reserved'))
+        self.assertEqual(Donation.objects.get(pk=open_donation.pk).remaining_quantity, 7)
+
+    def test_remaining_quantity_is_read_only_in_the_admin(self):
+        request = RequestFactory().get('/')
+        self.assertIn('remaining_quantity', admin.site._registry[Donation].get_readonly_fields(request))
+
+    def test_over_allocation_is_refused(self):
+        donation = make_donation(quantity=5)
+        donation_request = make_requests(donation, 1, quantity=6)[0]
+
+        with self.assertRaises(DonationUnavailable):
+            allocate(donation_request)
+
+        donation.refresh_from_db()
+        self.assertEqual(donation.remaining_quantity, 5)
+        self.assertFalse(DonationAllocation.objects.exists())
+
+    def test_release_returns_units_and_reopens_donation(self):
+        donation = make_donation(quantity=3)
+        donation_request = make_requests(donation, 1, quantity=3)[0]
+        allocate(donation_request)
+
+        release_allocation(donation_request)
+
+        donation.refresh_from_db()
+        self.assertEqual(donation.remaining_quantity, 3)
+        self.assertEqual(donation.status, 'available')
+
+
+class AllocationConcurrencyTests(TransactionTestCase):
+    def test_concurrent_allocations_never_over_commit(self):
+        donation = make_donation(quantity=20)
+        requests = make_requests(donation, 16, quantity=3)
+
+        outcomes = run_concurrently(allocate, [(r,) for r in requests])
+
+        winners = [o for o in outcomes if isinstance(o, DonationAllocation)]
+        self.assertTrue(all(isinstance(o, (DonationAllocation, DonationUnavailable)) for o in outcomes))
+        self.assertEqual(len(winners), 6)
+
+        donation.refresh_from_db()
+        allocated = sum(a.quantity for a in DonationAllocation.objects.filter(donation=donation))
+        self.assertEqual(allocated, 18)
+        self.assertEqual(donation.remaining_quantity, donation.quantity - allocated)
+        self.assertEqual(DonationRequest.objects.filter(donation=donation, status='accepted').count(), 6)
+
+
+class CountingBackend(LocmemBackend):
+    """locmem backend that counts how many connections were opened"""
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+
+class FailingBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise SMTPException('451 try again later')
+
+
+class FlakyBackend(LocmemBackend):
+    """Sends one message, then the conversation breaks and the server goes away"""
+    opened = 0
+
+    def open(self):
+        FlakyBackend.opened += 1
+        if FlakyBackend.opened > 1:
+            raise ConnectionRefusedError('connection refused')
+        return True
+
+    def send_messages(self, email_messages):
+        if mail.outbox:
+            raise SMTPException('421 closing connection')
+        return super().send_messages(email_messages)
+
+
+def queue_messages(count, domain='example.com'):
+    for i in range(count):
+        message = mail.EmailMultiAlternatives('Hello', 'Text body', 'noreply@example.com', [f'user{i}@{domain}'])
+        message.attach_alternative('<p>HTML body</p>', 'text/html')
+        enqueue(message)
+
+
+class OutboxTests(TestCase):
+    def test_enqueue_does_not_send(self):
+        queue_messages(3)
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboxEmail.objects.filter(status='queued', domain='example.com').count(), 3)
+
+    @override_settings(EMAIL_BACKEND='donations.tests.CountingBackend')
+    def test_batch_is_sent_over_one_connection(self):
+        CountingBackend.opened = 0
+        queue_messages(5)
+
+        stats = drain_outbox()
+
+        self.assertEqual(stats['sent'], 5)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertEqual(OutboxEmail.objects.filter(status='sent').count(), 5)
+
+    @override_settings(EMAIL_BACKEND='donations.tests.FailingBackend',
+                       EMAIL_OUTBOX={'MAX_ATTEMPTS': 2, 'BACKOFF_SECONDS': 30})
+    def test_failures_back_off_then_dead_letter(self):
+        queue_messages(1)
+        now = timezone.now()
+
+        self.assertEqual(drain_outbox(now=now)['retried'], 1)
+        entry = OutboxEmail.objects.get()
+        self.assertEqual(entry.attempts, 1)
+        self.assertEqual(entry.next_attempt_at, now + timedelta(seconds=30))
+        self.assertIn('451', entry.last_error)
+
+        # Not due yet
+        self.assertEqual(drain_outbox(now=now)['retried'], 0)
+
+        self.assertEqual(drain_outbox(now=now + timedelta(seconds=31))['dead'], 1)
+        self.assertEqual(OutboxEmail.objects.get().status, 'dead')
+
+    @override_settings(EMAIL_BACKEND='donations.tests.FlakyBackend')
+    def test_failed_reconnect_keeps_delivered_messages_sent(self):
+        FlakyBackend.opened = 0
+        queue_messages(4)
+
+        stats = drain_outbox()
+
+        self.assertEqual((stats['sent'], stats['retried']), (1, 3))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutboxEmail.objects.get(status='sent').to, mail.outbox[0].to[0])
+        self.assertEqual(OutboxEmail.objects.filter(status='queued', attempts=1).count(), 3)
+        self.assertFalse(OutboxEmail.objects.filter(status='sending').exists())
+
+    def test_worker_loop_releases_stuck_messages_every_round(self):
+        queue_messages(1)
+        OutboxEmail.objects.update(status='sending', next_attempt_at=timezone.now() - timedelta(hours=1))
+        rounds = []
+
+        def drain(batch_size=None):
+            rounds.append(OutboxEmail.objects.get().status)
+            if len(rounds) == 2:
+                raise KeyboardInterrupt
+            return {'sent': 0, 'retried': 0, 'dead': 0, 'deferred': 0}
+
+        with mock.patch('donations.management.commands.send_queued_mail.drain_outbox', drain), \
+                mock.patch('donations.management.commands.send_queued_mail.time.sleep') as sleep:
+            sleep.side_effect = lambda seconds: OutboxEmail.objects.update(
+                status='sending', next_attempt_at=timezone.now() - timedelta(hours=1),
+            )
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('send_queued_mail', '--loop', stdout=StringIO())
+
+        self.assertEqual(rounds, ['queued', 'queued'])
+
+    @override_settings(EMAIL_OUTBOX={'DOMAIN_RATE_LIMITS': {'example.com': 2}})
+    def test_domain_rate_limit_defers_excess(self):
+        queue_messages(5)
+        queue_messages(1, domain='other.org')
+
+        stats = drain_outbox()
+
+        self.assertEqual(stats['sent'], 3)
+        self.assertEqual(stats['deferred'], 3)
+        deferred = OutboxEmail.objects.filter(status='queued')
+        self.assertTrue(all(e.attempts == 0 for e in deferred))
+
+
+@override_settings(EMAIL_DIGEST_WINDOW_MINUTES=60)
+class DigestTests(TestCase):
+    def setUp(self):
+        self.donation = make_donation(quantity=5)
+        self.donor = self.donation.donor.user
+        self.donor.userprofile.email_delivery = 'digest'
+        self.donor.userprofile.save()
+
+    def test_immediate_delivery_is_unchanged(self):
+        self.donor.userprofile.email_delivery = 'immediate'
+        self.donor.userprofile.save()
+        request, = make_requests(self.donation, 1)
+
+        send_donation_request_email(request)
+
+        self.assertEqual(OutboxEmail.objects.filter(to=self.donor.email).count(), 1)
+        self.assertFalse(DigestEntry.objects.exists())
+
+    def test_requests_are_held_until_window_passes(self):
+        for request in make_requests(self.donation, 3):
+            send_donation_request_email(request)
+
+        self.assertEqual(DigestEntry.objects.filter(user=self.donor).count(), 3)
+        self.assertFalse(OutboxEmail.objects.exists())
+        self.assertEqual(send_due_digests(), 0)
+
+        self.assertEqual(send_due_digests(now=timezone.now() + timedelta(minutes=61)), 1)
+        digest = OutboxEmail.objects.get()
+        self.assertEqual(digest.to, self.donor.email)
+        self.assertIn('3 new donation requests', digest.subject)
+        for i in range(3):
+            self.assertIn(f'requester{i}', digest.body)
+            self.assertIn(f'requester{i}', digest.html_body)
+        self.assertFalse(DigestEntry.objects.exists())
+
+
+class MailBenchmarkTests(TestCase):
+    def test_every_path_delivers_to_sink(self):
+        templates = email_templates()
+        with SMTPSink() as sink:
+            rows = {row['path']: row for row in benchmark_delivery(sink, templates, 1, sample_context())}
+
+        for row in rows.values():
+            self.assertEqual(row['delivered'], len(templates))
+        self.assertEqual(rows['sync']['connections'], len(templates))
+        self.assertEqual(rows['batched']['connections'], 1)
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_outbox_path_leaves_the_real_queue_alone(self):
+        enqueue(mail.EmailMultiAlternatives('Real', 'body', 'from@example.com', ['someone@example.com']))
+        queued = OutboxEmail.objects.values_list('status', 'attempts', 'next_attempt_at').get()
+        with SMTPSink() as sink:
+            rows = {row['path']: row for row in benchmark_delivery(sink, email_templates(), 1, sample_context())}
+
+        self.assertEqual(rows['outbox']['delivered'], len(email_templates()))
+        self.assertEqual(OutboxEmail.objects.values_list('status', 'attempts', 'next_attempt_at').get(), queued)
+
+
+class EmailRendererTests(TestCase):
+    def setUp(self):
+        self.renderer = EmailRenderer()
+        self.context = sample_context()
+
+    def test_text_part_comes_from_txt_template(self):
+        html, text = self.renderer.render('emails/donation_request_notification', self.context)
+
+        self.assertIn('<html>', html)
+        self.assertIn('REQUESTER INFORMATION', text)
+        self.assertNotIn('&quot;', text)
+
+    def test_falls_back_to_stripped_html(self):
+        html, text = self.renderer.render('emails/welcome_email', self.context)
+
+        self.assertNotIn('<', text)
+
+    def test_batch_shares_context(self):
+        recipients = [{'donor': User(username=f'donor{i}')} for i in range(3)]
+
+        results = self.renderer.render_batch('emails/donation_request_digest', self.context, recipients)
+
+        self.assertEqual([f'donor{i}' in text for i, (_, text) in enumerate(results)], [True] * 3)
+        self.assertIn(settings.SITE_URL, results[0][0])
+
+
+def make_jpeg(width=1200, height=800):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'orange').save(buffer, format='JPEG')
+    return SimpleUploadedFile('meal.jpg', buffer.getvalue(), content_type='image/jpeg')
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, IMAGE_DERIVATIVE_WIDTHS=(240, 480, 1600))
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_derivatives_are_generated_and_used_in_srcset(self):
+        donation = make_donation(image=make_jpeg())
+        self.assertEqual(donation.jpeg_srcset, '')
+
+        self.assertEqual(process_donations(Donation.objects.all()), (1, 0))
+
+        donation.refresh_from_db()
+        self.assertEqual(sorted(donation.image_variants['webp']), ['240', '480'])
+        with donation.image.storage.open(donation.image_variants['jpeg']['480']) as f:
+            self.assertEqual(Image.open(f).size, (480, 320))
+        html = render_to_string('donations/partials/donation_picture.html', {'donation': donation, 'sizes': '100vw'})
+        self.assertIn('image/webp', html)
+        self.assertIn('.webp 240w', html)
+
+    def test_replaced_image_falls_back_to_original(self):
+        donation = make_donation(image=make_jpeg())
+        process_donations(Donation.objects.all())
+        donation.refresh_from_db()
+
+        donation.image = make_jpeg(300, 300)
+        donation.save()
+
+        html = render_to_string('donations/partials/donation_picture.html', {'donation': donation, 'sizes': '100vw'})
+        self.assertNotIn('<picture>', html)
+        self.assertEqual(process_donations(Donation.objects.all()), (1, 0))
+
+    def test_unreadable_image_is_logged_and_fails_the_command(self):
+        make_donation(image=SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg'))
+
+        with self.assertLogs('donations.images', 'ERROR') as logs:
+            self.assertEqual(process_donations(Donation.objects.all()), (0, 1))
+        self.assertIn('Traceback', logs.output[0])
+        with self.assertLogs('donations.images', 'ERROR'), self.assertRaises(CommandError):
+            call_command('generate_image_derivatives', stdout=StringIO())
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_identical_uploads_share_one_file(self):
+        first = make_donation('donor1', image=make_jpeg())
+        second = make_donation('donor2', image=make_jpeg())
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.storage.is_immutable(first.image.name))
+        self.assertEqual(StoredBlob.objects.get(name=first.image.name).refcount, 2)
+
+    def test_file_is_deleted_with_last_reference(self):
+        first = make_donation('donor1', image=make_jpeg())
+        second = make_donation('donor2', image=make_jpeg())
+        storage, name = first.image.storage, first.image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.image = make_jpeg(300, 300)
+            second.save()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_SENDFILE_BACKEND='')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_byte_range_and_conditional_get(self):
+        donation = make_donation(image=make_jpeg())
+        url = donation.image.url
+
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(len(b''.join(response.streaming_content)), 10)
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_verification_documents_are_private(self):
+        owner = User.objects.create_user('owner')
+        other = User.objects.create_user('other')
+        request = VerificationRequest.objects.create(
+            user=owner, verification_type='donor',
+            document=SimpleUploadedFile('id.pdf', b'%PDF-1.4 test', content_type='application/pdf'),
+        )
+        url = request.document.url
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(owner)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+    @override_settings(MEDIA_SENDFILE_BACKEND='nginx')
+    def test_nginx_gets_accel_redirect(self):
+        donation = make_donation(image=make_jpeg())
+
+        response = self.client.get(donation.image.url)
+
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{donation.image.name}')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(UPLOAD_LIMITS={'document': {'max_size': 1024, 'types': ['application/pdf']}})
+class UploadLimitTests(TestCase):
+    def upload(self, content, name='id.pdf', form_class=DonorVerificationForm):
+        request = RequestFactory().post('/', {'verification_document': SimpleUploadedFile(name, content)})
+        if form_class:
+            request.upload_limits = form_class.field_limits()
+        return request.FILES
+
+    def test_valid_document_is_streamed_to_disk(self):
+        files = self.upload(b'%PDF-1.4 ' + b'x' * 500)
+
+        document = files['verification_document']
+        self.assertEqual(document.sniffed_type, 'application/pdf')
+        self.assertTrue(document.temporary_file_path())
+        self.assertTrue(DonorVerificationForm(files=files).is_valid())
+
+    def test_oversized_document_is_rejected(self):
+        files = self.upload(b'%PDF-1.4 ' + b'x' * 5000)
+
+        self.assertIsInstance(files['verification_document'], RejectedUpload)
+        form = DonorVerificationForm(files=files)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['verification_document'], ['File is too large. The maximum size is 1.0\xa0KB.'])
+
+    def test_wrong_magic_bytes_are_rejected(self):
+        form = DonorVerificationForm(files=self.upload(b'MZ\x90\x00 not a pdf', name='id.pdf'))
+
+        self.assertFalse(form.is_valid())
+        self.assertIn('Unsupported file type', form.errors['verification_document'][0])
+
+    def test_limits_belong_to_the_form_not_the_field_name(self):
+        files = self.upload(b'%PDF-1.4 ' + b'x' * 5000, form_class=None)
+
+        document = files['verification_document']
+        self.assertNotIsInstance(document, RejectedUpload)
+        self.assertEqual(document.sniffed_type, 'application/pdf')
+        form = DonorVerificationForm(files=files)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['verification_document'], ['File is too large. The maximum size is 1.0\xa0KB.'])
+
+    @override_settings(MAX_UPLOAD_REQUEST_SIZE=100)
+    def test_huge_request_is_reported_on_the_field(self):
+        files = self.upload(b'%PDF-1.4 ' + b'x' * 500)
+
+        self.assertIsInstance(files['verification_document'], RejectedUpload)
+        form = DonorVerificationForm(files=files)
+        self.assertFalse(form.is_valid())
+        self.assertIn('Upload is too large', form.errors['verification_document'][0])
+
+    def test_admin_form_reports_rejected_upload(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin_user)
+
+        response = self.client.post('/admin/donations/verificationrequest/add/', {
+            'user': admin_user.pk,
+            'verification_type': 'donor',
+            'status': 'pending',
+            'document': SimpleUploadedFile('id.pdf', b'MZ\x90\x00 not a pdf'),
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Unsupported file type')
+        self.assertFalse(VerificationRequest.objects.exists())
+
+
+class MediaGarbageCollectionTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        override = override_settings(MEDIA_ROOT=self.media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def write(self, name, age=0):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 100)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_only_old_unreferenced_files_are_removed(self):
+        donation = make_donation(image=make_jpeg())
+        os.utime(donation.image.path, (0, 0))
+        orphan = self.write('verification_docs/old.pdf', age=7 * 86400)
+        recent = self.write('verification_docs/new.pdf')
+
+        stats = collect_garbage(batch_size=1)
+
+        self.assertEqual((stats['removed'], stats['bytes']), (1, 100))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(recent))
+        self.assertTrue(os.path.exists(donation.image.path))
+
+    def test_quarantine_keeps_relative_path(self):
+        self.write('donation_images/gone.jpg', age=7 * 86400)
+        quarantine = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, quarantine)
+
+        collect_garbage(quarantine=quarantine)
+
+        self.assertTrue(os.path.exists(os.path.join(quarantine, 'donation_images', 'gone.jpg')))
+        self.assertEqual(collect_garbage(quarantine=quarantine)['removed'], 0)
+
+    def test_quarantine_inside_media_root_is_refused(self):
+        orphan = self.write('verification_docs/old.pdf', age=7 * 86400)
+
+        with self.assertRaises(CommandError):
+            call_command('gc_media', quarantine=os.path.join(self.media_root, 'quarantine'), stdout=StringIO())
+        self.assertTrue(os.path.exists(orphan))
+
+    def test_quarantined_verification_documents_stay_private(self):
+        # Left inside MEDIA_ROOT by an older run
+        self.write('quarantine/verification_docs/old.pdf')
+        self.client.force_login(User.objects.create_user('stranger'))
+
+        self.assertEqual(self.client.get('/media/quarantine/verification_docs/old.pdf').status_code, 404)
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        self.assertEqual(self.client.get('/media/quarantine/verification_docs/old.pdf').status_code, 200)
+
+
+def make_help_seeker(username='seeker'):
+    user = User.objects.create_user(username, f'{username}@example.com')
+    seeker_type, _ = HelpSeekerType.objects.get_or_create(name='NGO')
+    return HelpSeeker.objects.create(
+        user=user, organization_name=f'{username} shelter', seeker_type=seeker_type,
+        description='Shelter', phone='1', address='Street', city='Pune', state='MH',
+        pincode='411001', latitude=18.5, longitude=73.8,
+    )
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.seeker = make_help_seeker()
+        for i in range(3):
+            donation = make_donation(f'donor{i}')
+            donation.preferred_help_seekers.add(self.seeker.seeker_type)
+            DonationMatch.objects.create(donation=donation, help_seeker=self.seeker, match_score=80)
+            HelpRequest.objects.create(
+                help_seeker=self.seeker, category=donation.category, title='Rice',
+                description='Rice', quantity_needed=10,
+            )
+        self.client.force_login(self.seeker.user)
+
+    def test_list_query_counts_do_not_grow_with_rows(self):
+        # session + user, then the page (plus one prefetch for donations)
+        for url, queries in [
+            ('/api/donations/', 4),
+            ('/api/help-seekers/', 3),
+            ('/api/help-requests/', 3),
+            ('/api/donation-matches/', 3),
+        ]:
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['results']), 3 if 'seekers' not in url else 1)
+
+    def test_sparse_fieldset_skips_unneeded_joins(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/donations/?fields=title,status')
+
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'title', 'status'})
+
+    def test_cursor_pagination(self):
+        response = self.client.get('/api/donations/?page_size=2').json()
+
+        self.assertEqual(len(response['results']), 2)
+        self.assertIn('cursor=', response['next'])
+        self.assertEqual(len(self.client.get(response['next']).json()['results']), 1)
+
+    def test_detail_etag_and_conditional_get(self):
+        donation = Donation.objects.first()
+        url = f'/api/donations/{donation.pk}/'
+
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        donation.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_matches_are_private(self):
+        self.client.force_login(User.objects.create_user('stranger'))
+
+        self.assertEqual(self.client.get('/api/donation-matches/').json()['results'], [])
+        self.assertEqual(self.client.get('/api/donations/').status_code, 200)
+
+    def test_requires_authentication(self):
+        self.client.logout()
+
+        self.assertEqual(self.client.get('/api/donations/').status_code, 403)
+
+    def test_only_verified_help_seekers_are_listed(self):
+        verified = make_help_seeker('verified')
+        HelpSeeker.objects.filter(pk=verified.pk).update(verification_status='verified')
+        self.client.force_login(User.objects.create_user('stranger'))
+
+        ids = [seeker['id'] for seeker in self.client.get('/api/help-seekers/').json()['results']]
+        self.assertEqual(ids, [verified.pk])
+        self.assertEqual(self.client.get(f'/api/help-seekers/{self.seeker.pk}/').status_code, 404)
+
+        self.client.force_login(self.seeker.user)
+        self.assertEqual(self.client.get(f'/api/help-seekers/{self.seeker.pk}/').status_code, 200)
+
+
+class DeltaSyncTests(TestCase):
+    def setUp(self):
+        self.seeker = make_help_seeker()
+        self.donations = [make_donation(f'donor{i}') for i in range(3)]
+        self.match = DonationMatch.objects.create(
+            donation=self.donations[0], help_seeker=self.seeker, match_score=80,
+        )
+        Notification.objects.create(user=self.seeker.user, message='Matched')
+
+    def sync(self, token=None, limit=100, user=None, seconds=5):
+        # Past the settle window so rows created a moment ago are included
+        now = timezone.now() + timedelta(seconds=seconds)
+        return changes_since(user or self.seeker.user, token, limit, now=now)
+
+    def later(self):
+        """Stamp the next changes after the window the previous sync covered"""
+        return mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(seconds=10))
+
+    def test_full_sync_in_batches_then_only_changes(self):
+        first = self.sync(limit=2)
+        self.assertTrue(first['has_more'])
+        self.assertEqual(len(first['donations']), 2)
+
+        second = self.sync(first['next'], limit=2)
+        self.assertFalse(second['has_more'])
+        self.assertEqual([d['id'] for d in second['donations']], [self.donations[2].pk])
+        self.assertEqual(second['donation_matches'], [])
+        self.assertEqual(second['notifications'], [])
+
+        with self.later():
+            self.match.status = 'accepted'
+            self.match.save()
+        third = self.sync(second['next'], seconds=20)
+        self.assertEqual(third['donations'], [])
+        self.assertEqual([(m['id'], m['status']) for m in third['donation_matches']], [(self.match.pk, 'accepted')])
+
+    def test_deletes_and_expiries_leave_tombstones(self):
+        token = self.sync()['next']
+        stranger = make_help_seeker('stranger')
+        match_pk, deleted_pk, expired_pk = self.match.pk, self.donations[1].pk, self.donations[2].pk
+        Donation.objects.filter(pk=expired_pk).update(pickup_deadline=timezone.now() - timedelta(hours=1))
+        with self.later():
+            self.match.delete()
+            self.donations[1].delete()
+            with self.captureOnCommitCallbacks(execute=True):
+                expire_due_donations()
+
+        deleted = {(row['type'], row['id'], row['reason']) for row in self.sync(token, seconds=20)['deleted']}
+        self.assertEqual(deleted, {
+            ('donationmatch', match_pk, 'deleted'),
+            ('donation', deleted_pk, 'deleted'),
+            ('donation', expired_pk, 'expired'),
+        })
+        stranger_deleted = self.sync(token, user=stranger.user, seconds=20)['deleted']
+        self.assertNotIn('donationmatch', {row['type'] for row in stranger_deleted})
+
+    def test_deleting_an_account_leaves_no_tombstones_for_it(self):
+        self.seeker.user.delete()
+
+        self.assertFalse(Tombstone.objects.filter(model_name='notification').exists())
+
+    def test_deleting_accounts_through_a_queryset_leaves_no_tombstones_for_them(self):
+        User.objects.filter(pk=self.seeker.user.pk).delete()
+
+        self.assertFalse(Tombstone.objects.filter(model_name='notification').exists())
+        # The donor keeps the account, so the match is still dropped on their side
+        self.assertEqual(
+            list(Tombstone.objects.filter(model_name='donationmatch').values_list('user_id', flat=True)),
+            [self.donations[0].donor.user_id],
+        )
+
+    def test_deleting_profiles_with_their_users_leaves_no_tombstones_for_them(self):
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+        delete_profiles('seeker', [self.seeker.pk], admin_user, delete_users=True)
+
+        self.assertFalse(User.objects.filter(pk=self.seeker.user_id).exists())
+        self.assertFalse(Tombstone.objects.filter(user_id=self.seeker.user_id).exists())
+        self.assertTrue(Tombstone.objects.filter(model_name='donationmatch', user_id=self.donations[0].donor.user_id).exists())
+
+    def test_old_tombstones_are_pruned_and_stale_tokens_resync(self):
+        self.donations[1].delete()
+        Tombstone.objects.update(created_at=timezone.now() - TOMBSTONE_RETENTION - timedelta(days=1))
+        with mock.patch('donations.sync.timezone.now', return_value=timezone.now() - TOMBSTONE_RETENTION):
+            stale = self.sync()['next']
+
+        out = StringIO()
+        call_command('expire_donations', stdout=out)
+        self.assertIn('Pruned 1 tombstones', out.getvalue())
+        self.assertFalse(Tombstone.objects.exists())
+
+        changes = self.sync(stale)
+        self.assertTrue(changes['reset'])
+        self.assertEqual(len(changes['donations']), 2)
+        self.assertFalse(self.sync(changes['next'])['reset'])
+
+    def test_changes_endpoint(self):
+        self.client.force_login(self.seeker.user)
+
+        response = self.client.get('/api/changes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('next', response.json())
+        self.assertEqual(self.client.get('/api/changes/?since=bogus').status_code, 400)
+
+
+IMPORT_CSV = """category,title,description,quantity,food_type,pickup_address,pickup_deadline,preferred_help_seekers
+Food,Biryani trays,Banquet leftovers,12,veg,"FC Road, Pune, MH",2030-01-01 22:00,NGO; Orphanage
+food,Rotis,Fresh,40,veg,"FC Road, Pune, MH",2020-01-01 22:00,
+Furniture,Chairs,Old chairs,4,,"Camp, Pune, MH",2030-01-01 22:00,
+Food,Dal,Fresh,0,veg,"Camp, Pune, MH",2030-01-01 22:00,Spaceport
+"""
+
+
+class DonationImportTests(TestCase):
+    def setUp(self):
+        self.donor = make_donation('hotel').donor
+        for name in ('NGO', 'Orphanage'):
+            HelpSeekerType.objects.get_or_create(name=name)
+
+    def test_csv_rows_are_validated_and_bulk_created(self):
+        rows = read_rows(BytesIO(IMPORT_CSV.encode()), 'csv')
+        with self.assertNumQueries(6):
+            # two lookup maps, then one chunk: savepoint, donations, M2M rows, release
+            result = import_donations(self.donor, rows)
+
+        self.assertEqual((result['rows'], result['created'], result['invalid']), (4, 2, 2))
+        self.assertEqual([n for n, _ in result['errors']], [3, 4])
+        self.assertIn('Unknown category "Furniture"', result['errors'][0][1])
+        self.assertIn('Spaceport', result['errors'][1][1])
+
+        biryani = Donation.objects.get(title='Biryani trays')
+        self.assertEqual(biryani.remaining_quantity, 12)
+        self.assertEqual((biryani.pickup_city, biryani.pickup_state), ('Pune', 'MH'))
+        self.assertEqual(biryani.preferred_help_seekers.count(), 2)
+        self.assertEqual(Donation.objects.get(title='Rotis').status, 'expired')
+        self.assertEqual(len(result['donation_ids']), 2)
+
+    def test_json_array_is_read_incrementally(self):
+        text = '[{"title": "a, [b]"}, {"title": "c"} ,\n {"n": [1, 2]}]'
+
+        self.assertEqual(
+            list(iter_json_array(StringIO(text), chunk_size=4)),
+            [{'title': 'a, [b]'}, {'title': 'c'}, {'n': [1, 2]}],
+        )
+
+    def test_bad_file_stops_the_import(self):
+        rows = read_rows(BytesIO(b'{"category": "Food"}\nnot json\n'), 'jsonl')
+        result = import_donations(self.donor, rows, dry_run=True)
+
+        self.assertEqual(result['rows'], 1)
+        self.assertIn('line 2', result['aborted'])
+
+    def test_undecodable_file_stops_the_import(self):
+        rows = read_rows(BytesIO(IMPORT_CSV.replace('Banquet', 'Banqu\u00e9t').encode('latin-1')), 'csv')
+        result = import_donations(self.donor, rows)
+
+        self.assertIn('UTF-8', result['aborted'])
+        self.assertEqual(result['created'], 0)
+
+    def test_non_utf8_upload_is_reported(self):
+        self.client.force_login(self.donor.user)
+        upload = SimpleUploadedFile('tonight.csv', IMPORT_CSV.encode('utf-16'), content_type='text/csv')
+
+        response = self.client.post('/donations/import/', {'file': upload})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'not UTF-8 encoded')
+
+    def test_geocoding_once_per_address(self):
+        result = import_donations(self.donor, read_rows(BytesIO(IMPORT_CSV.encode()), 'csv'))
+        other = make_donation('other', pickup_address='Camp, Pune, MH', latitude=18.51, longitude=73.88)
+        Donation.objects.filter(title='Rotis').update(pickup_address='Camp, Pune, MH')
+        calls = []
+
+        updated = geocode_donations(
+            result['donation_ids'], geocode=lambda address: calls.append(address) or (18.53, 73.85), delay=0,
+        )
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(calls, ['FC Road, Pune, MH'])
+        self.assertEqual(Donation.objects.get(title='Rotis').latitude, other.latitude)
+
+    def test_geocoding_failures_are_logged(self):
+        result = import_donations(self.donor, read_rows(BytesIO(IMPORT_CSV.encode()), 'csv'))
+
+        with self.assertLogs('donations.importer', 'ERROR') as logs:
+            updated = geocode_donations(result['donation_ids'], geocode=mock.Mock(side_effect=OSError('timeout')), delay=0)
+
+        self.assertEqual(updated, 0)
+        self.assertIn('FC Road, Pune, MH', logs.output[0])
+
+    def test_import_view_queues_geocoding(self):
+        self.client.force_login(self.donor.user)
+        upload = SimpleUploadedFile('tonight.csv', IMPORT_CSV.encode(), content_type='text/csv')
+
+        response = self.client.post('/donations/import/', {'file': upload})
+
+        self.assertContains(response, 'Spaceport')
+        self.assertEqual(Donation.objects.filter(donor=self.donor).count(), 3)
+        job = BackgroundJob.objects.get(kind='geocode_donations')
+        self.assertEqual(job.total, 2)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.donations = [make_donation(f'donor{i}', title=f'Meals {i}') for i in range(3)]
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+
+    def test_csv_download_streams(self):
+        response = self.client.get('/exports/donations/')
+
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="donations-', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'title', 'category'])
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['Meals 0', 'Meals 1', 'Meals 2'])
+
+    def test_csv_cells_cannot_become_formulas(self):
+        titles = ['=HYPERLINK("http://evil.example")', '+1+2', '-3', '@SUM(A1)', '\tTab', '\rReturn']
+        for donation, title in zip(self.donations, titles):
+            Donation.objects.filter(pk=donation.pk).update(title=title)
+        for i, title in enumerate(titles[3:]):
+            make_donation(f'extra{i}', title=title)
+
+        response = self.client.get('/exports/donations/')
+
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['title'] for row in rows], ["'" + title for title in titles])
+        self.assertEqual(rows[0]['quantity'], '1')
+        # JSON keeps the values as they are
+        response = self.client.get('/exports/donations/?format=jsonl')
+        first = json.loads(b''.join(response.streaming_content).splitlines()[0])
+        self.assertEqual(first['title'], titles[0])
+
+    def test_gzip_jsonl_download(self):
+        response = self.client.get('/exports/donations/?format=jsonl&gzip=1')
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        rows = [json.loads(line) for line in gzip.decompress(b''.join(response.streaming_content)).splitlines()]
+        self.assertEqual([row['donor'] for row in rows], ['donor0', 'donor1', 'donor2'])
+
+    def test_staff_only(self):
+        self.client.force_login(self.donations[0].donor.user)
+
+        self.assertEqual(self.client.get('/exports/donations/').status_code, 302)
+        self.client.force_login(User.objects.get(username='ops'))
+        self.assertEqual(self.client.get('/exports/users/').status_code, 404)
+
+    def test_command_writes_file(self):
+        DonationRequest.objects.create(donation=self.donations[0], requester=self.donations[1].donor.user)
+        path = os.path.join(tempfile.mkdtemp(), 'requests.csv.gz')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+
+        call_command('export_data', 'donation-requests', '--gzip', '--output', path, stdout=StringIO())
+
+        with gzip.open(path, 'rt') as f:
+            self.assertEqual(len(f.read().splitlines()), 2)
+
+
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        self.donation = make_donation()
+        self.seeker = make_help_seeker()
+        self.client.force_login(self.seeker.user)
+        self.url = f'/donations/{self.donation.pk}/'
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_unchanged_page_is_not_rendered_again(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
+        # session, user, donation, own request, request count, notifications; no view body
+        with self.assertNumQueries(6):
+            self.assertEqual(self.revalidate(self.url, response).status_code, 304)
+
+    def test_changes_to_rows_requests_and_notifications_invalidate(self):
+        response = self.client.get(self.url)
+        self.donation.save()
+        self.assertEqual(self.revalidate(self.url, response).status_code, 200)
+
+        response = self.client.get(self.url)
+        DonationRequest.objects.create(donation=self.donation, requester=self.seeker.user)
+        self.assertEqual(self.revalidate(self.url, response).status_code, 200)
+
+        response = self.client.get(self.url)
+        Notification.objects.create(user=self.seeker.user, message='Hello')
+        self.assertEqual(self.revalidate(self.url, response).status_code, 200)
+
+    def test_pending_messages_are_always_shown(self):
+        response = self.client.get(self.url)
+        self.client.post(self.url, {'requested_quantity': 1, 'message': 'Please'})
+
+        self.assertContains(self.revalidate(self.url, response), 'Donation request sent successfully!')
+
+    def test_match_and_dashboard_pages(self):
+        match = DonationMatch.objects.create(donation=self.donation, help_seeker=self.seeker, match_score=80)
+        for url in [f'/donation-matches/{match.pk}/', '/help-seeker-dashboard/']:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(self.revalidate(url, response).status_code, 304)
+                HelpRequest.objects.create(
+                    help_seeker=self.seeker, category=self.donation.category, title='Rice',
+                    description='Rice', quantity_needed=10,
+                )
+                match.save()
+                self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+        self.client.force_login(User.objects.create_user('stranger'))
+        self.assertEqual(self.client.get(f'/donation-matches/{match.pk}/').status_code, 302)
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """A second SQLite file stands in for a replica that lags behind the primary"""
+
+    def setUp(self):
+        self.old = make_donation('olddonor', title='Old meals')
+        # "Replicate" the primary as it is now
+        replica_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, replica_dir)
+        replica_name = os.path.join(replica_dir, 'replica.sqlite3')
+        primary = sqlite3.connect(connection.settings_dict['NAME'])
+        replica = sqlite3.connect(replica_name)
+        primary.backup(replica)
+        primary.close()
+        replica.close()
+
+        connections.settings['replica'] = {**connections.settings['default'], 'NAME': replica_name}
+        self.addCleanup(connections.settings.pop, 'replica')
+        self.addCleanup(connections.__delitem__, 'replica')
+        self.addCleanup(lambda: connections['replica'].close())
+        # Connected here, the test case's database isolation checks leave it alone
+        connections['replica'].connect()
+
+        self.new = make_donation('newdonor', title='New meals')
+
+    def titles(self, response):
+        return {d.title for d in response.context['donations']}
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        self.assertEqual(Donation.objects.all().db, 'replica')
+        self.assertEqual(set(Donation.objects.values_list('title', flat=True)), {'Old meals'})
+        with transaction.atomic():
+            self.assertEqual(Donation.objects.count(), 2)
+        self.assertEqual(PrimaryReplicaRouter().db_for_write(Donation), 'default')
+
+    def test_session_reads_from_primary_after_a_write(self):
+        self.client.force_login(self.new.donor.user)
+        self.assertEqual(self.titles(self.client.get('/donations/')), {'Old meals'})
+
+        self.client.post(f'/donations/{self.old.pk}/', {'requested_quantity': 1})
+
+        self.assertEqual(self.titles(self.client.get('/donations/')), {'Old meals', 'New meals'})
+        self.assertTrue(DonationRequest.objects.using('default').filter(requester=self.new.donor.user).exists())
+
+    def test_cached_values_are_computed_from_the_primary(self):
+        caches['default'].delete('donation-count')
+
+        self.assertEqual(memoize('donation-count', Donation.objects.count, 60), 2)
+        caches['default'].delete('donation-count')
+
+    def test_expiry_sweeper_reads_the_next_deadline_from_the_primary(self):
+        Donation.objects.filter(pk=self.new.pk).update(pickup_deadline=timezone.now() + timedelta(seconds=30))
+        self.assertAlmostEqual(seconds_until_next_expiry(600), 30, delta=5)
+
+
+# Not a django TestCase: it blocks the benchmark's scratch database aliases
+class SQLiteTuningTests(unittest.TestCase):
+    def test_tuned_settings_commit_every_concurrent_write(self):
+        results = benchmark_sqlite(threads=4, transactions=10, readers=1)
+
+        self.assertEqual(results['defaults']['journal_mode'], 'delete')
+        tuned = results['tuned']
+        self.assertEqual(tuned['journal_mode'], 'wal')
+        self.assertEqual((tuned['committed'], tuned['failed'], tuned['lost_updates']), (40, 0, 0))
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+
+    def test_local_tier_answers_until_its_timeout(self):
+        self.cache.set('key', {'value': 1}, 60)
+        caches['shared'].delete('key')
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+
+        with mock.patch('donations.cache.time.monotonic', return_value=time.monotonic() + 10):
+            self.assertIsNone(self.cache.get('key'))
+
+    def test_delete_clears_both_tiers(self):
+        self.cache.set('key', 1, 60)
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertIsNone(caches['shared'].get('key'))
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'payload'
+
+        outcomes = run_concurrently(memoize, [('slow', compute, 60)] * 6)
+
+        self.assertEqual(outcomes, ['payload'] * 6)
+        self.assertEqual(len(calls), 1)
+
+    def test_slow_values_refresh_before_they_expire(self):
+        # Expires in 1 s, took 10 s to compute: refreshed early on most reads
+        self.cache.set('key', ('old', 10.0, time.time() + 1), 60)
+        with mock.patch('donations.cache.random.random', return_value=0.5):
+            self.assertEqual(memoize('key', lambda: 'new', 60), 'new')
+        self.cache.set('key', ('old', 0.001, time.time() + 30), 60)
+        self.assertEqual(memoize('key', lambda: 'new', 60), 'old')
+
+    def test_home_statistics_are_cached_until_a_donation_is_added(self):
+        make_donation('first')
+        self.assertEqual(self.client.get('/').context['total_donations'], 1)
+        with self.assertNumQueries(3):
+            # categories, seeker types, recent donations
+            self.client.get('/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            make_donation('second')
+        self.assertIsNone(self.cache.get(HOME_STATS_KEY))
+        self.assertEqual(self.client.get('/').context['total_donations'], 2)
+
+    def test_bulk_updates_invalidate_cached_values(self):
+        seeker = make_help_seeker()
+        admin_user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin_user)
+
+        def fill():
+            self.cache.set(HOME_STATS_KEY, 'stale', 60)
+            self.cache.set(HELP_SEEKER_MAP_KEY, 'stale', 60)
+
+        fill()
+        with self.captureOnCommitCallbacks(execute=True):
+            verify_profiles('seeker', [seeker.pk], admin_user)
+        self.assertIsNone(self.cache.get(HOME_STATS_KEY))
+        self.assertIsNone(self.cache.get(HELP_SEEKER_MAP_KEY))
+
+        for action in ('reject_seekers', 'mark_urgent'):
+            fill()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post('/admin/donations/helpseeker/', {'action': action, '_selected_action': [seeker.pk]})
+            self.assertIsNone(self.cache.get(HELP_SEEKER_MAP_KEY), action)
+
+
+class QueryInstrumentationTests(TestCase):
+    def test_fingerprint_ignores_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND name = 'y' LIMIT 21"),
+        )
+
+    def test_repeated_queries_are_logged_with_their_origin(self):
+        for i in range(6):
+            make_donation(f'donor{i}')
+
+        with self.assertLogs('donations.queries', 'WARNING') as logs:
+            self.client.get('/donations/')
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['path'], record['view'], record['status']), ('/donations/', 'donation_list', 200))
+        suspect = next(s for s in record['n_plus_one'] if 'donations_donationcategory' in s['sql'])
+        self.assertEqual(suspect['count'], 6)
+        self.assertIn('donations/views.py', suspect['where'])
+
+    @override_settings(SQL_SERVER_TIMING=True)
+    def test_server_timing_header(self):
+        with self.assertNoLogs('donations.queries'):
+            response = self.client.get('/donations/')
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", app;dur=[\d.]+$')
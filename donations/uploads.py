@@ -0,0 +1,195 @@
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+
+MB = 1024 * 1024
+
+# Named limits, overridable through settings.UPLOAD_LIMITS. Each form maps
+# its file fields to one of them (UploadLimitsMixin.upload_limits).
+# 'types' are checked against the file's magic bytes, not the browser's
+# Content-Type or the file name.
+DEFAULT_UPLOAD_LIMITS = {
+    'image': {
+        'max_size': 8 * MB,
+        'types': ['image/jpeg', 'image/png', 'image/webp', 'image/gif'],
+    },
+    'document': {
+        'max_size': 10 * MB,
+        'types': ['application/pdf', 'image/jpeg', 'image/png'],
+    },
+}
+
+# Multipart bodies larger than this are cut off before any file is read
+DEFAULT_MAX_REQUEST_SIZE = 25 * MB
+
+MAGIC_NUMBERS = [
+    (b'%PDF-', 'application/pdf'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+TYPE_NAMES = {
+    'application/pdf': 'PDF',
+    'image/jpeg': 'JPEG',
+    'image/png': 'PNG',
+    'image/webp': 'WebP',
+    'image/gif': 'GIF',
+}
+
+
+def upload_limits(name):
+    return getattr(settings, 'UPLOAD_LIMITS', DEFAULT_UPLOAD_LIMITS)[name]
+
+
+def sniff(head):
+    """MIME type from the first bytes of a file, or None if unrecognised"""
+    for prefix, mime_type in MAGIC_NUMBERS:
+        if head.startswith(prefix):
+            return mime_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def size_error(limits):
+    return f"File is too large. The maximum size is {filesizeformat(limits['max_size'])}."
+
+
+def type_error(limits):
+    allowed = ', '.join(TYPE_NAMES.get(t, t) for t in limits['types'])
+    return f"Unsupported file type. Allowed types: {allowed}."
+
+
+def request_size_error(max_size):
+    return f"Upload is too large. All files sent together may be at most {filesizeformat(max_size)}."
+
+
+def check_file(limits, file):
+    """
+    Check a file against limits; returns an error message or None. Uses the
+    type LimitedUploadHandler sniffed, or reads the first bytes itself for
+    files that did not come through it (for example one built in code).
+    """
+    if file.size > limits['max_size']:
+        return size_error(limits)
+    mime_type = getattr(file, 'sniffed_type', None)
+    if mime_type is None:
+        file.seek(0)
+        mime_type = sniff(file.read(16))
+        file.seek(0)
+    if mime_type not in limits['types']:
+        return type_error(limits)
+    return None
+
+
+class RejectedUpload(UploadedFile):
+    """Placeholder left in request.FILES for an upload the handler refused"""
+
+    def __init__(self, name, error):
+        super().__init__(file=BytesIO(), name=name, size=0)
+        self.error = error
+
+
+class LimitedUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams every upload to a temporary file (never into memory) and
+    records the type sniffed from the magic bytes of its first chunk.
+
+    When the view announced the form it feeds (limit_uploads(), or
+    UploadLimitsAdminMixin in the admin), that form's limits are enforced
+    while the data arrives: an upload of the wrong type, or one that grows
+    past its max_size, is dropped on the spot. Its temporary file is
+    deleted and the remaining chunks are discarded unread into any buffer.
+    Every file of a request body larger than MAX_UPLOAD_REQUEST_SIZE is
+    dropped the same way. The form then sees a RejectedUpload carrying the
+    error (see UploadLimitsMixin).
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        max_request = getattr(settings, 'MAX_UPLOAD_REQUEST_SIZE', DEFAULT_MAX_REQUEST_SIZE)
+        self.request_error = request_size_error(max_request) if content_length > max_request else None
+        return None
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.limits = getattr(self.request, 'upload_limits', {}).get(field_name)
+        self.error = None
+        self.sniffed_type = None
+        if getattr(self, 'request_error', None):
+            self._reject(self.request_error)
+
+    def _reject(self, error):
+        self.error = error
+        self.file.close()  # deletes the temporary file
+        return None
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error:
+            return None
+        if start == 0:
+            self.sniffed_type = sniff(raw_data[:16])
+        if self.limits:
+            if start + len(raw_data) > self.limits['max_size']:
+                return self._reject(size_error(self.limits))
+            if self.sniffed_type not in self.limits['types']:
+                return self._reject(type_error(self.limits))
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.error:
+            return RejectedUpload(self.file_name, self.error)
+        file = super().file_complete(file_size)
+        file.sniffed_type = self.sniffed_type
+        return file
+
+
+class UploadLimitsMixin:
+    """
+    Form mixin that checks its file fields against the named limits in
+    `upload_limits` (field name -> DEFAULT_UPLOAD_LIMITS key) and reports
+    uploads refused by LimitedUploadHandler as a single error on their field.
+    """
+    upload_limits = {}
+
+    @classmethod
+    def field_limits(cls):
+        return {field_name: upload_limits(name) for field_name, name in cls.upload_limits.items()}
+
+    def clean(self):
+        cleaned_data = super().clean()
+        limits = self.field_limits()
+        for field_name in self.fields:
+            file = self.files.get(self.add_prefix(field_name)) if self.files else None
+            if file is None:
+                continue
+            if isinstance(file, RejectedUpload):
+                error = file.error
+            elif field_name in limits:
+                error = check_file(limits[field_name], file)
+            else:
+                continue
+            if error:
+                # Replace "empty file"/"not an image" errors caused by the rejection
+                self._errors.pop(field_name, None)
+                self.add_error(field_name, error)
+        return cleaned_data
+
+
+def limit_uploads(form_class):
+    """
+    View decorator: enforce form_class's upload limits while its files
+    arrive, so an oversized or mistyped file is not read in full.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.upload_limits = form_class.field_limits()
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -1,11 +1,14 @@
-from django.urls import path
-from . import views
+from django.urls import include, path
+from rest_framework.authtoken.views import obtain_auth_token
+
+from . import api, exports, views
 
 urlpatterns = [
     # Existing URLs...
     path('', views.home, name='home'),
     path('donations/', views.donation_list, name='donation_list'),
     path('donations/create/', views.create_donation, name='create_donation'),
+    path('donations/import/', views.import_donations, name='import_donations'),
     path('donations/<int:pk>/', views.donation_detail, name='donation_detail'),  # This line is crucial
     path('my-donations/', views.my_donations, name='my_donations'),
     path('donations/<int:donation_id>/requests/', views.donation_requests, name='donation_requests'),
@@ -42,5 +45,12 @@ path('admin/verification/<int:request_id>/', views.review_verification, name='re
     path('superuser/delete/<str:profile_type>/<int:profile_id>/', views.delete_profile, name='delete_profile'),
     path('superuser/bulk-verify/', views.bulk_verify_profiles, name='bulk_verify_profiles'),
     path('superuser/bulk-delete/', views.bulk_delete_profiles, name='bulk_delete_profiles'),
+    path('superuser/jobs/<int:job_id>/', views.background_job_status, name='background_job_status'),
+
+    # JSON API
+    path('api/', include(api.router.urls)),
+    path('api/token/', obtain_auth_token, name='api_token'),
+    path('api/changes/', api.ChangesView.as_view(), name='api_changes'),
+    path('exports/<str:name>/', exports.export_data, name='export_data'),
 ]
 
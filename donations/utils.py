@@ -1,9 +1,15 @@
+import logging
+
 from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
 from django.urls import reverse
 
+from .outbox import enqueue
+
+logger = logging.getLogger(__name__)
+
 def send_donation_request_email(donation_request):
     """
     Send email notification to donor when someone requests their donation
@@ -52,13 +58,13 @@ def send_donation_request_email(donation_request):
         # Attach HTML version
         email.attach_alternative(html_content, "text/html")
         
-        # Send email
-        email.send(fail_silently=False)
+        # Queue for the send_queued_mail worker
+        enqueue(email)
         
         return True
         
-    except Exception as e:
-        print(f"Error sending donation request email: {str(e)}")
+    except Exception:
+        logger.exception("Error sending donation request email")
         return False
 
 def send_admin_notification_email(donation_request):
@@ -90,9 +96,9 @@ def send_admin_notification_email(donation_request):
             to=[settings.ADMIN_EMAIL],
         )
         
-        email.send(fail_silently=True)
+        enqueue(email)
         return True
         
-    except Exception as e:
-        print(f"Error sending admin notification: {str(e)}")
+    except Exception:
+        logger.exception("Error sending admin notification")
         return False
\ No newline at end of file
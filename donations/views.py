@@ -2,7 +2,7 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Q, Count
+from django.db.models import Q, Count, Max
 from django.http import JsonResponse
 from django.contrib.admin.views.decorators import staff_member_required
 import json
@@ -12,13 +12,31 @@ from .models import (
     Notification, HelpSeeker, HelpSeekerType, HelpRequest, 
     DonationMatch, Feedback, Rating, VerificationRequest
 )
+from . import importer
+from .cache import HELP_SEEKER_MAP_KEY, HOME_STATS_KEY, memoize
+from .conditional import conditional_page
+from .email_utils import send_donation_match_email, send_donation_request_email
+from .images import queue_image_derivatives
+from .reservations import DonationUnavailable, set_request_status, submit_request
+from .uploads import limit_uploads
 from .forms import (
     DonationForm, DonationRequestForm, DonorProfileForm,
     HelpSeekerRegistrationForm, HelpRequestForm, DonationMatchForm,
-    DonorVerificationForm, HelpSeekerVerificationForm, AdminVerificationForm
+    DonorVerificationForm, HelpSeekerVerificationForm, AdminVerificationForm,
+    DonationImportUploadForm,
 )
 
 
+def home_stats():
+    """Statistics for the home page"""
+    return {
+        'total_donations': Donation.objects.count(),
+        'total_organizations': HelpSeeker.objects.filter(verification_status='verified').count(),
+        'total_food_saved': Donation.objects.filter(category__name='Food').count() * 5,
+        'active_donors': DonorProfile.objects.count(),
+    }
+
+
 def home(request):
     """Home page with statistics and recent donations"""
     categories = DonationCategory.objects.all()
@@ -28,20 +46,11 @@ def home(request):
         pickup_deadline__gt=timezone.now()
     ).order_by('-created_at')[:6]
     
-    # Statistics for home page
-    total_donations = Donation.objects.count()
-    total_organizations = HelpSeeker.objects.filter(verification_status='verified').count()
-    total_food_saved = Donation.objects.filter(category__name='Food').count() * 5
-    active_donors = DonorProfile.objects.count()
-    
     context = {
         'categories': categories,
         'help_seeker_types': help_seeker_types,
         'recent_donations': recent_donations,
-        'total_donations': total_donations,
-        'total_organizations': total_organizations,
-        'total_food_saved': total_food_saved,
-        'active_donors': active_donors,
+        **memoize(HOME_STATS_KEY, home_stats, timeout=60),
     }
     return render(request, 'donations/home.html', context)
 
@@ -65,7 +74,23 @@ def donation_list(request):
     return render(request, 'donations/donation_list.html', context)
 
 
+def donation_detail_state(request, pk):
+    donation = Donation.objects.select_related('category', 'donor').filter(pk=pk).first()
+    if donation is None:
+        return None
+    donor = donation.donor
+    own_request = DonationRequest.objects.filter(donation=donation, requester=request.user).values_list(
+        'pk', 'status', 'requested_quantity', 'message',
+    ).first()
+    return [
+        donation.updated_at, donation.is_expired(), donation.category.name,
+        donor.organization_name, donor.user_type, donor.city, donor.state,
+        own_request, donation.requests.count(),
+    ]
+
+
 @login_required
+@conditional_page(donation_detail_state)
 def donation_detail(request, pk):
     """View donation details and handle requests"""
     donation = get_object_or_404(Donation, pk=pk)
@@ -76,7 +101,11 @@ def donation_detail(request, pk):
             donation_request = form.save(commit=False)
             donation_request.donation = donation
             donation_request.requester = request.user
-            donation_request.save()
+            try:
+                submit_request(donation_request)
+            except DonationUnavailable as e:
+                messages.error(request, str(e))
+                return redirect('donation_detail', pk=pk)
             
             # Create notification for donor
             Notification.objects.create(
@@ -84,6 +113,7 @@ def donation_detail(request, pk):
                 message=f"{request.user.username} has requested your donation: {donation.title}",
                 link=f"/donations/{donation.id}/"
             )
+            send_donation_request_email(donation_request)
             
             messages.success(request, 'Donation request sent successfully!')
             return redirect('donation_detail', pk=pk)
@@ -93,6 +123,7 @@ def donation_detail(request, pk):
     context = {
         'donation': donation,
         'form': form,
+        'existing_request': DonationRequest.objects.filter(donation=donation, requester=request.user).first(),
     }
     return render(request, 'donations/donation_detail.html', context)
 
@@ -127,12 +158,14 @@ def update_request_status(request, request_id, status):
         messages.error(request, 'You are not authorized to perform this action.')
         return redirect('home')
     
-    donation_request.status = status
-    donation_request.save()
-    
-    if status == 'accepted':
-        donation_request.donation.status = 'reserved'
-        donation_request.donation.save()
+    try:
+        set_request_status(donation_request, status)
+    except ValueError:
+        messages.error(request, 'Invalid request status.')
+        return redirect('donation_requests', donation_id=donation_request.donation.id)
+    except DonationUnavailable as e:
+        messages.error(request, str(e))
+        return redirect('donation_requests', donation_id=donation_request.donation.id)
     
     # Notify requester
     Notification.objects.create(
@@ -146,6 +179,7 @@ def update_request_status(request, request_id, status):
 
 
 @login_required
+@limit_uploads(DonationForm)
 def create_donation(request):
     """Create a new donation"""
     # Get or create donor profile
@@ -172,6 +206,9 @@ def create_donation(request):
             donation.donor = donor_profile
             donation.save()
             form.save_m2m()  # Save many-to-many fields
+            if donation.image:
+                # Resized copies are made by the process_background_jobs worker
+                queue_image_derivatives([donation.pk], user=request.user)
             messages.success(request, 'Donation created successfully!')
             return redirect('donation_list')
     else:
@@ -181,6 +218,42 @@ def create_donation(request):
 
 
 @login_required
+def import_donations(request):
+    """Create many donations at once from an uploaded CSV or JSON file"""
+    donor_profile = DonorProfile.objects.filter(user=request.user).first()
+    if donor_profile is None:
+        messages.info(request, 'Please set up your donor profile before importing donations.')
+        return redirect('setup_donor_profile')
+
+    result = None
+    if request.method == 'POST':
+        form = DonationImportUploadForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                fmt = importer.detect_format(upload.name)
+            except importer.ImportFormatError as e:
+                form.add_error('file', str(e))
+            else:
+                dry_run = form.cleaned_data['dry_run']
+                result = importer.import_donations(
+                    donor_profile, importer.read_rows(upload.file, fmt), dry_run=dry_run,
+                )
+                if result['donation_ids']:
+                    # Coordinates are looked up by the process_background_jobs worker
+                    importer.queue_geocoding(result['donation_ids'], user=request.user)
+                if result['created']:
+                    messages.success(request, f"{result['created']} donations imported successfully!")
+                elif dry_run and not result['invalid'] and not result['aborted']:
+                    messages.success(request, f"All {result['rows']} rows are valid.")
+    else:
+        form = DonationImportUploadForm()
+
+    return render(request, 'donations/import_donations.html', {'form': form, 'result': result})
+
+
+@login_required
+@limit_uploads(DonorProfileForm)
 def setup_donor_profile(request):
     """Initial donor profile setup"""
     try:
@@ -216,6 +289,7 @@ def setup_donor_profile(request):
 
 
 @login_required
+@limit_uploads(DonorProfileForm)
 def update_donor_profile(request):
     """Update existing donor profile"""
     donor_profile = get_object_or_404(DonorProfile, user=request.user)
@@ -233,6 +307,7 @@ def update_donor_profile(request):
 
 
 @login_required
+@limit_uploads(HelpSeekerRegistrationForm)
 def register_help_seeker(request):
     """Register as a help seeker organization"""
     try:
@@ -260,7 +335,20 @@ def register_help_seeker(request):
     return render(request, 'donations/register_help_seeker.html', context)
 
 
+def help_seeker_dashboard_state(request):
+    help_seeker = HelpSeeker.objects.filter(user=request.user).values_list('pk', 'updated_at').first()
+    if help_seeker is None:
+        return None
+    seeker_id, updated_at = help_seeker
+    requests = HelpRequest.objects.filter(help_seeker_id=seeker_id).aggregate(Max('updated_at'), Count('id'))
+    matches = DonationMatch.objects.filter(help_seeker_id=seeker_id).aggregate(
+        Max('updated_at'), Max('donation__updated_at'), Count('id'),
+    )
+    return [updated_at, *requests.values(), *matches.values()]
+
+
 @login_required
+@conditional_page(help_seeker_dashboard_state)
 def help_seeker_dashboard(request):
     """Dashboard for help seeker organizations"""
     try:
@@ -374,6 +462,7 @@ def create_donation_match(request, donation_id, seeker_id):
                 message=f"{request.user.username} wants to donate '{donation.title}' to your organization",
                 link=f"/donation-matches/{donation_match.id}/"
             )
+            send_donation_match_email(donation_match, 'proposal')
             
             messages.success(request, 'Donation match proposal sent successfully!')
             return redirect('my_donations')
@@ -390,7 +479,20 @@ def create_donation_match(request, donation_id, seeker_id):
     return render(request, 'donations/create_donation_match.html', context)
 
 
+def donation_match_detail_state(request, match_id):
+    match = DonationMatch.objects.select_related(
+        'donation__donor', 'donation__category', 'help_seeker',
+    ).filter(id=match_id).first()
+    if match is None or request.user.pk not in (match.donation.donor.user_id, match.help_seeker.user_id):
+        return None
+    return [
+        match.updated_at, match.donation.updated_at, match.help_seeker.updated_at,
+        match.donation.category.name, match.donation.donor.organization_name,
+    ]
+
+
 @login_required
+@conditional_page(donation_match_detail_state)
 def donation_match_detail(request, match_id):
     """View and manage donation match details"""
     donation_match = get_object_or_404(DonationMatch, id=match_id)
@@ -413,6 +515,7 @@ def donation_match_detail(request, match_id):
                 message=f"{donation_match.help_seeker.organization_name} has accepted your donation offer",
                 link=f"/donation-matches/{donation_match.id}/"
             )
+            send_donation_match_email(donation_match, 'accepted')
             messages.success(request, 'Donation match accepted!')
             
         elif action == 'reject' and request.user == donation_match.help_seeker.user:
@@ -455,13 +558,13 @@ def help_seeker_directory(request):
     return render(request, 'donations/help_seeker_directory.html', context)
 
 
-def public_help_seekers_map(request):
-    """Public map view of help seekers"""
+def help_seekers_map_json():
+    """Markers for the public map, as JSON"""
     help_seekers = HelpSeeker.objects.filter(
         verification_status='verified',
         latitude__isnull=False,
         longitude__isnull=False
-    )
+    ).select_related('seeker_type')
     
     seeker_data = []
     for seeker in help_seekers:
@@ -475,9 +578,13 @@ def public_help_seekers_map(request):
             'urgent': seeker.is_urgent,
             'url': f"/help-seekers/{seeker.id}/"
         })
-    
+    return json.dumps(seeker_data)
+
+
+def public_help_seekers_map(request):
+    """Public map view of help seekers"""
     context = {
-        'help_seekers_json': json.dumps(seeker_data),
+        'help_seekers_json': memoize(HELP_SEEKER_MAP_KEY, help_seekers_map_json, timeout=300),
         'seeker_types': HelpSeekerType.objects.all(),
     }
     return render(request, 'donations/public_help_seekers_map.html', context)
@@ -485,6 +592,7 @@ def public_help_seekers_map(request):
 
 # Verification Views
 @login_required
+@limit_uploads(DonorVerificationForm)
 def submit_donor_verification(request):
     """Submit donor verification documents"""
     try:
@@ -518,6 +626,7 @@ def submit_donor_verification(request):
 
 
 @login_required
+@limit_uploads(HelpSeekerVerificationForm)
 def submit_help_seeker_verification(request):
     """Submit help seeker verification documents"""
     try:
@@ -656,7 +765,10 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.utils import timezone
 from django.db.models import Q
-from .models import User, DonorProfile, HelpSeeker, VerificationRequest
+from .models import User, DonorProfile, HelpSeeker, VerificationRequest, BackgroundJob
+from .bulk import (
+    async_threshold, delete_donors_and_seekers, parse_ids, queue_bulk_job, verify_donors_and_seekers,
+)
 
 def superuser_required(view_func):
     """Decorator to ensure only superusers can access the view"""
@@ -721,6 +833,7 @@ def superuser_verification_panel(request):
             'q': search_query,
         },
         'verification_status_choices': DonorProfile.VERIFICATION_STATUS,
+        'background_jobs': BackgroundJob.objects.filter(kind__startswith='bulk_')[:5],
     }
     
     return render(request, 'donations/admin/superuser_panel.html', context)
@@ -815,34 +928,16 @@ def delete_profile(request, profile_type, profile_id):
 def bulk_verify_profiles(request):
     """Bulk verify multiple profiles"""
     if request.method == 'POST':
-        donor_ids = request.POST.getlist('donor_ids')
-        seeker_ids = request.POST.getlist('seeker_ids')
-        
-        verified_count = 0
+        donor_ids = parse_ids(request.POST.getlist('donor_ids'))
+        seeker_ids = parse_ids(request.POST.getlist('seeker_ids'))
         
-        # Verify donors
-        for donor_id in donor_ids:
-            try:
-                donor = DonorProfile.objects.get(id=donor_id)
-                donor.verification_status = 'verified'
-                donor.verified_at = timezone.now()
-                donor.verified_by = request.user
-                donor.save()
-                verified_count += 1
-            except DonorProfile.DoesNotExist:
-                pass
+        # Large batches run in the background worker instead of this request
+        if len(donor_ids) + len(seeker_ids) > async_threshold():
+            job = queue_bulk_job('bulk_verify_profiles', donor_ids, seeker_ids, request.user)
+            messages.info(request, f'Verification of {job.total} profiles queued as job #{job.pk}.')
+            return redirect('superuser_verification_panel')
         
-        # Verify seekers
-        for seeker_id in seeker_ids:
-            try:
-                seeker = HelpSeeker.objects.get(id=seeker_id)
-                seeker.verification_status = 'verified'
-                seeker.verified_at = timezone.now()
-                seeker.verified_by = request.user
-                seeker.save()
-                verified_count += 1
-            except HelpSeeker.DoesNotExist:
-                pass
+        verified_count = verify_donors_and_seekers(donor_ids, seeker_ids, request.user)
         
         messages.success(request, f'{verified_count} profiles verified successfully!')
     
@@ -852,36 +947,32 @@ def bulk_verify_profiles(request):
 def bulk_delete_profiles(request):
     """Bulk delete multiple profiles"""
     if request.method == 'POST':
-        donor_ids = request.POST.getlist('donor_ids')
-        seeker_ids = request.POST.getlist('seeker_ids')
+        donor_ids = parse_ids(request.POST.getlist('donor_ids'))
+        seeker_ids = parse_ids(request.POST.getlist('seeker_ids'))
         delete_users = request.POST.get('delete_users') == 'true'
         
-        deleted_count = 0
+        if len(donor_ids) + len(seeker_ids) > async_threshold():
+            job = queue_bulk_job('bulk_delete_profiles', donor_ids, seeker_ids, request.user,
+                                 delete_users=delete_users)
+            messages.info(request, f'Deletion of {job.total} profiles queued as job #{job.pk}.')
+            return redirect('superuser_verification_panel')
         
-        # Delete donors
-        for donor_id in donor_ids:
-            try:
-                donor = DonorProfile.objects.get(id=donor_id)
-                user = donor.user
-                donor.delete()
-                if delete_users:
-                    user.delete()
-                deleted_count += 1
-            except DonorProfile.DoesNotExist:
-                pass
-        
-        # Delete seekers
-        for seeker_id in seeker_ids:
-            try:
-                seeker = HelpSeeker.objects.get(id=seeker_id)
-                user = seeker.user
-                seeker.delete()
-                if delete_users:
-                    user.delete()
-                deleted_count += 1
-            except HelpSeeker.DoesNotExist:
-                pass
+        deleted_count = delete_donors_and_seekers(donor_ids, seeker_ids, request.user, delete_users=delete_users)
         
         messages.success(request, f'{deleted_count} profiles deleted successfully!')
     
-    return redirect('superuser_verification_panel')
\ No newline at end of file
+    return redirect('superuser_verification_panel')
+
+@superuser_required
+def background_job_status(request, job_id):
+    """Progress of a queued bulk job, polled by the superuser panel"""
+    job = get_object_or_404(BackgroundJob, id=job_id)
+    return JsonResponse({
+        'id': job.pk,
+        'kind': job.kind,
+        'status': job.status,
+        'processed': job.processed,
+        'total': job.total,
+        'progress': job.progress,
+        'result': job.result,
+    })
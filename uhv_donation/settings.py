@@ -1,4 +1,6 @@
 import os
+import sys
+import tempfile
 from pathlib import Path
 import dj_database_url
 from dotenv import load_dotenv
@@ -6,6 +8,9 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+# Under `manage.py test` the shared cache and the error log get stand-ins
+TESTING = sys.argv[1:2] == ['test']
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -29,18 +34,33 @@ INSTALLED_APPS = [
     'users',
     'crispy_forms',
     'crispy_bootstrap5',
+    'rest_framework',
+    'rest_framework.authtoken',
+    'django_filters',
 ]
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# JSON API under /api/ (donations.api); mobile clients authenticate with a token
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+}
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'donations.middleware.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'donations.middleware.ReplicaPinningMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,16 +94,99 @@ DATABASES = {
     )
 }
 
+# Read replicas: REPLICA_DATABASE_URL, or one REPLICA_<NAME>_DATABASE_URL per replica,
+# adds a database alias replica / replica_<name> that PrimaryReplicaRouter sends reads
+# to. Other *_DATABASE_URL variables (a platform's own add-ons) are left alone.
+for key, url in sorted(os.environ.items()):
+    if key.startswith('REPLICA') and key.endswith('_DATABASE_URL') and url:
+        alias = key[:-len('_DATABASE_URL')].lower()
+        DATABASES[alias] = dj_database_url.parse(url, conn_max_age=600)
+        DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['donations.routers.PrimaryReplicaRouter']
+
+# After a write request a session keeps reading from the primary for this many
+# seconds; None pins it for the rest of the session
+REPLICA_STICKY_SECONDS = None
+
+# SQLite (small deployments and the db.sqlite3 fallback): WAL lets readers run
+# alongside the writer, and BEGIN IMMEDIATE takes the write lock when a transaction
+# starts, so concurrent writers wait up to busy_timeout instead of failing with
+# "database is locked" when a read lock cannot be upgraded.
+# `manage.py benchmark_sqlite` compares this with SQLite's defaults.
+SQLITE_OPTIONS = {
+    'init_command': (
+        'PRAGMA journal_mode=WAL;'
+        'PRAGMA synchronous=NORMAL;'
+        'PRAGMA mmap_size=134217728;'
+        'PRAGMA cache_size=-20000;'
+        'PRAGMA busy_timeout=20000;'
+    ),
+    'transaction_mode': 'IMMEDIATE',
+}
+for database in DATABASES.values():
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        database.setdefault('OPTIONS', {}).update(SQLITE_OPTIONS)
+
+# SQLite tests run against a file instead of the shared-cache in-memory database,
+# so multi-threaded tests get normal locking (busy waits) rather than "table is locked" errors
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['TEST'] = {'NAME': os.path.join(BASE_DIR, 'test_db.sqlite3')}
+
+# Caching: a per-process LRU (donations.cache.TieredCache) in front of a cache
+# shared by all workers, Redis when REDIS_URL is set (needs the redis package),
+# otherwise files under CACHE_DIR. Tests get a private in-memory stand-in.
+if os.environ.get('REDIS_URL'):
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['REDIS_URL'],
+    }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'uhv_donation_cache')),
+    }
+if TESTING:
+    SHARED_CACHE = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'shared'}
+CACHES = {
+    'default': {
+        'BACKEND': 'donations.cache.TieredCache',
+        'OPTIONS': {'SHARED': 'shared', 'MAX_ENTRIES': 1000, 'LOCAL_TIMEOUT': 5},
+    },
+    'shared': {**SHARED_CACHE, 'TIMEOUT': 300},
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# How donations.media.serve_media hands files to the front proxy:
+# 'nginx' -> X-Accel-Redirect to MEDIA_ACCEL_PREFIX + path (map that prefix
+#            to MEDIA_ROOT in an `internal` location), 'apache' -> X-Sendfile,
+# ''      -> Django streams the file itself with FileResponse
+MEDIA_SENDFILE_BACKEND = os.environ.get('MEDIA_SENDFILE_BACKEND', '')
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# Uploads stream to temporary files; each form picks its size/type limits
+# from donations.uploads.DEFAULT_UPLOAD_LIMITS (override with UPLOAD_LIMITS)
+FILE_UPLOAD_HANDLERS = ['donations.uploads.LimitedUploadHandler']
+MAX_UPLOAD_REQUEST_SIZE = int(os.environ.get('MAX_UPLOAD_REQUEST_SIZE', 25 * 1024 * 1024))
+
+# Uploads are stored once per distinct content (see donations.storage); static
+# files are served by WhiteNoise from the hashed, compressed collectstatic output
+STORAGES = {
+    'default': {'BACKEND': 'donations.storage.ContentAddressedStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
+# The test run has no collectstatic manifest to look hashed names up in
+if TESTING:
+    STORAGES['staticfiles'] = {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'}
+
 LOGIN_REDIRECT_URL = 'home'
 LOGIN_URL = 'login'
 LOGOUT_REDIRECT_URL = 'home'
@@ -111,6 +214,12 @@ CSRF_TRUSTED_ORIGINS = [
 # Enable email notifications
 ENABLE_EMAIL_NOTIFICATIONS = True
 
+# Bulk superuser actions above this many profiles run in the process_background_jobs worker
+BULK_ACTION_ASYNC_THRESHOLD = int(os.environ.get('BULK_ACTION_ASYNC_THRESHOLD', 200))
+
+# Donors on digest delivery get one email per window listing every new request
+EMAIL_DIGEST_WINDOW_MINUTES = int(os.environ.get('EMAIL_DIGEST_WINDOW_MINUTES', 24 * 60))
+
 # Email addresses for different purposes
 EMAIL_CONFIG = {
     'NOREPLY': 'noreply@uhvsharehub.com',
@@ -120,4 +229,40 @@ EMAIL_CONFIG = {
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
-DEFAULT_AUTO_FIELD = 'django.db.backends.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# SQL instrumentation (donations.middleware.QueryInstrumentationMiddleware):
+# requests slower than SLOW_REQUEST_MS, or repeating one query shape
+# N_PLUS_ONE_THRESHOLD times or more, are logged to django_errors.log;
+# SQL_SERVER_TIMING adds a Server-Timing header with query count and DB time
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 500))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+SQL_SERVER_TIMING = os.environ.get('SQL_SERVER_TIMING', str(DEBUG)) == 'True'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'verbose': {'format': '{asctime} {levelname} {name} {message}', 'style': '{'},
+    },
+    'handlers': {
+        'error_file': {
+            'level': 'WARNING',
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(BASE_DIR, 'django_errors.log'),
+            'delay': True,
+            'formatter': 'verbose',
+        },
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'verbose'},
+    },
+    'loggers': {
+        'django.request': {'handlers': ['error_file'], 'level': 'ERROR'},
+        # Progress (emails queued, ...) on the console, failures also in django_errors.log
+        'donations': {'handlers': ['console', 'error_file'], 'level': 'INFO'},
+        'donations.queries': {'handlers': ['error_file'], 'level': 'WARNING', 'propagate': False},
+    },
+}
+# The test suite's deliberately slow, repetitive and failing paths stay out of the log and console
+if TESTING:
+    LOGGING['handlers']['error_file'] = {'class': 'logging.NullHandler'}
+    LOGGING['handlers']['console'] = {'class': 'logging.NullHandler'}
@@ -1,10 +1,20 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from donations.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('donations.urls')),
     path('users/', include('users.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+]
+
+# Media goes through serve_media in every environment so verification
+# documents are access-checked; set MEDIA_SENDFILE_BACKEND to let the
+# front proxy send the bytes
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media, name='media'),
+]
\ No newline at end of file
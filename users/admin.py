@@ -6,6 +6,9 @@ from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
 from .models import UserProfile
 from django.utils import timezone
+from django.utils.html import format_html
+from donations.admin import DonorProfileInline, HelpSeekerInline
+from donations.admin_mixins import AutocompleteSearchMixin
 
 class UserProfileInline(admin.StackedInline):
     model = UserProfile
@@ -14,10 +17,12 @@ class UserProfileInline(admin.StackedInline):
     fields = ('phone', 'address', 'city', 'state', 'pincode', 'is_volunteer', 'volunteer_skills', 'is_verified', 'verified_at', 'verification_notes')
     readonly_fields = ('verified_at',)
 
-class CustomUserAdmin(UserAdmin):
-    inlines = (UserProfileInline,)
-    list_display = ('username', 'email', 'first_name', 'last_name', 'get_is_verified', 'get_is_volunteer', 'is_staff')
-    list_filter = ('userprofile__is_verified', 'userprofile__is_volunteer', 'is_staff', 'is_active')
+class CustomUserAdmin(AutocompleteSearchMixin, UserAdmin):
+    list_display = ('username', 'email', 'first_name', 'last_name', 'get_is_verified', 'get_is_volunteer', 'get_donor_status', 'get_seeker_status', 'is_staff', 'is_active')
+    list_filter = ('userprofile__is_verified', 'userprofile__is_volunteer', 'donorprofile__verification_status', 'helpseeker__verification_status', 'is_staff', 'is_active', 'date_joined')
+    list_select_related = ('userprofile', 'donorprofile', 'helpseeker')
+    autocomplete_search_fields = ('^username',)
+    actions = ['activate_users', 'deactivate_users']
     
     def get_is_verified(self, obj):
         return obj.userprofile.is_verified
@@ -29,6 +34,50 @@ class CustomUserAdmin(UserAdmin):
     get_is_volunteer.boolean = True
     get_is_volunteer.short_description = 'Volunteer'
 
+    def get_donor_status(self, obj):
+        if hasattr(obj, 'donorprofile'):
+            status = obj.donorprofile.get_verification_status_display()
+            color = {
+                'verified': 'green',
+                'pending': 'orange',
+                'rejected': 'red',
+                'not_submitted': 'gray'
+            }.get(obj.donorprofile.verification_status, 'black')
+            return format_html('<span style="color: {}; font-weight: bold;">{}</span>', color, status)
+        return format_html('<span style="color: gray;">No Profile</span>')
+    get_donor_status.short_description = 'Donor Status'
+
+    def get_seeker_status(self, obj):
+        if hasattr(obj, 'helpseeker'):
+            status = obj.helpseeker.get_verification_status_display()
+            color = {
+                'verified': 'green',
+                'pending': 'orange',
+                'rejected': 'red'
+            }.get(obj.helpseeker.verification_status, 'black')
+            return format_html('<span style="color: {}; font-weight: bold;">{}</span>', color, status)
+        return format_html('<span style="color: gray;">No Profile</span>')
+    get_seeker_status.short_description = 'Seeker Status'
+
+    def activate_users(self, request, queryset):
+        updated = queryset.update(is_active=True)
+        self.message_user(request, f'{updated} users activated successfully.')
+    activate_users.short_description = "Activate selected users"
+
+    def deactivate_users(self, request, queryset):
+        updated = queryset.update(is_active=False)
+        self.message_user(request, f'{updated} users deactivated.')
+    deactivate_users.short_description = "Deactivate selected users"
+
+    def get_inlines(self, request, obj=None):
+        inlines = [UserProfileInline]
+        if obj:
+            if hasattr(obj, 'donorprofile'):
+                inlines.append(DonorProfileInline)
+            if hasattr(obj, 'helpseeker'):
+                inlines.append(HelpSeekerInline)
+        return inlines
+
 # Unregister the default User admin and register with custom admin
 admin.site.unregister(User)
 admin.site.register(User, CustomUserAdmin)
@@ -39,6 +88,8 @@ class UserProfileAdmin(admin.ModelAdmin):
     list_filter = ('is_verified', 'is_volunteer', 'city', 'state')
     search_fields = ('user__username', 'user__email', 'phone', 'city')
     readonly_fields = ('verified_at',)
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
     actions = ['verify_profiles', 'unverify_profiles']
     
     def verify_profiles(self, request, queryset):
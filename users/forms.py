@@ -25,4 +25,4 @@ class UserUpdateForm(forms.ModelForm):
 class ProfileUpdateForm(forms.ModelForm):
     class Meta:
         model = UserProfile
-        fields = ['phone', 'address', 'city', 'state', 'pincode', 'is_volunteer', 'volunteer_skills']
\ No newline at end of file
+        fields = ['phone', 'address', 'city', 'state', 'pincode', 'is_volunteer', 'volunteer_skills', 'email_delivery']
\ No newline at end of file
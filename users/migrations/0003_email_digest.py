@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_userprofile_is_verified_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='email_delivery',
+            field=models.CharField(choices=[('immediate', 'Immediately'), ('digest', 'Digest')], default='immediate', max_length=10),
+        ),
+    ]
@@ -17,6 +17,13 @@ class UserProfile(models.Model):
     verified_at = models.DateTimeField(null=True, blank=True)
     verification_notes = models.TextField(blank=True)
 
+    EMAIL_DELIVERY_CHOICES = [
+        ('immediate', 'Immediately'),
+        ('digest', 'Digest'),
+    ]
+    # How request notifications for this user's donations are emailed
+    email_delivery = models.CharField(max_length=10, choices=EMAIL_DELIVERY_CHOICES, default='immediate')
+
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):